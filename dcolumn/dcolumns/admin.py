@@ -8,6 +8,7 @@ Dynamic Column model admin.
 __docformat__ = "restructuredtext en"
 
 from django.contrib import admin
+from django.db.models import OuterRef, Subquery
 from django.utils.translation import ugettext_lazy as _
 
 from dcolumn.common.admin_mixins import UserAdminMixin
@@ -33,6 +34,51 @@ class KeyValueInline(admin.TabularInline):
     model = KeyValue
     form = KeyValueAdminForm
 
+    def get_queryset(self, request):
+        """
+        Get the ``KeyValue`` objects with their ``DynamicColumn`` which is
+        used as the title of each inline row.
+        """
+        queryset = super(KeyValueInline, self).get_queryset(request)
+        return queryset.select_related('dynamic_column')
+
+    def get_formset(self, request, obj=None, **kwargs):
+        """
+        Get the formset class with the ``DynamicColumn`` queryset and HTML
+        select choices of the parent object's collection built once, so they
+        are shared by all the inline forms instead of queried for each row.
+
+        :param request: Django request object.
+        :type request: HttpRequest
+        :param obj: The parent object that inherits ``CollectionBase``.
+        :type obj: Model object or None
+        :rtype: ``BaseInlineFormSet`` class
+        """
+        formset = super(KeyValueInline, self).get_formset(
+            request, obj=obj, **kwargs)
+        form = formset.form
+        field = form.base_fields.get('dynamic_column')
+
+        if field is not None:
+            if obj is not None and obj.column_collection_id:
+                columns = ColumnCollection.objects.get_column_collection(
+                    obj.column_collection.related_model)
+            else:
+                columns = field.queryset
+
+            choices = [(dc.pk, field.label_from_instance(dc))
+                       for dc in columns]
+
+            if field.empty_label is not None:
+                choices.insert(0, ('', field.empty_label))
+
+            # The form class is made for each request by the formset
+            # factory so these are not shared between requests.
+            form.columns = columns
+            form.column_choices = choices
+
+        return formset
+
     class Media:
         js = ('dcolumn/js/js.cookie-2.0.4.min.js',
               'dcolumn/js/inheritance.js',
@@ -88,5 +134,20 @@ class DynamicColumnAdmin(UserAdminMixin):
     list_editable = ('location', 'order', 'active',)
     search_fields = ('slug', 'location',)
     list_filter = ('column_collection', 'value_type', 'store_relation')
-    ordering = ('column_collection__name', 'location', 'order', 'name',)
+    # Ordering on 'column_collection__name' would join the many to many
+    # table and repeat a column for each of its collections, so order on the
+    # first collection name instead.
+    ordering = (
+        Subquery(ColumnCollection.objects.filter(
+            dynamic_column=OuterRef('pk')).order_by('name').values(
+                'name')[:1]),
+        'location', 'order', 'name',)
     form = DynamicColumnAdminForm
+
+    def get_queryset(self, request):
+        """
+        Get the ``DynamicColumn`` objects with their collections prefetched
+        for ``collection_producer``.
+        """
+        queryset = super(DynamicColumnAdmin, self).get_queryset(request)
+        return queryset.prefetch_related('column_collection')
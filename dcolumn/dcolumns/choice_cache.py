@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/choice_cache.py
+#
+
+"""
+A cache of the HTML select option lists built from the registered ``CHOICE``
+objects.
+
+Option lists for Django models are kept in the Django cache named by
+``settings.DYNAMIC_COLUMNS.SCHEMA_CACHE`` under a key that includes a version
+for each choice model. The version is changed by the ``post_save`` and
+``post_delete`` signals of the choice model, when the transaction commits,
+so every process stops using the old lists. Non-django ``CHOICE`` objects
+are already held in memory and are not cached.
+
+``bulk_create``, ``bulk_update`` and ``update`` send no signals, code that
+changes a choice model with them must call ``choice_cache.invalidate``
+with the model.
+
+Choices registered with ``lazy=True`` are too large to be put in a page, so
+their options are searched for a page at a time instead.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .manager import dcolumn_manager
+
+log = logging.getLogger('dcolumns.dcolumns.choice_cache')
+
+
+#
+# ChoiceCache
+#
+class ChoiceCache(object):
+    """
+    Holds the ``(pk, field)`` option tuples for each registered ``CHOICE``.
+    """
+    VERSION_KEY = 'dcolumn-choice-version-{}'
+    OPTIONS_KEY = 'dcolumn-choice-options-{}-{}-{}'
+
+    def connect(self, choice):
+        """
+        Connect the signals that invalidate the options of a Django model
+        ``CHOICE``. Non-django ``CHOICE`` objects are ignored.
+
+        :param choice: A registered ``CHOICE`` object.
+        :type choice: ClassType
+        """
+        if self.is_model(choice):
+            uid = self._get_uid(choice)
+            post_save.connect(self.invalidate, sender=choice, dispatch_uid=uid)
+            post_delete.connect(self.invalidate, sender=choice,
+                                dispatch_uid=uid)
+
+    def disconnect(self, choice):
+        """
+        Disconnect the signals connected with ``connect``.
+
+        :param choice: A registered ``CHOICE`` object.
+        :type choice: ClassType
+        """
+        if self.is_model(choice):
+            uid = self._get_uid(choice)
+            post_save.disconnect(sender=choice, dispatch_uid=uid)
+            post_delete.disconnect(sender=choice, dispatch_uid=uid)
+
+    def is_model(self, choice):
+        """
+        Test if the ``CHOICE`` object is a Django model.
+
+        :param choice: A registered ``CHOICE`` object.
+        :type choice: ClassType
+        :rtype: bool
+        """
+        return hasattr(choice, '_meta')
+
+    def is_registered(self, model):
+        """
+        Test if a model is a registered Django model ``CHOICE``.
+
+        :param model: A model class.
+        :type model: Model class
+        :rtype: bool
+        """
+        return any(choice is model for choice, field
+                   in dcolumn_manager.choice_map.values())
+
+    def get_version(self, choice):
+        """
+        Gets the current version of a ``CHOICE`` object's options. A new
+        version is stored if the key is not in the cache.
+
+        :param choice: A registered ``CHOICE`` object.
+        :type choice: ClassType
+        :rtype: str
+        """
+        cache = self._get_cache()
+        key = self.VERSION_KEY.format(choice._meta.label_lower)
+        version = cache.get(key)
+
+        if version is None:
+            version = uuid4().hex
+
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+
+        return version
+
+    def get_options(self, choice, field):
+        """
+        Gets the option tuples for a ``CHOICE`` object.
+
+        :param choice: A registered ``CHOICE`` object.
+        :type choice: ClassType
+        :param field: The field used as the HTML select option text.
+        :type field: str
+        :rtype: A new list of ``(pk, value)`` tuples on each call.
+        """
+        if not self.is_model(choice):
+            return self._build(choice, field)
+
+        cache = self._get_cache()
+        key = self.OPTIONS_KEY.format(
+            choice._meta.label_lower, field, self.get_version(choice))
+        options = cache.get(key)
+
+        if options is None:
+            options = self._build(choice, field)
+            cache.set(key, options)
+            log.debug("Built %s options for %s.%s", len(options),
+                      choice.__name__, field)
+
+        return list(options)
+
+    def search_options(self, choice, field, term='', prefix=False, offset=0,
+                       limit=20):
+        """
+        Search the option tuples of a ``CHOICE`` object ordered by the
+        ``field`` value.
+
+        :param choice: A registered ``CHOICE`` object.
+        :type choice: ClassType
+        :param field: The field used as the HTML select option text.
+        :type field: str
+        :param term: The text to search for, case is ignored. An empty
+                     string matches all options.
+        :type term: str
+        :param prefix: If ``True`` the ``field`` value must start with
+                       ``term`` else ``term`` can be anywhere in the value.
+        :type prefix: bool
+        :param offset: The number of options to skip.
+        :type offset: int
+        :param limit: The maximum number of options returned.
+        :type limit: int
+        :rtype: A list of ``(pk, value)`` tuples.
+        """
+        objects = choice.objects.model_objects()
+
+        if self._is_model_field(choice, field):
+            if term:
+                lookup = '{}__{}'.format(
+                    field, 'istartswith' if prefix else 'icontains')
+                objects = objects.filter(**{lookup: term})
+
+            objects = objects.order_by(field, 'pk').values_list('pk', field)
+            return [tuple(item) for item in objects[offset:offset + limit]]
+
+        term = term.lower()
+        options = []
+
+        for pk, value in sorted(self._build(choice, field),
+                                key=lambda x: (str(x[1]).lower(), x[0])):
+            text = str(value).lower()
+
+            if (text.startswith(term) if prefix else term in text):
+                options.append((pk, value))
+
+        return options[offset:offset + limit]
+
+    def get_selected_option(self, choice, field, value, store_relation=False):
+        """
+        Gets the option tuple of a selected value without building all the
+        options.
+
+        :param choice: A registered ``CHOICE`` object.
+        :type choice: ClassType
+        :param field: The field used as the HTML select option text.
+        :type field: str
+        :param value: The pk of the object or the ``field`` value when the
+                      relation is stored.
+        :type value: int or str
+        :param store_relation: If ``True`` the value is looked up by the
+                               ``field`` value, else by the pk.
+        :type store_relation: bool
+        :rtype: A ``(pk, value)`` tuple or ``None`` if not found.
+        """
+        option = None
+
+        if not store_relation:
+            value = int(value) if str(value).isdigit() else None
+
+        if value in (None, '', 0):
+            pass
+        elif self._is_model_field(choice, field):
+            lookup = field if store_relation else 'pk'
+            item = choice.objects.model_objects().filter(
+                **{lookup: value}).values_list('pk', field).first()
+            option = tuple(item) if item else None
+        else:
+            for pk, text in self._build(choice, field):
+                if value == (text if store_relation else pk):
+                    option = (pk, text)
+                    break
+
+        return option
+
+    def invalidate(self, sender=None, using=None, **kwargs):
+        """
+        Signal receiver connected to each Django model ``CHOICE``. A new
+        version is stored when the transaction commits so all processes
+        rebuild the options. Call it with the model after changing its
+        objects in bulk.
+
+        :param sender: A registered Django model ``CHOICE``.
+        :type sender: Model class
+        :param using: The database alias of the transaction.
+        :type using: str
+        """
+        log.debug("Choice options invalidated by %s.", sender)
+        key = self.VERSION_KEY.format(sender._meta.label_lower)
+        transaction.on_commit(
+            lambda: self._get_cache().set(key, uuid4().hex, timeout=None),
+            using=using)
+
+    def _build(self, choice, field):
+        objects = choice.objects.model_objects()
+
+        if self._is_model_field(choice, field):
+            return [tuple(item) for item in objects.values_list('pk', field)]
+
+        return [(obj.pk, getattr(obj, field)) for obj in objects]
+
+    def _is_model_field(self, choice, field):
+        result = False
+
+        if self.is_model(choice):
+            try:
+                choice._meta.get_field(field)
+            except FieldDoesNotExist:
+                # The field is a property so the objects are needed.
+                pass
+            else:
+                result = True
+
+        return result
+
+    def _get_uid(self, choice):
+        return 'dcolumn-choice-{}'.format(choice._meta.label_lower)
+
+    def _get_cache(self):
+        return caches[dcolumn_manager.schema_cache_alias]
+
+choice_cache = ChoiceCache()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/export.py
+#
+
+"""
+Export the objects of a collection with their dynamic columns as CSV or
+JSON Lines. The lines are generated one object at a time so they can be
+written to a file or streamed in a response with constant memory.
+"""
+__docformat__ = "restructuredtext en"
+
+import csv
+import json
+import logging
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+log = logging.getLogger('dcolumns.dcolumns.export')
+
+
+#
+# CollectionExporter
+#
+class CollectionExporter(object):
+    """
+    Generates the lines of an export from a queryset of a model that
+    inherits ``CollectionBase``.
+    """
+    CSV = 'csv'
+    JSONL = 'jsonl'
+    FORMATS = (CSV, JSONL,)
+    CONTENT_TYPES = {
+        CSV: 'text/csv',
+        JSONL: 'application/x-ndjson',
+        }
+
+    def __init__(self, queryset, schema, slugs=None, format=CSV,
+                 chunk_size=2000):
+        """
+        Constructor checks the arguments.
+
+        :param queryset: The objects to export.
+        :type queryset: ``CollectionBaseQuerySet``
+        :param schema: The schema of the active collection, its active
+                       columns are exported.
+        :type schema: ``CollectionSchema`` object
+        :param slugs: Optional ``DynamicColumn`` slugs to limit the columns
+                      to.
+        :type slugs: list or None
+        :param format: One of ``FORMATS``.
+        :type format: str
+        :param chunk_size: The number of rows fetched from the database at a
+                           time.
+        :type chunk_size: int
+        :raises ValueError: If the format or a slug is invalid.
+        """
+        if format not in self.FORMATS:
+            raise ValueError("Invalid format '{}', must be one of {}.".format(
+                format, self.FORMATS))
+
+        for slug in slugs or []:
+            if schema.get_column(slug) is None:
+                raise ValueError("Invalid slug '{}'.".format(slug))
+
+        self.queryset = queryset
+        self.format = format
+        self.chunk_size = chunk_size
+        self.slugs = list(slugs) if slugs else [
+            dc.slug for dc in schema.columns]
+        self.fields = [
+            field for field in queryset.model._meta.concrete_fields
+            if 'collection' not in field.name]
+
+    @property
+    def content_type(self):
+        """
+        The content type of the format.
+
+        :rtype: str
+        """
+        return self.CONTENT_TYPES[self.format]
+
+    @property
+    def headers(self):
+        """
+        The field names followed by the slugs.
+
+        :rtype: list
+        """
+        return ['pk'] + [field.name for field in self.fields] + self.slugs
+
+    def rows(self):
+        """
+        Generate a dict for each object keyed by the ``headers``.
+
+        :rtype: A generator of dicts.
+        """
+        for obj, values in self.queryset.iter_key_values(
+            slugs=self.slugs, chunk_size=self.chunk_size):
+            row = {'pk': obj.pk}
+
+            for field in self.fields:
+                row[field.name] = field.value_from_object(obj)
+
+            for slug in self.slugs:
+                row[slug] = values.get(slug)
+
+            yield row
+
+    def lines(self):
+        """
+        Generate the lines of the export, a CSV export starts with a header
+        line.
+
+        :rtype: A generator of str.
+        """
+        if self.format == self.CSV:
+            buffer = _LineBuffer()
+            writer = csv.writer(buffer)
+            headers = self.headers
+            yield writer.writerow(headers)
+
+            for row in self.rows():
+                yield writer.writerow(
+                    ['' if row[key] is None else row[key] for key in headers])
+        else:
+            for row in self.rows():
+                yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _LineBuffer(object):
+    """
+    A file like object that returns what is written so ``csv.writer`` can
+    generate the lines one at a time.
+    """
+
+    def write(self, value):
+        return value
@@ -12,12 +12,18 @@ import logging
 import datetime
 import dateutil
 
+from dateutil.tz import tzutc
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 
+from .choice_cache import choice_cache
 from .manager import dcolumn_manager
-from .models import CollectionBase, DynamicColumn, ColumnCollection, KeyValue
+from .models import (
+    CollectionBase, CollectionBaseQuerySet, DynamicColumn, ColumnCollection,
+    KeyValue)
 
 log = logging.getLogger('dcolumns.dcolumns.forms')
 
@@ -41,13 +47,50 @@ class CollectionBaseFormMixin(forms.ModelForm):
         super(CollectionBaseFormMixin, self).__init__(*args, **kwargs)
         self.coll_name = ''
         self.relations = {}
+        self.schema = None
+
+        if self.instance.pk is not None:
+            # Let has_changed() see the dynamic column values.
+            values = self.instance.serialize_key_values(by_slug=True)
+
+            for slug, value in values.items():
+                if slug in self.fields:
+                    self.initial.setdefault(slug, value)
+
         log.debug("CollectionBaseFormMixin fields: %s, data: %s",
                   self.fields, self.data)
 
+    @cached_property
+    def changed_data(self):
+        """
+        The names of the changed fields, the ``column_collection`` is set by
+        the form so it is not included.
+
+        :rtype: list
+        """
+        return [name for name in super(CollectionBaseFormMixin, self
+                                       ).changed_data
+                if name != 'column_collection']
+
+    def get_schema(self):
+        """
+        Get the compiled schema of the active collection. It is loaded once
+        and reused by ``clean`` and ``save``.
+
+        :rtype: ``CollectionSchema`` object.
+        :raises ColumnCollection.DoesNotExist: If the collection does not
+                                               exist.
+        """
+        if self.schema is None:
+            self.schema = ColumnCollection.objects.get_schema(
+                self.Meta.model.__name__)
+
+        return self.schema
+
     def clean_column_collection(self):
         """
         Return the ``ColumnCollection`` object for the current collection
-        name.
+        name. It is taken from the schema so no query is needed.
 
         :rtype: Django model ``ColumnCollection`` object.
         :raises ColumnCollection.DoesNotExist: If the record does not exist.
@@ -58,8 +101,7 @@ class CollectionBaseFormMixin(forms.ModelForm):
         obj = None
 
         try:
-            obj = ColumnCollection.objects.active().get(
-                related_model__iexact=self.Meta.model.__name__)
+            obj = self.get_schema().collection
         except ColumnCollection.DoesNotExist as e: # pragma: no cover
             msg = _("A ColumnCollection needs to exist before creating "
                     "this object, found collection name {}."
@@ -79,7 +121,7 @@ class CollectionBaseFormMixin(forms.ModelForm):
 
         try:
             self.relations = ColumnCollection.objects.serialize_columns(
-                self.Meta.model.__name__, by_slug=True)
+                self.get_schema().name, by_slug=True)
         except Exception as e: # pragma: no cover
             self.add_error(None, str(e))
 
@@ -89,19 +131,23 @@ class CollectionBaseFormMixin(forms.ModelForm):
     def save(self, commit=True):
         """
         Saves a record that inherits from ``CollectionBase`` and all the
-        ``KeyValue`` objects related to it.
+        ``KeyValue`` objects related to it. The existing ``KeyValue``
+        objects are read with one query and only new or changed values are
+        written. With ``commit=False`` call ``save_deferred`` on the
+        instance after it is saved.
         :param commit: If ``True`` the record is saved else not saved.
         """
         inst = super(CollectionBaseFormMixin, self).save(commit=False)
         request = self.initial.get('request')
         data = dict(self.cleaned_data)
         error = False
+        objs = []
 
         if request:
             inst.updater = request.user
 
             # Populate the creator only on new records.
-            if not hasattr(inst, 'creator') or not inst.creator:
+            if not inst.creator_id:
                 inst.creator = request.user
                 inst.active = True
 
@@ -112,15 +158,19 @@ class CollectionBaseFormMixin(forms.ModelForm):
 
             if relation:
                 try:
-                    inst.set_key_value(slug, value, force=force, defer=True)
-                except ValueError as e:
+                    obj = inst._prepare_key_value(slug, value, force=force)
+                except (ValueError, ValidationError) as e:
                     error = True
 
                     if (relation.get('required')
                         or (not relation.get('required') and value)):
                         self.add_error(slug, e)
+                else:
+                    if obj is not None:
+                        objs.append(obj)
 
         log.debug("Validations errors: %s", error)
+        inst._defer_key_values(objs)
 
         if commit and not error:
             inst.save()
@@ -133,6 +183,397 @@ class CollectionBaseFormMixin(forms.ModelForm):
         exclude = ['creator', 'updater', 'created', 'updated',]
 
 
+#
+# CollectionBaseFormSet
+#
+class CollectionBaseFormSet(forms.BaseModelFormSet):
+    """
+    A model formset to edit many objects that inherit ``CollectionBase``
+    at once. The forms must subclass ``CollectionBaseFormMixin``. All the
+    ``KeyValue`` objects are fetched with one query, the forms share one
+    schema and the select options, and all changes are written in one
+    transaction.
+
+    Changed objects are written with ``bulk_update``, so their ``save()``
+    is not called and no ``pre_save`` or ``post_save`` signals are sent.
+    The ``updated`` and ``updater`` fields are set by the formset. Set
+    ``bulk_update`` to ``False`` to save them one at a time instead.
+    """
+    bulk_update = True
+
+    def __init__(self, *args, **kwargs):
+        """
+        The constructor accepts the ``request`` keyword argument, the
+        request user is the updater of the objects.
+        """
+        self.request = kwargs.pop('request', None)
+        super(CollectionBaseFormSet, self).__init__(*args, **kwargs)
+        self.schema = None
+        self._choice_options = {}
+
+    def get_queryset(self):
+        """
+        Return the queryset with all its ``KeyValue`` objects prefetched.
+
+        :rtype: ``CollectionBaseQuerySet``
+        """
+        if not hasattr(self, '_queryset'):
+            queryset = super(CollectionBaseFormSet, self).get_queryset()
+
+            if (isinstance(queryset, CollectionBaseQuerySet)
+                and queryset._key_value_lookups is None):
+                self._queryset = queryset.prefetch_key_values()
+
+        return self._queryset
+
+    def get_schema(self):
+        """
+        Get the compiled schema of the active collection.
+
+        :rtype: ``CollectionSchema`` object.
+        """
+        if self.schema is None:
+            self.schema = ColumnCollection.objects.get_schema(
+                self.model.__name__)
+
+        return self.schema
+
+    def _construct_form(self, i, **kwargs):
+        form = super(CollectionBaseFormSet, self)._construct_form(i, **kwargs)
+        form.schema = self.get_schema()
+
+        if self.request:
+            form.initial.setdefault('request', self.request)
+
+        for field in form.fields.values():
+            if isinstance(field, DynamicChoiceField) and not field.lazy:
+                field.set_options(self.get_choice_options(field))
+
+        return form
+
+    def get_choice_options(self, field):
+        """
+        Get the select options of a ``DynamicChoiceField``. They are read
+        from the choice cache once and shared by all the forms.
+
+        :param field: A ``DynamicChoiceField`` object.
+        :type field: ``DynamicChoiceField`` object
+        :rtype: A list of ``(pk, value)`` tuples.
+        """
+        key = (field.choice, field.choice_field)
+
+        if key not in self._choice_options:
+            self._choice_options[key] = choice_cache.get_options(
+                field.choice, field.choice_field)
+
+        return self._choice_options[key]
+
+    def save(self, commit=True):
+        """
+        Save the changed objects and their ``KeyValue`` objects. Changed
+        objects are written with one ``bulk_update``, unless ``bulk_update``
+        is ``False``, and the ``KeyValue`` objects with one ``bulk_upsert``
+        and one ``bulk_update``, new and deleted objects are saved one at a
+        time. Nothing is written if a
+        value does not validate, the errors are put on the forms. The
+        options of a registered ``CHOICE`` model are rebuilt since
+        ``bulk_update`` sends no signals.
+
+        :param commit: If ``False`` the objects are returned unsaved, call
+                       ``save_deferred`` on each after it is saved.
+        :type commit: bool
+        :rtype: A list of the saved objects.
+        """
+        if not commit:
+            return super(CollectionBaseFormSet, self).save(commit=False)
+
+        with transaction.atomic(using=KeyValue.objects.db):
+            instances = super(CollectionBaseFormSet, self).save(commit=False)
+            self._clean_deferred(instances)
+
+            if any(form.errors for form in self.forms):
+                # The errors were found when preparing the values.
+                return []
+
+            self._save_instances(instances)
+            KeyValue.objects.save_deferred_for_collections(instances)
+
+            for obj in self.deleted_objects:
+                obj.delete()
+
+            self.save_m2m()
+
+        return instances
+
+    def _clean_deferred(self, instances):
+        # Validate the queued values before anything is written so the
+        # errors go on the form of the object.
+        ids = set(id(inst) for inst in instances)
+
+        for form in self.forms:
+            if id(form.instance) in ids:
+                try:
+                    form.instance._clean_deferred_key_values()
+                except ValidationError as e:
+                    form.add_error(None, e)
+
+    def _save_instances(self, instances):
+        creates = [inst for inst in instances if inst.pk is None]
+        updates = [inst for inst in instances if inst.pk is not None]
+        names = set(field.name for field in self.model._meta.concrete_fields
+                    if not field.primary_key)
+        fields = set(['updater', 'updated'])
+        now = datetime.datetime.now(tzutc())
+
+        for form in self.initial_forms:
+            if form.instance in updates:
+                fields.update(name for name in form.changed_data
+                              if name in names)
+
+        for inst in creates:
+            inst.save()
+
+        if not self.bulk_update:
+            for inst in updates:
+                inst.save()
+
+            return
+
+        # The save() of the model is not called so the fields it would set
+        # are set here.
+        for inst in updates:
+            inst.updated = now
+
+            if self.request:
+                inst.updater = self.request.user
+
+        if updates:
+            self.model.objects.bulk_update(updates, sorted(fields))
+
+            if choice_cache.is_registered(self.model):
+                choice_cache.invalidate(self.model, using=self.model.objects.db)
+
+
+#
+# DynamicChoiceField
+#
+class DynamicChoiceField(forms.ChoiceField):
+    """
+    A select field for a ``CHOICE`` dynamic column. The options come from
+    the choice cache, or the formset, when the field is rendered or
+    validated. Lazy choices
+    only check the submitted value. The cleaned value is the pk of the
+    option, or its text if the relation is stored.
+    """
+
+    def __init__(self, choice, field, store_relation=False, lazy=False,
+                 **kwargs):
+        """
+        Constructor sets up the options.
+
+        :param choice: A registered ``CHOICE`` object.
+        :type choice: ClassType
+        :param field: The field used as the HTML select option text.
+        :type field: str
+        :param store_relation: If ``True`` clean to the option text.
+        :type store_relation: bool
+        :param lazy: If ``True`` the options are not put in the select.
+        :type lazy: bool
+        """
+        self.choice = choice
+        self.choice_field = field
+        self.store_relation = store_relation
+        self.lazy = lazy
+        # Set by a formset so its forms share the options, else they are
+        # read from the choice cache.
+        self.options = None
+        kwargs.setdefault('choices', self.get_options)
+        super(DynamicChoiceField, self).__init__(**kwargs)
+
+    def set_options(self, options):
+        """
+        Use these options instead of reading them from the choice cache.
+
+        :param options: The ``(pk, value)`` tuples without the header.
+        :type options: list
+        """
+        self.options = options
+        # A copied widget still calls the options of the original field.
+        self.choices = self.get_options
+
+    def get_options(self):
+        """
+        Get the select options, lazy choices only have the header.
+
+        :rtype: A list of ``(pk, value)`` tuples.
+        """
+        if self.lazy:
+            options = []
+        elif self.options is not None:
+            options = list(self.options)
+        else:
+            options = choice_cache.get_options(self.choice,
+                                               self.choice_field)
+
+        options.insert(0, (0, _("Choose a value")))
+        return options
+
+    def get_option(self, value):
+        """
+        Get the option for a submitted value.
+
+        :param value: The submitted pk.
+        :type value: str
+        :rtype: A ``(pk, value)`` tuple or ``None`` if not found.
+        """
+        option = None
+
+        if self.lazy:
+            option = choice_cache.get_selected_option(
+                self.choice, self.choice_field, value)
+        else:
+            for pk, text in self.get_options()[1:]:
+                if str(pk) == str(value):
+                    option = (pk, text)
+                    break
+
+        return option
+
+    def prepare_value(self, value):
+        # A stored relation holds the option text, the select needs the pk.
+        if self.store_relation and not self.lazy and isinstance(value, str):
+            for pk, text in self.get_options()[1:]:
+                if text == value:
+                    value = pk
+                    break
+
+        return value
+
+    def has_changed(self, initial, data):
+        if self.disabled:
+            return False
+
+        try:
+            value = self.clean(data) if self.to_python(data) else None
+        except ValidationError:
+            return True
+
+        initial = '' if initial in self.empty_values + [0] else str(initial)
+        return initial != ('' if value is None else str(value))
+
+    def to_python(self, value):
+        # The header option means no value.
+        if value in (0, '0'):
+            value = ''
+
+        return super(DynamicChoiceField, self).to_python(value)
+
+    def valid_value(self, value):
+        return self.get_option(value) is not None
+
+    def clean(self, value):
+        value = super(DynamicChoiceField, self).clean(value)
+
+        if value in self.empty_values:
+            value = None
+        else:
+            pk, text = self.get_option(value)
+            value = text if self.store_relation else pk
+
+        return value
+
+
+#
+# collection_form_factory
+#
+FORM_FIELDS = {
+    DynamicColumn.BOOLEAN: (forms.BooleanField, {}),
+    DynamicColumn.DATE: (forms.DateField, {}),
+    DynamicColumn.DATETIME: (forms.DateTimeField, {}),
+    DynamicColumn.FLOAT: (forms.FloatField, {}),
+    DynamicColumn.NUMBER: (forms.IntegerField, {}),
+    DynamicColumn.TEXT: (forms.CharField, {}),
+    DynamicColumn.TEXT_BLOCK: (forms.CharField, {'widget': forms.Textarea}),
+    DynamicColumn.TIME: (forms.TimeField, {}),
+    }
+_form_classes = {}
+
+
+def collection_form_factory(model, form=CollectionBaseFormMixin,
+                            fields=None):
+    """
+    Get a form class with a field for each active ``DynamicColumn`` in the
+    collection of ``model``. The class is built once for each version of
+    the schema, then the cached class is returned.
+
+    :param model: The model class that inherits ``CollectionBase``.
+    :type model: Model class
+    :param form: The form class to subclass.
+    :type form: ``CollectionBaseFormMixin`` class
+    :param fields: Optional model field names, all editable fields not in
+                   ``form.Meta.exclude`` are used if ``None``.
+    :type fields: list or None
+    :rtype: ``form`` subclass
+    :raises ColumnCollection.DoesNotExist: If there is no active collection
+                                           for the model.
+    """
+    schema = ColumnCollection.objects.get_schema(model.__name__)
+    key = (model, form, tuple(fields) if fields is not None else None)
+    version = (schema.pk, schema.version)
+    cached = _form_classes.get(key)
+
+    if cached is None or cached[0] != version:
+        cached = (version, _build_form_class(model, form, fields, schema))
+        _form_classes[key] = cached
+        log.debug("Built form class for %s, version: %s", model.__name__,
+                  version)
+
+    return cached[1]
+
+
+def _build_form_class(model, form, fields, schema):
+    attrs = {}
+
+    for dc in schema.columns:
+        field = _get_form_field(dc)
+
+        if field is not None:
+            attrs[dc.slug] = field
+
+    meta = {'model': model, 'exclude': list(form.Meta.exclude)}
+
+    if fields is not None:
+        meta['fields'] = list(fields) + list(form.Meta.fields) + list(attrs)
+
+    attrs['Meta'] = type(str('Meta'), (object,), meta)
+    name = str('{}DynamicForm'.format(model.__name__))
+    return type(form)(name, (form,), attrs)
+
+
+def _get_form_field(dc):
+    kwargs = {'label': dc.name, 'required': dc.required}
+
+    if dc.value_type == dc.CHOICE:
+        choice, field = dc.get_choice_relation_object_and_field()
+
+        if choice is None:
+            log.error("Choice relation %s for slug '%s' is not registered.",
+                      dc.relation, dc.slug)
+            return None
+
+        return DynamicChoiceField(
+            choice, field, store_relation=dc.store_relation,
+            lazy=choice.__name__ in dcolumn_manager.lazy_choices, **kwargs)
+
+    if dc.value_type == dc.BOOLEAN:
+        # An unchecked box is a value.
+        kwargs['required'] = False
+
+    field_class, extra = FORM_FIELDS[dc.value_type]
+    kwargs.update(extra)
+    return field_class(**kwargs)
+
+
 #
 # ColumnCollectionAdminForm
 #
@@ -184,6 +625,9 @@ class KeyValueAdminForm(forms.ModelForm):
     """
     Form for validating ``KeyValue`` model objects.
     """
+    # Set by ``KeyValueInline`` so all the inline forms share one query.
+    columns = None
+    column_choices = None
 
     def __init__(self, *args, **kwargs):
         """
@@ -192,7 +636,10 @@ class KeyValueAdminForm(forms.ModelForm):
         super(KeyValueAdminForm, self).__init__(*args, **kwargs)
         log.debug("args: %s, kwargs: %s", args, kwargs)
 
-        if hasattr(self.instance, 'collection'):
+        if self.columns is not None:
+            self.fields['dynamic_column'].queryset = self.columns
+            self.fields['dynamic_column'].choices = self.column_choices
+        elif hasattr(self.instance, 'collection'):
             coll_name = (self.instance.collection.column_collection
                          .related_model)
             columns = ColumnCollection.objects.get_column_collection(coll_name)
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/importer.py
+#
+
+"""
+Import objects of a collection with their dynamic columns from CSV or JSON
+Lines. The records are validated in memory and written in batches, the
+``CollectionBase`` rows, the model rows and the ``KeyValue`` rows of a batch
+each with one bulk insert.
+"""
+__docformat__ = "restructuredtext en"
+
+import csv
+import json
+import logging
+from datetime import datetime
+
+from dateutil.tz import tzutc
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import connections, transaction
+
+from .choice_cache import choice_cache
+from .models import CollectionBase, KeyValue
+
+log = logging.getLogger('dcolumns.dcolumns.importer')
+
+
+#
+# CollectionImporter
+#
+class CollectionImporter(object):
+    """
+    Creates objects of a model that inherits ``CollectionBase`` from
+    records, which are dicts keyed by model field names and
+    ``DynamicColumn`` slugs.
+    """
+    CSV = 'csv'
+    JSONL = 'jsonl'
+    FORMATS = (CSV, JSONL,)
+    # Written by an export but set by the import.
+    IGNORED = ('pk', 'creator', 'updater',)
+
+    def __init__(self, model, schema, user, batch_size=1000, dry_run=False):
+        """
+        Constructor sets up the import.
+
+        :param model: The model class that inherits ``CollectionBase``.
+        :type model: Model class
+        :param schema: The schema of the active collection the objects are
+                       put in.
+        :type schema: ``CollectionSchema`` object
+        :param user: The creator and updater of the objects.
+        :type user: User object
+        :param batch_size: The number of objects written at a time.
+        :type batch_size: int
+        :param dry_run: If ``True`` only validate the records.
+        :type dry_run: bool
+        """
+        self.model = model
+        self.schema = schema
+        self.user = user
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.created = 0
+        self.errors = []
+        names = set(model.objects.get_all_fields_and_slugs())
+        self.fields = {
+            field.name: field for field in model._meta.concrete_fields
+            if field.name in names and not field.primary_key
+            and not field.is_relation}
+        self.slugs = set(dc.slug for dc in schema.columns)
+        # The option texts of each CHOICE column that stores the relation,
+        # read once so the values are not looked up one at a time.
+        self.options = {}
+
+        for dc in schema.columns:
+            if dc.value_type == dc.CHOICE and dc.store_relation:
+                choice, field = dc.get_choice_relation_object_and_field()
+
+                if choice:
+                    self.options[dc.slug] = set(
+                        str(text) for pk, text in
+                        choice_cache.get_options(choice, field))
+
+        self.ignored = set(self.IGNORED) | set(
+            field.name for field in model._meta.concrete_fields
+            if field.primary_key)
+
+    def check_headers(self, headers):
+        """
+        Check that every header is a model field or a ``DynamicColumn``
+        slug. The ``IGNORED`` headers and the primary keys of an export are
+        allowed.
+
+        :param headers: The keys used in the records.
+        :type headers: list
+        :raises ValueError: If a header is unknown.
+        """
+        unknown = [header for header in headers
+                   if header not in self.fields and header not in self.slugs
+                   and header not in self.ignored]
+
+        if unknown:
+            raise ValueError("Unknown fields or slugs {}, must be in {}."
+                             .format(unknown,
+                                     sorted(set(self.fields) | self.slugs)))
+
+    def read(self, stream, format=CSV):
+        """
+        Generate the records from a text stream.
+
+        :param stream: An open text file or other iterable of lines.
+        :type stream: file
+        :param format: One of ``FORMATS``.
+        :type format: str
+        :rtype: A generator of ``(line number, record)`` tuples. JSON Lines
+                that are not a JSON object are put in ``errors`` and
+                skipped.
+        :raises ValueError: If the format or a CSV header is invalid.
+        """
+        if format == self.CSV:
+            reader = csv.DictReader(stream)
+            # All the records have the same headers, check them before
+            # anything is written.
+            self.check_headers(reader.fieldnames or [])
+
+            for record in reader:
+                yield reader.line_num, record
+        elif format == self.JSONL:
+            for num, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    error = "Invalid JSON, {}.".format(e)
+                else:
+                    error = None if isinstance(record, dict) else (
+                        "Invalid record, must be a JSON object.")
+
+                if error:
+                    self.errors.append((num, {NON_FIELD_ERRORS: [error]}))
+                    log.debug("Line %s has errors: %s", num, error)
+                else:
+                    yield num, record
+        else:
+            raise ValueError("Invalid format '{}', must be one of {}.".format(
+                format, self.FORMATS))
+
+    def run(self, records):
+        """
+        Validate and write the records. Invalid records, including those with
+        an unknown key, are skipped and their errors are kept in ``errors``.
+        The options of a registered ``CHOICE`` model are rebuilt once at the
+        end.
+
+        :param records: ``(line number, record)`` tuples, see ``read``.
+        :type records: iterable
+        :rtype: The number of objects created, or that would be created with
+                ``dry_run``.
+        """
+        batch = []
+        checked = {}
+
+        for num, record in records:
+            keys = tuple(record)
+
+            if keys not in checked:
+                try:
+                    self.check_headers(keys)
+                except ValueError as e:
+                    checked[keys] = str(e)
+                else:
+                    checked[keys] = None
+
+            if checked[keys]:
+                self.errors.append((num, {NON_FIELD_ERRORS: [checked[keys]]}))
+                log.debug("Line %s has errors: %s", num, checked[keys])
+                continue
+
+            item = self.build(num, record)
+
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+
+        self.write(batch)
+
+        # Bulk inserts send no signals.
+        if (not self.dry_run and self.created
+            and choice_cache.is_registered(self.model)):
+            choice_cache.invalidate(self.model, using=KeyValue.objects.db)
+
+        return self.created
+
+    def build(self, num, record):
+        """
+        Build and validate an unsaved object and its ``KeyValue`` objects.
+
+        :param num: The line number of the record used in the errors.
+        :type num: int
+        :param record: The values keyed by field name and slug.
+        :type record: dict
+        :rtype: A tuple of the object and a list of ``KeyValue`` objects or
+                ``None`` if the record is invalid.
+        """
+        now = datetime.now(tzutc())
+        obj = self.model(column_collection=self.schema.collection,
+                         creator=self.user, updater=self.user, created=now,
+                         updated=now)
+        errors = {}
+        kvs = []
+
+        for name, field in self.fields.items():
+            if name in record:
+                value = record[name]
+                setattr(obj, field.attname, value)
+
+        try:
+            obj.clean_fields(exclude=['column_collection', 'creator',
+                                      'updater'])
+            obj.clean()
+        except ValidationError as e:
+            errors.update(e.message_dict)
+
+        for slug in self.slugs:
+            value = record.get(slug)
+
+            if value in (None, ''):
+                continue
+
+            try:
+                kv = obj._prepare_key_value(
+                    slug, value, options=self.options.get(slug))
+            except ValidationError as e:
+                errors[slug] = e.messages
+            except ValueError as e:
+                errors[slug] = [str(e)]
+            else:
+                kvs.append(kv)
+
+        if errors:
+            self.errors.append((num, errors))
+            log.debug("Line %s has errors: %s", num, errors)
+            return None
+
+        return obj, kvs
+
+    def write(self, batch):
+        """
+        Write a batch of objects and their ``KeyValue`` objects in one
+        transaction.
+
+        :param batch: Tuples from ``build``.
+        :type batch: list
+        """
+        if not batch:
+            return
+
+        if not self.dry_run:
+            with transaction.atomic(using=KeyValue.objects.db):
+                self._create_objects([obj for obj, kvs in batch])
+                key_values = []
+
+                for obj, kvs in batch:
+                    for kv in kvs:
+                        # The object had no pk when the value was made.
+                        kv.collection = obj
+                        kv.set_typed_values()
+                        key_values.append(kv)
+
+                KeyValue.objects.bulk_create(key_values)
+
+        self.created += len(batch)
+
+    def _create_objects(self, objs):
+        """
+        Bulk create the ``CollectionBase`` rows then bulk insert the child
+        rows with their pks. Django cannot ``bulk_create`` a multi-table
+        model. When the database does not return the new pks from a bulk
+        insert each ``CollectionBase`` row is inserted on its own, the child
+        rows are still inserted in bulk. A model with more than one parent
+        is saved one object at a time.
+        """
+        db = CollectionBase.objects.db
+        connection = connections[db]
+
+        if self.model._meta.get_parent_list() != [CollectionBase]:
+            for obj in objs:
+                obj.save_base(force_insert=True)
+
+            return
+
+        fields = [field for field in CollectionBase._meta.concrete_fields
+                  if not field.primary_key]
+        parents = [CollectionBase(**{field.attname: getattr(obj, field.attname)
+                                     for field in fields})
+                   for obj in objs]
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            CollectionBase.objects.bulk_create(parents)
+        else:
+            returning = CollectionBase._meta.db_returning_fields
+
+            for parent in parents:
+                row = CollectionBase._base_manager._insert(
+                    [parent], fields=fields, returning_fields=returning,
+                    using=db)[0]
+
+                for value, field in zip(row, returning):
+                    setattr(parent, field.attname, value)
+
+        for obj, parent in zip(objs, parents):
+            setattr(obj, CollectionBase._meta.pk.attname, parent.pk)
+            setattr(obj, self.model._meta.pk.attname, parent.pk)
+            obj._state.adding = False
+            obj._state.db = db
+
+        fields = self.model._meta.local_concrete_fields
+        batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+
+        for start in range(0, len(objs), batch_size):
+            self.model._base_manager._insert(
+                objs[start:start + batch_size], fields=fields, raw=True,
+                using=db)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/management/commands/backfill_typed_values.py
+#
+
+"""
+Set the typed value fields on all ``KeyValue`` objects from their text
+values. The migration that adds the typed fields already sets them, run
+this if values were written some other way, e.g. with raw SQL.
+"""
+__docformat__ = "restructuredtext en"
+
+from django.core.management.base import BaseCommand
+
+from dcolumn.dcolumns.models import KeyValue
+
+
+class Command(BaseCommand):
+    help = "Set the typed value fields on all KeyValue objects."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, dest='batch_size',
+            help="Number of KeyValue objects updated per query.")
+
+    def handle(self, *args, **options):
+        total = KeyValue.objects.backfill_typed_values(
+            batch_size=options['batch_size'])
+        self.stdout.write("{} KeyValue objects updated.".format(total))
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/management/commands/dedupe_key_values.py
+#
+
+"""
+Delete duplicate ``KeyValue`` objects, keeping the newest one for each
+collection and dynamic column pair.
+"""
+__docformat__ = "restructuredtext en"
+
+from django.core.management.base import BaseCommand
+
+from dcolumn.dcolumns.models import KeyValue
+
+
+class Command(BaseCommand):
+    help = ("Delete duplicate KeyValue objects keeping the newest one for "
+            "each collection and dynamic column.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run',
+            help="Only report the number of duplicates.")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        total = KeyValue.objects.remove_duplicates(dry_run=dry_run)
+        self.stdout.write("{} duplicate KeyValue objects {}.".format(
+            total, "found" if dry_run else "deleted"))
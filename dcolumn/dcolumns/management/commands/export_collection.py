@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/management/commands/export_collection.py
+#
+
+"""
+Export the objects of a collection with their dynamic columns as CSV or
+JSON Lines.
+"""
+__docformat__ = "restructuredtext en"
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dcolumn.dcolumns.export import CollectionExporter
+from dcolumn.dcolumns.models import ColumnCollection
+
+
+class Command(BaseCommand):
+    help = ("Export the objects of a collection with their dynamic columns "
+            "as CSV or JSON Lines.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'class_name', help="The name of the collection, e.g. book.")
+        parser.add_argument(
+            '--format', choices=CollectionExporter.FORMATS,
+            default=CollectionExporter.CSV, dest='format',
+            help="The export format.")
+        parser.add_argument(
+            '--slug', action='append', dest='slugs',
+            help="Only export this dynamic column, can be repeated.")
+        parser.add_argument(
+            '--output', dest='output',
+            help="The file to write to, the default is stdout.")
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000, dest='chunk_size',
+            help="Number of rows fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        class_name = options['class_name']
+
+        try:
+            model = ColumnCollection.objects.get_collection_model(class_name)
+            exporter = CollectionExporter(
+                model.objects.all(),
+                ColumnCollection.objects.get_schema(class_name),
+                slugs=options['slugs'], format=options['format'],
+                chunk_size=options['chunk_size'])
+        except (ValueError, ColumnCollection.DoesNotExist) as e:
+            raise CommandError(e)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='',
+                      encoding='utf-8') as f:
+                for line in exporter.lines():
+                    f.write(line)
+        else:
+            for line in exporter.lines():
+                self.stdout.write(line, ending='')
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/management/commands/import_collection.py
+#
+
+"""
+Import objects of a collection with their dynamic columns from CSV or JSON
+Lines.
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from dcolumn.dcolumns.importer import CollectionImporter
+from dcolumn.dcolumns.models import ColumnCollection
+
+
+class Command(BaseCommand):
+    help = ("Import objects of a collection with their dynamic columns from "
+            "CSV or JSON Lines.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'class_name', help="The name of the collection, e.g. book.")
+        parser.add_argument('path', help="The file to import.")
+        parser.add_argument(
+            '--user', required=True, dest='username',
+            help="The username of the creator of the objects.")
+        parser.add_argument(
+            '--format', choices=CollectionImporter.FORMATS, dest='format',
+            help="The file format, the default is taken from the extension.")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000, dest='batch_size',
+            help="Number of objects written at a time.")
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run',
+            help="Only validate the records.")
+
+    def handle(self, *args, **options):
+        class_name = options['class_name']
+        path = options['path']
+        format = options['format'] or os.path.splitext(path)[1].lstrip('.')
+        User = get_user_model()
+
+        try:
+            user = User.objects.get(username=options['username'])
+            model = ColumnCollection.objects.get_collection_model(class_name)
+            importer = CollectionImporter(
+                model, ColumnCollection.objects.get_schema(class_name), user,
+                batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+            with open(path, newline='', encoding='utf-8') as f:
+                total = importer.run(importer.read(f, format=format))
+        except (ValueError, User.DoesNotExist,
+                ColumnCollection.DoesNotExist) as e:
+            raise CommandError(e)
+
+        for num, errors in importer.errors:
+            for key, messages in sorted(errors.items()):
+                self.stderr.write("Line {}: {}: {}".format(
+                    num, key, ' '.join(messages)))
+
+        self.stdout.write("{} objects {}, {} records with errors.".format(
+            total, "valid" if options['dry_run'] else "created",
+            len(importer.errors)))
@@ -24,8 +24,10 @@ class DynamicColumnManager(object):
     """
     __shared_state = {}
     _relations = []
+    _relation_map = {0: _("Choose a Relation")}
     _relation_numbers = set()
     _choice_map = {}
+    _lazy_choices = set()
     _css_containers = []
     _css_container_map = {}
 
@@ -35,7 +37,7 @@ class DynamicColumnManager(object):
         """
         self.__dict__ = self.__shared_state
 
-    def register_choice(self, choice, relation_num, field):
+    def register_choice(self, choice, relation_num, field, lazy=False):
         """
         Register choice field types. These can be Foreign Key or
         multiple-choice non-database columns. ManyToMany is not supported
@@ -51,7 +53,14 @@ class DynamicColumnManager(object):
         :param field: A field from the model or choice object used as the HTML
                       select option text.
         :type field: str
+        :param lazy: If ``True`` only the selected option is put in the
+                     context, other options are searched for with the
+                     ``dcolumns:api-choices`` endpoint. Use this for large
+                     tables.
+        :type lazy: bool
         """
+        from .choice_cache import choice_cache
+
         if relation_num in self._relation_numbers:
             msg = ("Invalid relation number {} is already used. [choice: {}, "
                    "field: {}]").format(relation_num, choice, field)
@@ -68,10 +77,16 @@ class DynamicColumnManager(object):
         self._check_field(choice, field)
         self._relation_numbers.add(relation_num)
         self._relations.append((relation_num, choice.__name__))
+        self._relation_map[relation_num] = choice.__name__
         self._choice_map[choice.__name__] = (choice, field)
-        log.debug("choice: %s, relation_num: %s, field: %s, relations: %s, "
-                  "choice_map: %s", choice, relation_num, field,
-                  self._relations, self._choice_map)
+
+        if lazy:
+            self._lazy_choices.add(choice.__name__)
+
+        choice_cache.connect(choice)
+        log.debug("choice: %s, relation_num: %s, field: %s, lazy: %s, "
+                  "relations: %s, choice_map: %s", choice, relation_num,
+                  field, lazy, self._relations, self._choice_map)
 
     def _unregister_choice(self, choice):
         """
@@ -83,6 +98,8 @@ class DynamicColumnManager(object):
         :param choice: This is a ``CHOICE`` object not a string.
         :type choice: ``CHOICE`` object
         """
+        from .choice_cache import choice_cache
+
         _choice, field = self._choice_map.get(choice.__name__, (None, None))
         relation_num = dict([(v, k) for k, v in self._relations]).get(
             choice.__name__)
@@ -90,7 +107,10 @@ class DynamicColumnManager(object):
         if _choice and field and relation_num:
             self._choice_map.pop(_choice.__name__)
             self._relations.remove((relation_num, _choice.__name__))
+            self._relation_map.pop(relation_num)
             self._relation_numbers.remove(relation_num)
+            self._lazy_choices.discard(_choice.__name__)
+            choice_cache.disconnect(_choice)
         else:
             msg = "Tried to remove an invalid choice object {}.".format(choice)
             log.error(msg)
@@ -126,7 +146,7 @@ class DynamicColumnManager(object):
         """
         if len(self._relations) and self._relations[0][0] != 0:
             self._relations.sort(key=lambda x: x[1].lower())
-            self._relations.insert(0, (0, _("Choose a Relation")))
+            self._relations.insert(0, (0, self._relation_map[0]))
 
         return self._relations
 
@@ -138,8 +158,11 @@ class DynamicColumnManager(object):
         :rtype: A dict of the choices. ``{num, <object name>, ...}`` The key
                 is the number given when added with the register_choice method.
                 The value is the string representation of the choice object.
+                The key ``0`` is always the "Choose a Relation" option. The
+                dict is kept up to date as choices are registered, a copy of
+                it is returned.
         """
-        return dict(self._relations)
+        return dict(self._relation_map)
 
     @property
     def choice_map(self):
@@ -153,6 +176,16 @@ class DynamicColumnManager(object):
         """
         return self._choice_map
 
+    @property
+    def lazy_choices(self):
+        """
+        A property that returns the names of the choices registered with
+        ``lazy=True``.
+
+        :rtype: A ``frozenset`` of choice names.
+        """
+        return frozenset(self._lazy_choices)
+
     def register_css_containers(self, container_list):
         """
         Register the CSS container objects. This method is usually called in
@@ -271,6 +304,22 @@ class DynamicColumnManager(object):
 
         return result
 
+    @property
+    def schema_cache_alias(self):
+        """
+        Gets the value of settings.DYNAMIC_COLUMNS.SCHEMA_CACHE. This is the
+        alias of the Django cache that holds the schema version shared by
+        all the worker processes. The default is ``'default'``.
+
+        :rtype: str
+        """
+        if hasattr(settings, 'DYNAMIC_COLUMNS'):
+            result = settings.DYNAMIC_COLUMNS.get('SCHEMA_CACHE', 'default')
+        else:
+            result = 'default'
+
+        return result
+
     def get_related_object_names(self, choose=True):
         """
         This method provides the models that inherit ``CollectionBase``
@@ -303,7 +352,7 @@ class DynamicColumnManager(object):
         :rtype: The model object and field used in the HTML select option text
                 value.
         """
-        return self.choice_map.get(self.choice_relation_map.get(relation),
+        return self.choice_map.get(self._relation_map.get(relation),
                                    (None, None))
 
 dcolumn_manager = DynamicColumnManager()
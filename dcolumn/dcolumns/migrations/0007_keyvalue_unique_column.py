@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 3.2.25 on 2026-10-17 03:19
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Keep the newest KeyValue for each collection and dynamic column so the
+    unique constraint can be created.
+    """
+    KeyValue = apps.get_model('dcolumns', 'KeyValue')
+    groups = KeyValue.objects.order_by().values(
+        'collection', 'dynamic_column').annotate(
+        count=models.Count('pk'), keep=models.Max('pk')).filter(count__gt=1)
+
+    for group in groups:
+        KeyValue.objects.filter(
+            collection=group['collection'],
+            dynamic_column=group['dynamic_column']).exclude(
+            pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dcolumns', '0006_auto_20160906_1920'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='keyvalue',
+            constraint=models.UniqueConstraint(fields=('collection', 'dynamic_column'), name='dcolumns_keyvalue_unique_column'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 3.2.25 on 2026-10-17 03:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def backfill_typed_values(apps, schema_editor):
+    """
+    Set the new typed value fields of the existing KeyValue objects. The
+    conversion is done by the current models, the historical
+    DynamicColumn only supplies the value types.
+    """
+    from dcolumn.dcolumns import models as dcolumns_models
+
+    db = schema_editor.connection.alias
+    KeyValue = apps.get_model('dcolumns', 'KeyValue')
+    DynamicColumn = apps.get_model('dcolumns', 'DynamicColumn')
+    columns = {
+        pk: dcolumns_models.DynamicColumn(
+            pk=pk, name=name, value_type=value_type,
+            store_relation=store_relation)
+        for pk, name, value_type, store_relation in
+        DynamicColumn.objects.using(db).values_list(
+            'pk', 'name', 'value_type', 'store_relation')}
+    dcolumns_models.backfill_typed_values(
+        KeyValue.objects.using(db),
+        lambda obj: columns[obj.dynamic_column_id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dcolumns', '0007_keyvalue_unique_column'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keyvalue',
+            name='value_bool',
+            field=models.BooleanField(blank=True, editable=False, null=True, verbose_name='Boolean Value'),
+        ),
+        migrations.AddField(
+            model_name='keyvalue',
+            name='value_datetime',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Date & Time Value'),
+        ),
+        migrations.AddField(
+            model_name='keyvalue',
+            name='value_float',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Float Value'),
+        ),
+        migrations.AddField(
+            model_name='keyvalue',
+            name='value_int',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Integer Value'),
+        ),
+        migrations.RunPython(backfill_typed_values, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='keyvalue',
+            index=models.Index(fields=['dynamic_column', 'value_int'], name='dcolumns_kv_int_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='keyvalue',
+            index=models.Index(fields=['dynamic_column', 'value_float'], name='dcolumns_kv_float_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='keyvalue',
+            index=models.Index(fields=['dynamic_column', 'value_datetime'], name='dcolumns_kv_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='keyvalue',
+            index=models.Index(fields=['dynamic_column', 'value_bool'], name='dcolumns_kv_bool_idx'),
+        ),
+    ]
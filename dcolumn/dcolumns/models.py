@@ -9,12 +9,19 @@ Dynamic Column dependent models.
 """
 __docformat__ = "restructuredtext en"
 
+import re
+import copy
 import logging
+import itertools
 import datetime
 from dateutil import parser
 from collections import OrderedDict
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, connections, IntegrityError
+from django.db.models.functions import Cast, TruncDate, TruncTime
+from django.core.signals import request_started
+from django.utils import timezone
 from django.utils.html import format_html, format_html_join
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
@@ -26,10 +33,16 @@ from dcolumn.common.model_mixins import (
     UserModelMixin, TimeModelMixin, StatusModelMixin, StatusModelManagerMixin,
     ValidateOnSaveMixin)
 
+from .choice_cache import choice_cache
 from .manager import dcolumn_manager
+from .schema import schema_cache
 
 log = logging.getLogger('dcolumns.dcolumns.models')
 
+# At most one leading minus sign.
+_NUMBER_RE = re.compile(r'-?[0-9]+')
+_FLOAT_RE = re.compile(r'-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)')
+
 
 #
 # DynamicColumn
@@ -47,10 +60,11 @@ class DynamicColumnManager(StatusModelManagerMixin):
         :rtype: A dict of ``{<relation class name>: <slug>, ...}``.
         """
         result = {}
+        relation_map = dcolumn_manager.choice_relation_map
 
         for record in self.active():
             if record.value_type == self.model.CHOICE:
-                name = dcolumn_manager.choice_relation_map.get(record.relation)
+                name = relation_map.get(record.relation)
                 result[name] = record.slug
 
         return result
@@ -245,6 +259,34 @@ class ColumnCollectionManager(StatusModelManagerMixin):
 
         return queryset
 
+    def get_schema(self, name):
+        """
+        Get the compiled schema for the named collection. The schema is
+        cached in process until a ``DynamicColumn`` or ``ColumnCollection``
+        changes.
+
+        :param name: Name of the column collection.
+        :type name: str
+        :rtype: ``CollectionSchema`` object.
+        :raises ColumnCollection.DoesNotExist: If the collection name is not
+                                               found.
+        """
+        return schema_cache.get_by_name(name)
+
+    def get_collection_model(self, name):
+        """
+        Get the model class that inherits ``CollectionBase`` for a
+        collection name.
+
+        :param name: Name of the column collection.
+        :type name: str
+        :rtype: Model class
+        :raises ValueError: If the name is not the name of a model that
+                            inherits ``CollectionBase``.
+        """
+        name = dcolumn_manager.get_collection_name(name)
+        return CollectionBase._meta.get_field(name).related_model
+
     def serialize_columns(self, name, obj=None, by_slug=False):
         """
         Serialize the ``DynamicColumn`` for the ``name`` of this collection
@@ -264,7 +306,7 @@ class ColumnCollectionManager(StatusModelManagerMixin):
         :rtype: An OrderedDict of serialized ``KeyValue`` values and their
                 ``DynamicColumn`` meta data.
         """
-        records = self.get_column_collection(name)
+        schema = self.get_schema(name)
         result = OrderedDict()
 
         if obj:
@@ -275,7 +317,7 @@ class ColumnCollectionManager(StatusModelManagerMixin):
         else:
             key = 'pk'
 
-        for record in records:
+        for record in schema.columns:
             rec = result.setdefault(getattr(record, key), {})
             rec['pk'] = record.pk
             rec['name'] = record.name
@@ -287,11 +329,7 @@ class ColumnCollectionManager(StatusModelManagerMixin):
                 rec['store_relation'] = record.store_relation
 
             rec['required'] = record.required
-            location = record.location
-            # We convert the list to a dict because css_container_map may
-            # not be keyed with integers.
-            rec['location'] = dict(dcolumn_manager.css_containers).get(
-                location, '')
+            rec['location'] = schema.locations[record.slug]
             rec['order'] = record.order
             if obj: rec['value'] = key_value_map.get(record.pk, '')
 
@@ -307,8 +345,9 @@ class ColumnCollectionManager(StatusModelManagerMixin):
         :rtype: A ``list`` of all ``CHOICE`` items including both model and
                 choice items.
         """
-        records = self.get_column_collection(name)
-        return [dcolumn_manager.choice_relation_map.get(record.relation)
+        records = self.get_schema(name).columns
+        relation_map = dcolumn_manager.choice_relation_map
+        return [relation_map.get(record.relation)
                 for record in records if record.relation]
 
     def get_collection_choices(self, name, use_pk=False):
@@ -325,7 +364,7 @@ class ColumnCollectionManager(StatusModelManagerMixin):
         :type use_pk: bool
         :rtype: A list of tuples. ``[(<slug or pk>, <KeyValue name>), ...]``
         """
-        records = self.get_column_collection(name)
+        records = self.get_schema(name).columns
         choices = [(use_pk and r.pk or r.slug, r.name) for r in records]
         return choices
 
@@ -383,14 +422,315 @@ class ColumnCollection(TimeModelMixin, UserModelMixin, StatusModelMixin,
             self.dynamic_column.add(*new_dcs)
 
 
+#
+# KeyValueVersions
+#
+class KeyValueVersions(object):
+    """
+    Keeps a version number for the ``KeyValue`` objects of each
+    collection. Every write of a ``KeyValue`` object gives its collection
+    a new version, so a ``CollectionBase`` instance knows its cached
+    ``KeyValue`` objects are out of date even when the write was done
+    through another instance or a queryset. Only writes made in this
+    process are seen.
+    """
+    MAX_SIZE = 10000
+
+    def __init__(self):
+        self._counter = itertools.count(1)
+        self._epoch = 0
+        self._versions = {}
+
+    def get(self, pk):
+        """
+        Returns the current version of a collection.
+
+        :param pk: The ``CollectionBase`` primary key.
+        :type pk: int
+        :rtype: tuple
+        """
+        return self._epoch, self._versions.get(pk, 0)
+
+    def bump(self, pks=None):
+        """
+        Give collections a new version.
+
+        :param pks: The ``CollectionBase`` primary keys, if ``None`` every
+                    collection gets a new version.
+        :type pks: list or None
+        """
+        pks = None if pks is None else set(pks)
+
+        # Starting a new epoch makes every version out of date and keeps
+        # the dict from growing without bound.
+        if pks is None or len(self._versions) + len(pks) > self.MAX_SIZE:
+            self._versions = {}
+            self._epoch = next(self._counter)
+
+        if pks:
+            version = next(self._counter)
+
+            for pk in pks:
+                self._versions[pk] = version
+
+key_value_versions = KeyValueVersions()
+
+
 #
 # CollectionBase
 #
+class CollectionBaseQuerySet(models.QuerySet):
+    """
+    The queryset class for any model that inherits ``CollectionBase``.
+    """
+    _TYPED_LOOKUPS = ('exact', 'gt', 'gte', 'lt', 'lte',)
+
+    def __init__(self, *args, **kwargs):
+        super(CollectionBaseQuerySet, self).__init__(*args, **kwargs)
+        self._key_value_lookups = None
+        self._key_value_done = False
+
+    def _clone(self):
+        clone = super(CollectionBaseQuerySet, self)._clone()
+        clone._key_value_lookups = self._key_value_lookups
+        return clone
+
+    def _fetch_all(self):
+        super(CollectionBaseQuerySet, self)._fetch_all()
+
+        if (self._key_value_lookups is not None and not self._key_value_done
+            and issubclass(self._iterable_class, models.query.ModelIterable)):
+            KeyValue.objects.prefetch_for_collections(
+                self._result_cache, slugs=self._key_value_lookups or None)
+            self._key_value_done = True
+
+    def prefetch_key_values(self, *slugs):
+        """
+        Fetch the ``KeyValue`` objects of every object in this queryset
+        with one additional query when the queryset is evaluated. The
+        values are then read from memory by ``get_key_value`` and the
+        ``single_display`` template tag.
+
+        :param slugs: Optional ``DynamicColumn`` slugs, if given only these
+                      values are fetched. Other slugs are then fetched one
+                      at a time when read.
+        :type slugs: str
+        :rtype: Django queryset.
+        """
+        clone = self._chain()
+        clone._key_value_lookups = tuple(slugs)
+        return clone
+
+    def filter_key_values(self, **lookups):
+        """
+        Filter on ``KeyValue`` values in the database. Each keyword is a
+        ``DynamicColumn`` slug with an optional Django lookup, for example
+        ``filter_key_values(language=2, edition__gt=2)``. Each one becomes
+        an ``EXISTS`` subquery on the typed value field for the column's
+        value type, so numbers, dates and booleans compare as their type.
+        All the lookups must match.
+
+        :param lookups: ``<slug>[__<lookup>]=<value>`` keyword arguments.
+                        The values are the same as for ``set_key_value``.
+        :rtype: Django queryset.
+        :raises ValueError: If a slug is not found or a value cannot be
+                            converted to the column's type.
+        """
+        schema = self._get_schema()
+        queryset = self
+
+        for key, value in lookups.items():
+            slug, sep, lookup = key.partition('__')
+            dc = schema.get_column(slug)
+
+            if dc is None:
+                msg = "Could not find DynamicColumn for slug '{}'.".format(
+                    slug)
+                log.error(msg)
+                raise ValueError(msg)
+
+            field = KeyValue.get_typed_field(dc)
+            lookup = lookup or 'exact'
+
+            if lookup == 'isnull':
+                exists = models.Exists(KeyValue.objects.filter(
+                    collection=models.OuterRef('pk'), dynamic_column=dc,
+                    **{field + '__isnull': False}))
+                queryset = queryset.filter(~exists if value else exists)
+                continue
+
+            if lookup in self._TYPED_LOOKUPS:
+                value = KeyValue.to_typed_value(dc, value)
+            elif lookup in ('in', 'range'):
+                value = [KeyValue.to_typed_value(dc, v) for v in value]
+
+            queryset = queryset.filter(models.Exists(KeyValue.objects.filter(
+                collection=models.OuterRef('pk'), dynamic_column=dc,
+                **{'{}__{}'.format(field, lookup): value})))
+
+        return queryset
+
+    def with_key_values(self, *slugs):
+        """
+        Annotate each object with the values of ``DynamicColumn`` slugs as
+        if they were fields. Each slug becomes a subquery on the typed value
+        field, so the annotations have the column's type and can be used in
+        ``values()``, ``order_by()`` and ``filter()``. ``DATE`` and ``TIME``
+        values are returned as dates and times. Missing values are
+        ``None``. A slug with the name of a field, attribute or annotation
+        of the model cannot be used.
+
+        :param slugs: The ``DynamicColumn`` slugs, if none are given all
+                      the active columns are used except those with a name
+                      that cannot be used.
+        :type slugs: str
+        :rtype: Django queryset.
+        :raises ValueError: If a slug is not found or has the name of a
+                            field, attribute or annotation of the model.
+        """
+        schema = self._get_schema()
+        annotations = {}
+
+        if slugs:
+            clashes = self._get_name_clashes(slugs)
+
+            if clashes:
+                msg = ("The DynamicColumn slugs {} have the names of fields, "
+                       "attributes or annotations of {}.").format(
+                    clashes, self.model.__name__)
+                log.error(msg)
+                raise ValueError(msg)
+        else:
+            slugs = [dc.slug for dc in schema.columns]
+            clashes = self._get_name_clashes(slugs)
+
+            if clashes:
+                log.warning("The DynamicColumn slugs %s have the names of "
+                            "fields, attributes or annotations of %s, they "
+                            "are not annotated.", clashes,
+                            self.model.__name__)
+                slugs = [slug for slug in slugs if slug not in clashes]
+
+        for slug in slugs:
+            dc = schema.get_column(slug)
+
+            if dc is None:
+                msg = "Could not find DynamicColumn for slug '{}'.".format(
+                    slug)
+                log.error(msg)
+                raise ValueError(msg)
+
+            annotations[slug] = self._key_value_expression(dc)
+
+        return self.annotate(**annotations)
+
+    def iter_key_values(self, slugs=None, chunk_size=2000):
+        """
+        Walk the objects in ``pk`` order and yield each one with its decoded
+        values. The objects and the ``KeyValue`` rows are read with
+        ``iterator()``, two queries however many objects there are, and the
+        rows are merged on the collection id so memory use stays constant.
+        The values are in the same form as
+        ``serialize_key_values(by_slug=True)``.
+
+        :param slugs: Optional ``DynamicColumn`` slugs to limit the values
+                      to.
+        :type slugs: list or None
+        :param chunk_size: The number of rows fetched from the database at a
+                           time.
+        :type chunk_size: int
+        :rtype: A generator of ``(object, {<slug>: <value>, ...})`` tuples.
+        """
+        queryset = self.order_by('pk')
+        rows = KeyValue.objects.filter(
+            collection__in=queryset.values('pk')).order_by(
+            'collection_id').values_list(
+            'collection_id', 'dynamic_column_id', 'value').iterator(
+            chunk_size=chunk_size)
+        row = next(rows, None)
+
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            schema = schema_cache.get_by_pk(obj.column_collection_id)
+            values = {}
+
+            while row is not None and row[0] < obj.pk:
+                row = next(rows, None)
+
+            while row is not None and row[0] == obj.pk:
+                dc = schema.by_pk.get(row[1])
+
+                if dc is not None and (not slugs or dc.slug in slugs):
+                    kv = KeyValue(dynamic_column=dc, value=row[2])
+                    values[dc.slug] = obj._decode_key_value(
+                        kv, choice_raw=True)
+
+                row = next(rows, None)
+
+            yield obj, values
+
+    def _key_value_expression(self, dc):
+        field = KeyValue.get_typed_field(dc)
+        expression = models.Subquery(KeyValue.objects.filter(
+            collection=models.OuterRef('pk'), dynamic_column=dc).order_by(
+            ).values(field)[:1], output_field=KeyValue._meta.get_field(field))
+
+        # The typed value is stored as a UTC datetime.
+        if dc.value_type == dc.DATE:
+            expression = TruncDate(expression, tzinfo=datetime.timezone.utc)
+        elif dc.value_type == dc.TIME:
+            expression = TruncTime(expression, tzinfo=datetime.timezone.utc)
+
+        return expression
+
+    def _get_schema(self):
+        return ColumnCollection.objects.get_schema(
+            dcolumn_manager.get_collection_name(self.model.__name__))
+
+    def _get_name_clashes(self, slugs):
+        # An annotation cannot replace a field, attribute or annotation.
+        names = set(self.query.annotations)
+
+        for field in self.model._meta.get_fields():
+            names.add(field.name)
+            names.add(getattr(field, 'attname', field.name))
+
+        return [slug for slug in slugs
+                if slug in names or hasattr(self.model, slug)]
+
+
 class CollectionBaseManager(models.Manager):
     """
     The manager class for any model that inherits ``CollectionBase``.
     """
 
+    def get_queryset(self):
+        return CollectionBaseQuerySet(self.model, using=self._db)
+
+    def prefetch_key_values(self, *slugs):
+        """
+        See ``CollectionBaseQuerySet.prefetch_key_values``.
+        """
+        return self.get_queryset().prefetch_key_values(*slugs)
+
+    def filter_key_values(self, **lookups):
+        """
+        See ``CollectionBaseQuerySet.filter_key_values``.
+        """
+        return self.get_queryset().filter_key_values(**lookups)
+
+    def with_key_values(self, *slugs):
+        """
+        See ``CollectionBaseQuerySet.with_key_values``.
+        """
+        return self.get_queryset().with_key_values(*slugs)
+
+    def iter_key_values(self, slugs=None, chunk_size=2000):
+        """
+        See ``CollectionBaseQuerySet.iter_key_values``.
+        """
+        return self.get_queryset().iter_key_values(
+            slugs=slugs, chunk_size=chunk_size)
+
     def model_objects(self, active=True):
         """
         Returns a list of all objects on this model.
@@ -527,6 +867,10 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
     def __init__(self, *args, **kwargs):
         super(CollectionBase, self).__init__(*args, **kwargs)
         self.__save_deferred = []
+        self._key_value_cache = None
+        self._key_value_slugs = None
+        self._key_value_version = None
+        self._decoded_value_cache = {}
 
     def save(self, *args, **kwargs):
         """
@@ -534,6 +878,138 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
         """
         super(CollectionBase, self).save(*args, **kwargs)
 
+    def refresh_from_db(self, *args, **kwargs):
+        """
+        Reloading the instance also drops any cached ``KeyValue`` objects.
+        """
+        super(CollectionBase, self).refresh_from_db(*args, **kwargs)
+        self.clear_key_value_cache()
+
+    @property
+    def schema(self):
+        """
+        The compiled schema of this object's ``ColumnCollection``.
+
+        :rtype: ``CollectionSchema`` object.
+        """
+        return schema_cache.get_by_pk(self.column_collection_id)
+
+    def clear_key_value_cache(self):
+        """
+        Drop the cached ``KeyValue`` objects and their decoded values. The
+        next read will reload them from the database.
+        """
+        self._key_value_cache = None
+        self._key_value_slugs = None
+        self._key_value_version = None
+        self._decoded_value_cache.clear()
+
+    def _key_value_cache_is_current(self):
+        """
+        Returns ``True`` if the cache is loaded and no ``KeyValue`` object
+        of this instance has been written since.
+
+        :rtype: bool
+        """
+        return (self._key_value_cache is not None and
+                self._key_value_version == key_value_versions.get(self.pk))
+
+    def _get_key_value_cache(self):
+        """
+        Returns a dict of the ``KeyValue`` objects for this instance keyed
+        by their ``DynamicColumn`` slug. All the objects are loaded with a
+        single query the first time this method is called, after that the
+        dict is kept up to date by ``set_key_value`` and the other write
+        methods of this instance. It is reloaded if the ``KeyValue``
+        objects were written some other way.
+
+        .. note::
+          Only writes made in this process are seen. Call
+          ``clear_key_value_cache`` if the rows were changed by another
+          process.
+
+        :rtype: dict
+        """
+        if (not self._key_value_cache_is_current()
+            or self._key_value_slugs is not None):
+            if self.pk is None:
+                cache = {}
+            else:
+                cache = {
+                    kv.dynamic_column.slug: kv
+                    for kv in self.keyvalues.select_related('dynamic_column')
+                    }
+
+            self._set_key_value_cache(cache)
+
+        return self._key_value_cache
+
+    def _set_key_value_cache(self, cache, slugs=None):
+        """
+        Replace the cached ``KeyValue`` objects.
+
+        :param cache: A dict of ``KeyValue`` objects keyed by slug.
+        :type cache: dict
+        :param slugs: If only some slugs were loaded, the slugs that were.
+        :type slugs: list or None
+        """
+        self._key_value_cache = cache
+        self._key_value_slugs = set(slugs) if slugs is not None else None
+        self._key_value_version = key_value_versions.get(self.pk)
+        self._decoded_value_cache.clear()
+
+    def _get_cached_key_value(self, slug):
+        """
+        Returns the cached ``KeyValue`` object for a single slug. If only
+        some slugs were prefetched and this is not one of them it is
+        fetched on its own.
+
+        :param slug: The ``DynamicColumn`` slug.
+        :type slug: str
+        :rtype: ``KeyValue`` object or ``None``.
+        """
+        if not self._key_value_cache_is_current():
+            self.clear_key_value_cache()
+
+        if (self._key_value_slugs is not None
+            and slug not in self._key_value_slugs):
+            obj = self.keyvalues.select_related('dynamic_column').filter(
+                dynamic_column__slug=slug).first()
+            self._key_value_slugs.add(slug)
+
+            if obj is not None:
+                self._key_value_cache[slug] = obj
+
+            return obj
+
+        if self._key_value_cache is None:
+            self._get_key_value_cache()
+
+        return self._key_value_cache.get(slug)
+
+    def _update_key_value_cache(self, obj, current):
+        """
+        Write a saved ``KeyValue`` object through to the cache. Nothing is
+        done if the cache has not been loaded yet.
+
+        :param obj: A ``KeyValue`` object.
+        :type obj: ``KeyValue`` object
+        :param current: The value of ``_key_value_cache_is_current`` from
+                        before the object was written. If ``False`` the
+                        cache is dropped instead.
+        :type current: bool
+        """
+        if not current:
+            self.clear_key_value_cache()
+        elif self._key_value_cache is not None:
+            slug = obj.dynamic_column.slug
+            self._key_value_cache[slug] = obj
+            self._key_value_version = key_value_versions.get(self.pk)
+
+            for key in [key for key in self._decoded_value_cache
+                        if key[0] == slug]:
+                self._decoded_value_cache.pop(key)
+
     def serialize_key_values(self, by_slug=False):
         """
         Returns a dict of the ``DynamicColumn`` PK and the ``KeyValue``
@@ -545,17 +1021,17 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
         :type by_slug: bool
         :rtype: Dict
         """
-        result = {}
-
         if by_slug:
             field = 'slug'
         else:
             field = 'pk'
 
+        # Decode the cached rows, a second query per key is not needed
+        # since the dynamic column is already selected.
         return {
             getattr(kv.dynamic_column, field):
-            self.get_key_value(kv.dynamic_column.slug, choice_raw=True)
-            for kv in self.keyvalues.select_related('dynamic_column').all()
+            self._decode_key_value(kv, choice_raw=True)
+            for kv in self._get_key_value_cache().values()
             }
 
     def get_dynamic_column(self, slug):
@@ -570,12 +1046,10 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
         :raises KeyValue.DoesNotExist: If the `KeyValue` model object was not
                                        found.
         """
-        try:
-            dc = self.column_collection.dynamic_column.get(slug=slug)
-        except DynamicColumn.DoesNotExist as e:
+        dc = self.schema.get_column(slug)
+
+        if dc is None:
             log.error("DynamicColumn with slug '%s' does not exist.", slug)
-            # Cannot get a dynamic column if not in a collection.
-            dc = None
 
         return dc
 
@@ -601,36 +1075,60 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
         :raises AttributeError: If a bad field is passed in.
         :raises TypeError: If wrong type is passed in.
         """
-        try:
-            obj = self.keyvalues.select_related(
-                'dynamic_column').get(dynamic_column__slug=slug)
-        except self.keyvalues.model.DoesNotExist:
+        obj = self._get_cached_key_value(slug)
+
+        if obj is None:
             log.error("Could not find value for slug '%s'.", slug)
             value = ''
         else:
-            dc = obj.dynamic_column
-
-            if dc.value_type == dc.CHOICE and obj.value:
-                value = self._is_get_choice(dc, obj.value, field, choice_raw)
-            elif dc.value_type == dc.TIME and obj.value:
-                value = self._is_get_time(dc, obj.value)
-            elif dc.value_type == dc.DATE and obj.value:
-                value = self._is_get_date(dc, obj.value)
-            elif dc.value_type == dc.DATETIME and obj.value:
-                value = self._is_get_datetime(dc, obj.value)
-            elif dc.value_type == dc.BOOLEAN and obj.value:
-                value = self._is_get_boolean(dc, obj.value)
-            elif dc.value_type == dc.NUMBER and obj.value:
-                value = self._is_get_number(dc, obj.value)
-            elif dc.value_type == dc.FLOAT and obj.value:
-                value = self._is_get_float(dc, obj.value)
-            elif dc.value_type in (dc.TEXT, dc.TEXT_BLOCK) and obj.value:
-                value = obj.value
-            else: # pragma: no cover
-                # This should never happen. An invalid value_type will
-                # raise a ValidationError when the DynamicColumn is
-                # created.
-                value = obj.value
+            key = (slug, field, choice_raw)
+
+            if key in self._decoded_value_cache:
+                value = self._decoded_value_cache[key]
+            else:
+                value = self._decode_key_value(obj, field=field,
+                                               choice_raw=choice_raw)
+                self._decoded_value_cache[key] = value
+
+        return value
+
+    def _decode_key_value(self, obj, field=None, choice_raw=False):
+        """
+        Coerce the value of a ``KeyValue`` object into the type defined by
+        its ``DynamicColumn``. No query is made for the ``KeyValue`` object
+        itself so the ``dynamic_column`` should already be selected.
+
+        :param obj: A ``KeyValue`` object.
+        :type obj: ``KeyValue`` object
+        :param field: See ``get_key_value``.
+        :type field: str or None
+        :param choice_raw: See ``get_key_value``.
+        :type choice_raw: bool
+        :rtype: The coerced value.
+        """
+        dc = obj.dynamic_column
+
+        if dc.value_type == dc.CHOICE and obj.value:
+            value = self._is_get_choice(dc, obj.value, field, choice_raw)
+        elif dc.value_type == dc.TIME and obj.value:
+            value = self._is_get_time(dc, obj.value)
+        elif dc.value_type == dc.DATE and obj.value:
+            value = self._is_get_date(dc, obj.value)
+        elif dc.value_type == dc.DATETIME and obj.value:
+            value = self._is_get_datetime(dc, obj.value)
+        elif dc.value_type == dc.BOOLEAN and obj.value:
+            value = self._is_get_boolean(dc, obj.value)
+        elif dc.value_type == dc.NUMBER and obj.value:
+            value = self._is_get_number(dc, obj.value)
+        elif dc.value_type == dc.FLOAT and obj.value:
+            value = self._is_get_float(dc, obj.value)
+        elif dc.value_type in (dc.TEXT, dc.TEXT_BLOCK) and obj.value:
+            value = obj.value
+        else: # pragma: no cover
+            # This should never happen. An invalid value_type will
+            # raise a ValidationError when the DynamicColumn is
+            # created.
+            value = obj.value
 
         return value
 
@@ -650,54 +1148,105 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
 
         return result
 
-    def _is_get_time(self, dc, value):
-        dt = self._is_get_datetime(dc, value)
+    @classmethod
+    def _is_get_time(cls, dc, value):
+        dt = cls._is_get_datetime(dc, value)
         return datetime.time(
             hour=dt.hour, minute=dt.minute, second=dt.second,
             microsecond=dt.microsecond, tzinfo=dt.tzinfo)
 
-    def _is_get_date(self, dc, value):
-        dt = self._is_get_datetime(dc, value)
+    @classmethod
+    def _is_get_date(cls, dc, value):
+        dt = cls._is_get_datetime(dc, value)
         return datetime.date(year=dt.year, month=dt.month, day=dt.day)
 
-    def _is_get_datetime(self, dc, value):
+    @classmethod
+    def _is_get_datetime(cls, dc, value):
         try:
             return parser.parse(value)
         except ValueError:
-            self._raise_exception(dc, value)
+            cls._raise_exception(dc, value)
 
-    def _is_get_boolean(self, dc, value):
+    @classmethod
+    def _is_get_boolean(cls, dc, value):
         if value.isdigit():
             result = 0 if int(value) == 0 else 1
-        elif value.lower() in self.TRUE_FALSE:
-            result = value.lower() in (self.TRUE, 'true')
-        elif value.lower() in self.YES_NO:
-            result = value.lower() in (self.YES, 'yes')
+        elif value.lower() in cls.TRUE_FALSE:
+            result = value.lower() in (cls.TRUE, 'true')
+        elif value.lower() in cls.YES_NO:
+            result = value.lower() in (cls.YES, 'yes')
         else:
-            self._raise_exception(dc, value)
+            cls._raise_exception(dc, value)
 
         return result
 
-    def _is_get_number(self, dc, value):
-        if value.isdigit():
+    @classmethod
+    def _is_get_number(cls, dc, value):
+        if _NUMBER_RE.fullmatch(value):
             result = int(value)
         else:
-            self._raise_exception(dc, value)
+            cls._raise_exception(dc, value)
 
         return result
 
-    def _is_get_float(self, dc, value):
-        if value.replace('.', '').isdigit():
+    @classmethod
+    def _is_get_float(cls, dc, value):
+        if _FLOAT_RE.fullmatch(value):
             result = float(value)
         else:
-            self._raise_exception(dc, value)
+            cls._raise_exception(dc, value)
 
         return result
 
     def save_deferred(self):
+        """
+        Save the ``KeyValue`` objects queued by ``set_key_value`` with
+        ``defer=True``. All the objects are validated first, then written
+        with one ``bulk_create`` and one ``bulk_update`` in a transaction.
+        If a column was queued more than once the last value is saved.
+
+        :raises ValidationError: If a ``KeyValue`` object does not validate,
+                                 nothing is written.
+        """
+        self._save_key_values(self._pop_deferred_key_values())
+
+    def _defer_key_values(self, objs):
+        """
+        Queue ``KeyValue`` objects made by ``_prepare_key_value`` to be
+        written by ``save_deferred``.
+        """
+        self.__save_deferred.extend(objs)
+
+    def _pop_deferred_key_values(self):
+        """
+        Validate and remove the queued ``KeyValue`` objects, the last value
+        of a column queued more than once is kept.
+
+        :rtype: list
+        :raises ValidationError: If a ``KeyValue`` object does not validate,
+                                 the queue is not changed.
+        """
+        self._clean_deferred_key_values()
+        objs = OrderedDict()
+
         for obj in self.__save_deferred:
+            # This object may not have had a pk when the value was queued.
             obj.collection = self
-            obj.save()
+            objs[obj.dynamic_column_id] = obj
+
+        self.__save_deferred = []
+        return list(objs.values())
+
+    def _clean_deferred_key_values(self):
+        """
+        Validate the queued ``KeyValue`` objects without removing them, the
+        object does not need to be saved yet.
+
+        :raises ValidationError: If a ``KeyValue`` object does not validate.
+        """
+        for obj in self.__save_deferred:
+            obj.clean_fields(exclude=['collection', 'dynamic_column'])
+            obj.clean()
 
     def set_key_value(self, slug, value, field=None, obj=None, force=False,
                       defer=False):
@@ -737,50 +1286,49 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
             dc = self.get_dynamic_column(slug)
 
             if dc:
-                if dc.value_type == dc.CHOICE:
-                    value = self._is_set_choice(dc, value, field)
-                elif dc.value_type in (dc.TIME, dc.DATE, dc.DATETIME):
-                    value = self._is_set_datetime(dc, value)
-                elif (dc.value_type == dc.NUMBER and
-                      value in ('increment', 'decrement')):
-                    pass
-                elif dc.value_type == dc.BOOLEAN:
-                    value = self._is_set_boolean(dc, value)
-                elif dc.value_type == dc.FLOAT:
-                    value = self._is_set_float(dc, value)
-                elif dc.value_type == dc.NUMBER:
-                    value = self._is_set_number(dc, value)
-                elif (dc.value_type in (dc.TEXT, dc.TEXT_BLOCK) and
-                      isinstance(value, str)):
-                    pass
-                else: # pragma: no cover
-                    # This should never happen. An invalid value_type
-                    # will raise a ValidationError when the DynamicColumn
-                    # is created.
-                    self._raise_exception(dc, value)
+                if (dc.value_type == dc.NUMBER and not obj and not defer
+                    and value in ('increment', 'decrement')):
+                    # Let the database do the arithmetic.
+                    self.increment_key_value(
+                        slug, delta=1 if value == 'increment' else -1)
+                    return
+
+                value = self._convert_value(dc, value, field)
+
+                if not obj and not defer:
+                    # Write without reading the row first.
+                    obj = KeyValue(collection=self, dynamic_column=dc,
+                                   value=value)
+                    obj.clean_fields(exclude=['collection', 'dynamic_column'])
+                    obj.clean()
+                    current = self._key_value_cache_is_current()
+                    KeyValue.objects.upsert(obj)
+                    self._update_key_value_cache(obj, current)
+                    return
 
                 created = False
 
                 if not obj:
-                    try:
-                        obj = self.keyvalues.get(collection=self,
-                                                 dynamic_column=dc)
-                    except KeyValue.DoesNotExist:
+                    obj = self._get_cached_key_value(slug)
+
+                    if obj is None:
                         obj = KeyValue(collection=self, dynamic_column=dc)
                         created = True
+                    else:
+                        # Don't change the cached object until it is saved.
+                        obj = copy.copy(obj)
 
                 if not created:
-                    if 'increment' == value and obj.value.isdigit():
-                        value = str(int(obj.value) + 1)
-                    elif 'decrement' == value and obj.value.isdigit():
-                        value = str(int(obj.value) - 1)
+                    value = self._step_value(obj, value)
 
                 obj.value = value
 
                 if defer:
                     self.__save_deferred.append(obj)
                 else:
+                    current = self._key_value_cache_is_current()
                     obj.save()
+                    self._update_key_value_cache(obj, current)
             else:
                 msg = "Could not find DynamicColumn for slug '{}'.".format(
                     slug)
@@ -793,13 +1341,232 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
             log.error(msg)
             raise ValueError(msg)
 
-    def _is_set_choice(self, dc, value, field):
+    def increment_key_value(self, slug, delta=1):
+        """
+        Atomically add ``delta`` to the value of a ``NUMBER`` column. The
+        arithmetic is done by the database so concurrent calls do not lose
+        updates. If there is no value yet, or it is not a number, the value
+        is set to ``delta``. The first value is inserted, not upserted, so a
+        value another process adds at the same time is added to.
+
+        :param slug: The ``DynamicColumn`` slug.
+        :type slug: str
+        :param delta: The amount to add, use a negative number to subtract.
+        :type delta: int
+        :rtype: The new value as an ``int``.
+        :raises ValueError: If the slug is not found, is not a ``NUMBER``
+                            column or the delta is not an integer.
+        """
+        dc = self.get_dynamic_column(slug)
+
+        if not dc or dc.value_type != dc.NUMBER:
+            msg = ("Could not find a NUMBER DynamicColumn for slug "
+                   "'{}'.").format(slug)
+            log.error(msg)
+            raise ValueError(msg)
+
+        if isinstance(delta, bool) or not isinstance(delta, int):
+            self._raise_exception(dc, delta)
+
+        db = KeyValue.objects.db
+        queryset = self.keyvalues.filter(dynamic_column=dc)
+        number = Cast(models.F('value'), models.BigIntegerField()) + delta
+
+        def add():
+            # Only rows holding an integer can be cast by every database.
+            return queryset.filter(value__regex=r'^-?[0-9]+$').update(
+                value=Cast(number, models.TextField()), value_int=number)
+
+        current = self._key_value_cache_is_current()
+
+        with transaction.atomic(using=db):
+            if not add():
+                obj = KeyValue(collection=self, dynamic_column=dc,
+                               value=str(delta))
+                obj.set_typed_values()
+
+                try:
+                    # A plain insert, an upsert would overwrite a value
+                    # another process added since the update.
+                    with transaction.atomic(using=db):
+                        KeyValue.objects.bulk_create([obj])
+                except IntegrityError:
+                    # The row exists now, add to it or replace a value that
+                    # is not a number.
+                    if not add():
+                        queryset.update(value=str(delta), value_int=delta)
+
+            # The row stays locked until the transaction ends, so this is
+            # the value we wrote.
+            obj = queryset.select_related('dynamic_column').first()
+            obj.collection = self
+            self._update_key_value_cache(obj, current)
+
+        return int(obj.value)
+
+    def set_key_values(self, values, field=None, force=False):
+        """
+        Sets many key/value objects at once. The ``DynamicColumn`` objects
+        come from the schema and the existing ``KeyValue`` objects are read
+        with a single query. All the values are validated before anything
+        is written, then new and changed objects are written with
+        ``bulk_create`` and ``bulk_update`` in one transaction. Values that
+        have not changed are not written.
+
+        :param values: A dict of ``DynamicColumn`` slugs and their values.
+                       The values are the same as in ``set_key_value``.
+        :type values: dict
+        :param field: Only used with ``CHOICE`` objects. See
+                      ``set_key_value``.
+        :type field: str or None
+        :param force: Default is ``False``, do not save empty strings else
+                      ``True`` save empty strings only.
+        :type force: bool
+        :raises ValueError: If a slug is not found or a value is invalid,
+                            nothing is written.
+        :raises ValidationError: If a ``KeyValue`` object does not validate,
+                                 nothing is written.
+        """
+        objs = [self._prepare_key_value(slug, value, field, force)
+                for slug, value in values.items()]
+        self._save_key_values([obj for obj in objs if obj is not None])
+
+    def _prepare_key_value(self, slug, value, field=None, force=False,
+                           options=None):
+        """
+        Validate a value in memory and return the new or changed
+        ``KeyValue`` object without saving it.
+
+        :param options: For a ``CHOICE`` column that stores the relation,
+                        the set of option texts the value is checked
+                        against instead of querying for it.
+        :type options: set or None
+        :rtype: ``KeyValue`` object or ``None`` if the value is unchanged.
+        :raises ValueError: If the slug is not found or the value is invalid.
+        :raises ValidationError: If the ``KeyValue`` object does not
+                                 validate.
+        """
+        if not ((force and value == '') or value not in (None, '')):
+            msg = ("Could not process the data as passed to {}, "
+                   "slug: {}, value: {}, force: {}").format(
+                self.set_key_values.__name__, slug, value, force)
+            log.error(msg)
+            raise ValueError(msg)
+
+        dc = self.schema.get_column(slug)
+
+        if not dc:
+            msg = "Could not find DynamicColumn for slug '{}'.".format(slug)
+            log.error(msg)
+            raise ValueError(msg)
+
+        value = self._convert_value(dc, value, field, options=options)
+        obj = self._get_key_value_cache().get(slug)
+
+        if obj is None:
+            obj = KeyValue(collection=self, dynamic_column=dc)
+        else:
+            value = self._step_value(obj, value)
+
+            # The value is stored as text, e.g. a CHOICE pk may be an int.
+            if obj.value == str(value):
+                return None
+
+            # Don't change the cached object until it is saved.
+            obj = copy.copy(obj)
+
+        obj.value = value
+        # The foreign keys are set above, checking them would cost a query
+        # each.
+        obj.clean_fields(exclude=['collection', 'dynamic_column'])
+        obj.clean()
+        return obj
+
+    def _save_key_values(self, objs):
+        """
+        Write ``KeyValue`` objects belonging to this object with one
+        ``bulk_upsert`` and one ``bulk_update`` in a transaction, then
+        update the key value cache.
+        """
+        if not objs:
+            return
+
+        creates = [obj for obj in objs if obj._state.adding]
+        updates = [obj for obj in objs if not obj._state.adding]
+        current = self._key_value_cache_is_current()
+
+        with transaction.atomic(using=KeyValue.objects.db):
+            for obj in creates:
+                obj.collection = self
+
+            # Another process may have created some of these already.
+            KeyValue.objects.bulk_upsert(creates)
+
+            if updates:
+                for obj in updates:
+                    obj.set_typed_values()
+
+                KeyValue.objects.bulk_update(
+                    updates, ['value'] + list(KeyValue.TYPED_FIELDS))
+
+        for obj in objs:
+            obj.collection = self
+            self._update_key_value_cache(obj, current)
+
+    def _convert_value(self, dc, value, field, options=None):
+        if dc.value_type == dc.CHOICE:
+            value = self._is_set_choice(dc, value, field, options=options)
+        elif dc.value_type in (dc.TIME, dc.DATE, dc.DATETIME):
+            value = self._is_set_datetime(dc, value)
+        elif (dc.value_type == dc.NUMBER and
+              value in ('increment', 'decrement')):
+            pass
+        elif dc.value_type == dc.BOOLEAN:
+            value = self._is_set_boolean(dc, value)
+        elif dc.value_type == dc.FLOAT:
+            value = self._is_set_float(dc, value)
+        elif dc.value_type == dc.NUMBER:
+            value = self._is_set_number(dc, value)
+        elif (dc.value_type in (dc.TEXT, dc.TEXT_BLOCK) and
+              isinstance(value, str)):
+            pass
+        else: # pragma: no cover
+            # This should never happen. An invalid value_type will raise a
+            # ValidationError when the DynamicColumn is created.
+            self._raise_exception(dc, value)
+
+        return value
+
+    def _step_value(self, obj, value):
+        number = bool(_NUMBER_RE.fullmatch(obj.value or ''))
+
+        if 'increment' == value and number:
+            value = str(int(obj.value) + 1)
+        elif 'decrement' == value and number:
+            value = str(int(obj.value) - 1)
+
+        return value
+
+    def _is_set_choice(self, dc, value, field, options=None):
         model, m_field = dc.get_choice_relation_object_and_field()
 
         if not field:
             field = m_field
 
-        if dc.store_relation and value and field:
+        if dc.store_relation and isinstance(value, str):
+            # Already the stored field value, e.g. from a JSON request, it
+            # must be the value of one of the options.
+            if options is not None:
+                valid = value in options
+            else:
+                valid = choice_cache.get_selected_option(
+                    model, field, value, store_relation=True) is not None
+
+            if value and not valid:
+                self._raise_exception(dc, value, field=field)
+
+            result = value
+        elif dc.store_relation and value and field:
             result = getattr(value, field)
         elif isinstance(value, (CollectionBase, BaseChoice)): # Normal mode
             result = getattr(value, 'pk')
@@ -815,7 +1582,8 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
 
         return result
 
-    def _is_set_datetime(self, dc, value):
+    @classmethod
+    def _is_set_datetime(cls, dc, value):
         if isinstance(value, (datetime.time, datetime.date,
                               datetime.datetime)):
             result = value.isoformat()
@@ -823,55 +1591,59 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
             try:
                 dt = parser.parse(value)
             except ValueError as e:
-                self._raise_exception(dc, value, except_msg=e)
+                cls._raise_exception(dc, value, except_msg=e)
             else:
                 result = value
         else:
-            self._raise_exception(dc, value)
+            cls._raise_exception(dc, value)
 
         return result
 
-    def _is_set_boolean(self, dc, value):
+    @classmethod
+    def _is_set_boolean(cls, dc, value):
         if isinstance(value, bool):
             result = str(value)
         elif isinstance(value, int):
             result = str(0 if value == 0 else 1)
         elif isinstance(value, str):
-            if (value.lower() in self.TRUE_FALSE or
-                value.lower() in self.YES_NO):
+            if (value.lower() in cls.TRUE_FALSE or
+                value.lower() in cls.YES_NO):
                 result = value
             elif value.isdigit():
                 result = str(0 if int(value) == 0 else 1)
             else:
-                self._raise_exception(dc, value)
+                cls._raise_exception(dc, value)
         else:
-            self._raise_exception(dc, value)
+            cls._raise_exception(dc, value)
 
         return result
 
-    def _is_set_float(self, dc, value):
+    @classmethod
+    def _is_set_float(cls, dc, value):
         if isinstance(value, float):
             result = str(value)
         elif isinstance(value, int):
             result = str(float(value))
-        elif isinstance(value, str) and value.replace('.', '').isdigit():
+        elif isinstance(value, str) and _FLOAT_RE.fullmatch(value):
             result = str(float(value))
         else:
-            self._raise_exception(dc, value)
+            cls._raise_exception(dc, value)
 
         return result
 
-    def _is_set_number(self, dc, value):
+    @classmethod
+    def _is_set_number(cls, dc, value):
         if isinstance(value, int):
             result = str(value)
-        elif isinstance(value, str) and value.isdigit():
+        elif isinstance(value, str) and _NUMBER_RE.fullmatch(value):
             result = value
         else:
-            self._raise_exception(dc, value)
+            cls._raise_exception(dc, value)
 
         return result
 
-    def _raise_exception(self, dc, value, field='(Not applicable)',
+    @classmethod
+    def _raise_exception(cls, dc, value, field='(Not applicable)',
                          except_msg=''):
         msg = _("Invalid value {}, should be of type {}, with field: {}, "
                 "{}.").format(value, DynamicColumn.VALUE_TYPES_MAP.get(
@@ -883,8 +1655,401 @@ class CollectionBase(TimeModelMixin, UserModelMixin, StatusModelMixin):
 #
 # KeyValue
 #
+class KeyValueQuerySet(models.QuerySet):
+    """
+    Writes through this queryset mark the cached ``KeyValue`` objects of
+    the collections written to as out of date.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(KeyValueQuerySet, self).__init__(*args, **kwargs)
+        self._collection_ids = None
+
+    def _clone(self):
+        clone = super(KeyValueQuerySet, self)._clone()
+        clone._collection_ids = self._collection_ids
+        return clone
+
+    def filter_collections(self, pks):
+        """
+        Filter on the collection primary keys. An ``update()`` or
+        ``delete()`` on the returned queryset then only marks the cached
+        key values of these collections as out of date, not all of them.
+
+        :param pks: The ``CollectionBase`` primary keys.
+        :type pks: list
+        :rtype: Django queryset.
+        """
+        clone = self.filter(collection_id__in=pks)
+        clone._collection_ids = tuple(pks)
+        return clone
+
+    def _changed(self):
+        instance = self._hints.get('instance')
+
+        if isinstance(instance, CollectionBase):
+            # The ``keyvalues`` related manager of an instance.
+            key_value_versions.bump([instance.pk])
+            instance.clear_key_value_cache()
+        else:
+            key_value_versions.bump(self._collection_ids)
+
+    def update(self, **kwargs):
+        rows = super(KeyValueQuerySet, self).update(**kwargs)
+        self._changed()
+        return rows
+
+    def delete(self):
+        result = super(KeyValueQuerySet, self).delete()
+        self._changed()
+        return result
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super(KeyValueQuerySet, self).bulk_create(
+            list(objs), *args, **kwargs)
+        key_value_versions.bump([obj.collection_id for obj in objs])
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        objs = list(objs)
+        rows = super(KeyValueQuerySet, self).bulk_update(
+            objs, *args, **kwargs)
+        key_value_versions.bump([obj.collection_id for obj in objs])
+        return rows
+
+
 class KeyValueManager(models.Manager):
-    pass
+
+    def get_queryset(self):
+        return KeyValueQuerySet(self.model, using=self._db)
+
+    def filter_collections(self, pks):
+        """
+        See ``KeyValueQuerySet.filter_collections``.
+        """
+        return self.get_queryset().filter_collections(pks)
+
+    def prefetch_for_collections(self, instances, slugs=None):
+        """
+        Fetch the ``KeyValue`` objects for many objects that inherit
+        ``CollectionBase`` with one query and put them in each object's
+        key value cache.
+
+        :param instances: Objects that inherit ``CollectionBase``.
+        :type instances: list
+        :param slugs: Optional ``DynamicColumn`` slugs to limit the fetch to.
+        :type slugs: list or None
+        """
+        instances = [inst for inst in instances if inst.pk is not None]
+
+        if not instances:
+            return
+
+        caches = {inst.pk: {} for inst in instances}
+        queryset = self.select_related('dynamic_column').filter(
+            collection_id__in=list(caches))
+
+        if slugs:
+            queryset = queryset.filter(dynamic_column__slug__in=slugs)
+
+        for kv in queryset:
+            caches[kv.collection_id][kv.dynamic_column.slug] = kv
+
+        for inst in instances:
+            cache = caches[inst.pk]
+
+            for kv in cache.values():
+                # Save a query if the collection is accessed later.
+                kv.collection = inst
+
+            inst._set_key_value_cache(cache, slugs=slugs)
+
+    def serialize_for_collections(self, instances, slugs=None):
+        """
+        Returns the decoded values of many objects that inherit
+        ``CollectionBase`` with one query. The values of each object are in
+        the same form as ``CollectionBase.serialize_key_values(by_slug=True)``.
+
+        :param instances: Objects that inherit ``CollectionBase``.
+        :type instances: list
+        :param slugs: Optional ``DynamicColumn`` slugs to limit the values to.
+        :type slugs: list or None
+        :rtype: A dict of ``{<object pk>: {<slug>: <value>, ...}, ...}``.
+        """
+        instances = [inst for inst in instances if inst.pk is not None]
+        self.prefetch_for_collections(instances, slugs=slugs)
+        # The cache is read directly, it is reloaded when only some slugs
+        # were fetched.
+        return {
+            inst.pk: {slug: inst._decode_key_value(kv, choice_raw=True)
+                      for slug, kv in inst._key_value_cache.items()}
+            for inst in instances
+            }
+
+    def set_for_collections(self, instances, values, field=None,
+                            force=False):
+        """
+        Sets the values of many objects that inherit ``CollectionBase``.
+        The existing ``KeyValue`` objects are read with one query and every
+        value is validated before anything is written. If all are valid new
+        and changed objects are written with ``bulk_upsert`` and
+        ``bulk_update`` in one transaction, otherwise nothing is written.
+
+        :param instances: Objects that inherit ``CollectionBase``.
+        :type instances: list
+        :param values: A dict keyed by the object pk of dicts of slugs and
+                       values as in ``CollectionBase.set_key_values``.
+        :type values: dict
+        :param field: See ``CollectionBase.set_key_values``.
+        :type field: str or None
+        :param force: See ``CollectionBase.set_key_values``.
+        :type force: bool
+        :rtype: A dict of errors ``{<object pk>: {<slug>: [<message>, ...]}}``,
+                empty if the values were written.
+        """
+        instances = [inst for inst in instances if inst.pk in values]
+        self.prefetch_for_collections(instances)
+        errors = {}
+        objs = []
+
+        for inst in instances:
+            for slug, value in values[inst.pk].items():
+                try:
+                    obj = inst._prepare_key_value(slug, value, field, force)
+                except ValidationError as e:
+                    errors.setdefault(inst.pk, {})[slug] = e.messages
+                except ValueError as e:
+                    errors.setdefault(inst.pk, {})[slug] = [str(e)]
+                else:
+                    if obj is not None:
+                        objs.append((inst, obj))
+
+        if not errors:
+            self._write_for_collections(objs)
+
+        return errors
+
+    def save_deferred_for_collections(self, instances):
+        """
+        Save the ``KeyValue`` objects queued on many objects that inherit
+        ``CollectionBase``, see ``CollectionBase.save_deferred``. They are
+        written with one ``bulk_upsert`` and one ``bulk_update`` in a
+        transaction. The objects must already be saved.
+
+        :param instances: Objects that inherit ``CollectionBase``.
+        :type instances: list
+        :raises ValidationError: If a ``KeyValue`` object does not validate,
+                                 nothing is written.
+        """
+        objs = [(inst, obj) for inst in instances
+                for obj in inst._pop_deferred_key_values()]
+        self._write_for_collections(objs)
+
+    def _write_for_collections(self, objs):
+        """
+        Write ``(instance, KeyValue object)`` pairs then update each
+        instance's key value cache.
+        """
+        if not objs:
+            return
+
+        creates = [obj for inst, obj in objs if obj._state.adding]
+        updates = [obj for inst, obj in objs if not obj._state.adding]
+        current = {id(inst): inst._key_value_cache_is_current()
+                   for inst, obj in objs}
+
+        with transaction.atomic(using=self.db):
+            # Another process may have created some of these already.
+            self.bulk_upsert(creates)
+
+            for obj in updates:
+                obj.set_typed_values()
+
+            self.bulk_update(updates, ['value'] + list(KeyValue.TYPED_FIELDS))
+
+        for inst, obj in objs:
+            inst._update_key_value_cache(obj, current[id(inst)])
+
+    def remove_duplicates(self, dry_run=False):
+        """
+        Delete all but the newest ``KeyValue`` object for each collection
+        and dynamic column pair. Duplicates could be created before the
+        pair was made unique.
+
+        :param dry_run: If ``True`` only count the duplicates.
+        :type dry_run: bool
+        :rtype: The number of objects deleted or that would be deleted.
+        """
+        groups = self.order_by().values(
+            'collection', 'dynamic_column').annotate(
+            count=models.Count('pk'), keep=models.Max('pk')).filter(
+            count__gt=1)
+        total = 0
+
+        for group in groups:
+            total += group['count'] - 1
+
+            if not dry_run:
+                self.filter_collections([group['collection']]).filter(
+                    dynamic_column=group['dynamic_column']).exclude(
+                    pk=group['keep']).delete()
+
+        log.info("Duplicate KeyValue objects %s: %s",
+                 "found" if dry_run else "deleted", total)
+        return total
+
+    def upsert(self, obj):
+        """
+        Insert a ``KeyValue`` object or update the value of the one that
+        already exists for its collection and dynamic column. The row is
+        not read first, the primary key is set on the object.
+
+        :param obj: A ``KeyValue`` object with its collection, dynamic
+                    column and value set.
+        :type obj: ``KeyValue`` object
+        :rtype: The ``KeyValue`` object.
+        """
+        if self._supports_update_conflicts():
+            return self.bulk_upsert([obj])[0]
+
+        obj.set_typed_values()
+        values = {field: getattr(obj, field) for field in self._value_fields}
+        queryset = self.filter_collections([obj.collection_id]).filter(
+            dynamic_column_id=obj.dynamic_column_id)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            if not queryset.update(**values):
+                try:
+                    with transaction.atomic(using=self.db):
+                        obj.save_base(force_insert=True, using=self.db)
+                except IntegrityError:
+                    # Another process inserted the row first.
+                    queryset.update(**values)
+
+        self._set_missing_pks([obj])
+        obj._state.adding = False
+        obj._state.db = self.db
+        return obj
+
+    def bulk_upsert(self, objs):
+        """
+        Insert many ``KeyValue`` objects, updating the value of any that
+        already exist for their collection and dynamic column. Uses
+        ``bulk_create(update_conflicts=True)`` when the database supports
+        it, otherwise a plain ``bulk_create`` falling back to ``upsert``
+        for each object on a conflict. The primary keys are set on the
+        objects.
+
+        :param objs: ``KeyValue`` objects with their collection, dynamic
+                     column and value set.
+        :type objs: list
+        :rtype: The list of ``KeyValue`` objects.
+        """
+        if not objs:
+            return objs
+
+        for obj in objs:
+            obj.set_typed_values()
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            if self._supports_update_conflicts():
+                self.bulk_create(
+                    objs, update_conflicts=True,
+                    update_fields=self._value_fields,
+                    unique_fields=['collection', 'dynamic_column'])
+            else:
+                try:
+                    with transaction.atomic(using=self.db):
+                        self.bulk_create(objs)
+                except IntegrityError:
+                    for obj in objs:
+                        obj.pk = None
+                        self.upsert(obj)
+
+            self._set_missing_pks(objs)
+
+        for obj in objs:
+            obj._state.adding = False
+            obj._state.db = self.db
+
+        return objs
+
+    def backfill_typed_values(self, batch_size=1000):
+        """
+        Set the typed value fields on every ``KeyValue`` object from its
+        text value. The table is walked in primary key order and each batch
+        is written with one ``bulk_update``.
+
+        :param batch_size: The number of objects read and written at once.
+        :type batch_size: int
+        :rtype: The number of objects updated.
+        """
+        return backfill_typed_values(
+            self.select_related('dynamic_column'),
+            lambda obj: obj.dynamic_column, batch_size=batch_size)
+
+    @property
+    def _value_fields(self):
+        return ['value'] + list(self.model.TYPED_FIELDS)
+
+    def _supports_update_conflicts(self):
+        return getattr(connections[self.db].features,
+                       'supports_update_conflicts', False)
+
+    def _set_missing_pks(self, objs):
+        # Not all databases return the primary keys.
+        missing = [obj for obj in objs if obj.pk is None]
+
+        if missing:
+            pks = {(c_id, d_id): pk for c_id, d_id, pk in self.filter(
+                collection_id__in={obj.collection_id for obj in missing},
+                dynamic_column_id__in={obj.dynamic_column_id
+                                       for obj in missing}).order_by(
+                ).values_list('collection_id', 'dynamic_column_id', 'pk')}
+
+            for obj in missing:
+                obj.pk = pks.get((obj.collection_id, obj.dynamic_column_id))
+
+
+def backfill_typed_values(queryset, get_column, batch_size=1000):
+    """
+    Set the typed value fields of the ``KeyValue`` objects in a queryset
+    from their text values. The objects are walked in primary key order
+    and each batch is written with one ``bulk_update``. The migration that
+    adds the typed fields uses this with its historical models.
+
+    :param queryset: A ``KeyValue`` queryset.
+    :type queryset: Django queryset
+    :param get_column: Called with each object, returns its
+                       ``DynamicColumn`` object.
+    :type get_column: callable
+    :param batch_size: The number of objects read and written at once.
+    :type batch_size: int
+    :rtype: The number of objects updated.
+    """
+    queryset = queryset.order_by('pk')
+    fields = list(KeyValue.TYPED_FIELDS)
+    last_pk = 0
+    total = 0
+
+    while True:
+        objs = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+
+        if not objs:
+            break
+
+        for obj in objs:
+            typed = KeyValue.get_typed_values(get_column(obj), obj.value)
+
+            for field, value in typed.items():
+                setattr(obj, field, value)
+
+        queryset.bulk_update(objs, fields)
+        last_pk = objs[-1].pk
+        total += len(objs)
+        log.debug("Backfilled %s KeyValue objects.", total)
+
+    return total
 
 
 class KeyValue(ValidateOnSaveMixin):
@@ -895,6 +2060,23 @@ class KeyValue(ValidateOnSaveMixin):
         DynamicColumn, on_delete=models.CASCADE,
         verbose_name=_("Dynamic Column"), related_name='keyvalues')
     value = models.TextField(verbose_name=_("Value"), null=True, blank=True)
+    # Typed copies of value so the database can filter and sort on them.
+    value_int = models.BigIntegerField(
+        verbose_name=_("Integer Value"), null=True, blank=True,
+        editable=False)
+    value_float = models.FloatField(
+        verbose_name=_("Float Value"), null=True, blank=True, editable=False)
+    value_datetime = models.DateTimeField(
+        verbose_name=_("Date & Time Value"), null=True, blank=True,
+        editable=False)
+    value_bool = models.BooleanField(
+        verbose_name=_("Boolean Value"), null=True, blank=True,
+        editable=False)
+
+    TYPED_FIELDS = ('value_int', 'value_float', 'value_datetime',
+                    'value_bool',)
+    _EPOCH = datetime.date(1970, 1, 1)
+    _INT_LIMIT = 2 ** 63
 
     objects = KeyValueManager()
 
@@ -905,12 +2087,190 @@ class KeyValue(ValidateOnSaveMixin):
         log.debug("KeyValue pk: %s,  collection: %s, dynamic_column: %s, "
                   "value: %s, args: %s, kwargs: %s", self.pk, self.collection,
                   self.dynamic_column, self.value, args, kwargs)
+        self.set_typed_values()
         super(KeyValue, self).save(*args, **kwargs)
+        # Mark the collection's cached key values as out of date.
+        key_value_versions.bump([self.collection_id])
+
+    def delete(self, *args, **kwargs):
+        """
+        Mark the collection's cached key values as out of date.
+        """
+        collection_id = self.collection_id
+        result = super(KeyValue, self).delete(*args, **kwargs)
+        key_value_versions.bump([collection_id])
+        return result
+
+    def set_typed_values(self):
+        """
+        Set the typed value fields from ``value`` according to the
+        ``DynamicColumn`` value type. Only one field is set, the others are
+        ``None``. A value that cannot be converted leaves all of them
+        ``None``. See ``to_typed_value``.
+        """
+        typed = self.get_typed_values(self.dynamic_column, self.value)
+
+        for field, typed_value in typed.items():
+            setattr(self, field, typed_value)
+
+    @classmethod
+    def get_typed_values(cls, dc, value):
+        """
+        Get the typed value fields for a text value, see
+        ``set_typed_values``.
+
+        :param dc: A ``DynamicColumn`` object.
+        :type dc: ``DynamicColumn`` object
+        :param value: The text value.
+        :type value: str
+        :rtype: A dict of the ``TYPED_FIELDS`` and their values.
+        """
+        typed = dict.fromkeys(cls.TYPED_FIELDS)
+        field = cls.get_typed_field(dc)
+
+        if value and field in typed:
+            try:
+                typed[field] = cls.to_typed_value(dc, value)
+            except (ValueError, TypeError, OverflowError) as e:
+                log.warning("Could not convert '%s' for '%s' to a typed "
+                            "value, %s", value, dc, e)
+
+        return typed
+
+    @classmethod
+    def get_typed_field(cls, dc):
+        """
+        Get the name of the field that holds the typed value for a
+        ``DynamicColumn``.
+
+        :param dc: A ``DynamicColumn`` object.
+        :type dc: ``DynamicColumn`` object
+        :rtype: One of ``TYPED_FIELDS`` or ``'value'`` for text.
+        """
+        if (dc.value_type == dc.NUMBER or
+            (dc.value_type == dc.CHOICE and not dc.store_relation)):
+            field = 'value_int'
+        elif dc.value_type == dc.FLOAT:
+            field = 'value_float'
+        elif dc.value_type == dc.BOOLEAN:
+            field = 'value_bool'
+        elif dc.value_type in (dc.DATETIME, dc.DATE, dc.TIME):
+            field = 'value_datetime'
+        else:
+            field = 'value'
+
+        return field
+
+    @classmethod
+    def to_typed_value(cls, dc, value):
+        """
+        Convert a stored text value, or a Python value, to the type held in
+        the field given by ``get_typed_field``. The value is checked and
+        converted with the same methods ``set_key_value`` and
+        ``get_key_value`` use.
+
+        ``NUMBER`` and the pk of a ``CHOICE`` are an ``int``, ``FLOAT`` a
+        ``float`` and ``BOOLEAN`` a ``bool``. ``DATETIME`` is a datetime,
+        naive values are in the project ``TIME_ZONE``, ``DATE`` is midnight
+        UTC and ``TIME`` is on 1970-01-01 UTC.
+
+        :param dc: A ``DynamicColumn`` object.
+        :type dc: ``DynamicColumn`` object
+        :param value: The value to convert.
+        :type value: str, int, float, bool, date, time, datetime or a model
+                     that inherits ``CollectionBase`` or ``BaseChoice``.
+        :rtype: The typed value.
+        :raises ValueError: If the value cannot be converted.
+        """
+        field = cls.get_typed_field(dc)
+
+        if field == 'value_int':
+            if isinstance(value, (CollectionBase, BaseChoice)):
+                value = value.pk
+
+            result = CollectionBase._is_get_number(
+                dc, CollectionBase._is_set_number(dc, value))
+
+            if not -cls._INT_LIMIT <= result < cls._INT_LIMIT:
+                raise ValueError("Integer out of range.")
+        elif field == 'value_float':
+            result = CollectionBase._is_get_float(
+                dc, CollectionBase._is_set_float(dc, value))
+        elif field == 'value_bool':
+            result = bool(CollectionBase._is_get_boolean(
+                dc, CollectionBase._is_set_boolean(dc, value)))
+        elif field == 'value_datetime':
+            value = CollectionBase._is_set_datetime(dc, value)
+
+            if dc.value_type == dc.TIME:
+                time = CollectionBase._is_get_time(dc, value)
+                dt = datetime.datetime.combine(cls._EPOCH, time)
+                tz = datetime.timezone.utc
+            elif dc.value_type == dc.DATE:
+                date = CollectionBase._is_get_date(dc, value)
+                dt = datetime.datetime(date.year, date.month, date.day)
+                tz = datetime.timezone.utc
+            else:
+                dt = CollectionBase._is_get_datetime(dc, value)
+                tz = timezone.get_default_timezone()
+
+            result = cls._to_utc(dt, tz)
+        else:
+            result = str(value)
+
+        return result
+
+    @classmethod
+    def _to_utc(cls, dt, tz):
+        if timezone.is_naive(dt):
+            if hasattr(tz, 'localize'):
+                # A pytz time zone.
+                dt = tz.localize(dt)
+            else:
+                dt = dt.replace(tzinfo=tz)
+
+        dt = dt.astimezone(datetime.timezone.utc)
+
+        if not settings.USE_TZ:
+            dt = dt.replace(tzinfo=None)
+
+        return dt
 
     def __str__(self):
         return self.dynamic_column.name
 
     class Meta:
         ordering = ('dynamic_column__location', 'dynamic_column__order',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['collection', 'dynamic_column'],
+                name='dcolumns_keyvalue_unique_column'),
+            ]
+        indexes = [
+            models.Index(fields=['dynamic_column', 'value_int'],
+                         name='dcolumns_kv_int_idx'),
+            models.Index(fields=['dynamic_column', 'value_float'],
+                         name='dcolumns_kv_float_idx'),
+            models.Index(fields=['dynamic_column', 'value_datetime'],
+                         name='dcolumns_kv_datetime_idx'),
+            models.Index(fields=['dynamic_column', 'value_bool'],
+                         name='dcolumns_kv_bool_idx'),
+            ]
         verbose_name = _("Key Value")
         verbose_name_plural = _("Key Values")
+
+
+#
+# Schema cache invalidation
+#
+models.signals.post_save.connect(
+    schema_cache.invalidate, sender=DynamicColumn)
+models.signals.post_delete.connect(
+    schema_cache.invalidate, sender=DynamicColumn)
+models.signals.post_save.connect(
+    schema_cache.invalidate, sender=ColumnCollection)
+models.signals.post_delete.connect(
+    schema_cache.invalidate, sender=ColumnCollection)
+models.signals.m2m_changed.connect(
+    schema_cache.invalidate, sender=ColumnCollection.dynamic_column.through)
+request_started.connect(schema_cache.check_version)
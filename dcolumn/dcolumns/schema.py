@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/schema.py
+#
+
+"""
+A compiled, in process, cache of each ``ColumnCollection`` and its
+``DynamicColumn`` objects. Schema changes are rare while reads happen on
+every request, so the whole cache is dropped when any ``DynamicColumn`` or
+``ColumnCollection`` changes.
+
+Other worker processes learn about a change through a version key kept in
+the Django cache named by ``settings.DYNAMIC_COLUMNS.SCHEMA_CACHE``. The key
+is written when the transaction that made the change commits, so no process
+can rebuild its schemas from rows that are not committed yet. The key is
+checked at the start of each request and, for processes that do not serve
+requests such as management commands and task workers, when a schema is
+read at most every ``check_interval`` seconds.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+import time
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .manager import dcolumn_manager
+
+log = logging.getLogger('dcolumns.dcolumns.schema')
+
+
+#
+# CollectionSchema
+#
+class CollectionSchema(object):
+    """
+    A read only view of one ``ColumnCollection`` and its ``DynamicColumn``
+    objects.
+
+    .. note::
+      The ``DynamicColumn`` objects held here are shared between requests
+      and must not be changed.
+    """
+
+    def __init__(self, collection, columns, version=0):
+        """
+        Constructor compiles the lookup maps.
+
+        :param collection: The ``ColumnCollection`` object.
+        :type collection: ``ColumnCollection`` object
+        :param columns: All the ``DynamicColumn`` objects in the collection
+                        in display order.
+        :type columns: list
+        :param version: The cache version the schema was built in.
+        :type version: int
+        """
+        self.collection = collection
+        self.pk = collection.pk
+        self.name = collection.related_model
+        self.active = collection.active
+        self.version = version
+        self.all_columns = list(columns)
+        self.columns = [dc for dc in self.all_columns if dc.active]
+        self.by_slug = {dc.slug: dc for dc in self.all_columns}
+        self.by_pk = {dc.pk: dc for dc in self.all_columns}
+        self.value_types = {dc.slug: dc.value_type for dc in self.columns}
+        self.relations = {dc.slug: dc.relation for dc in self.columns
+                          if dc.relation}
+        containers = dict(dcolumn_manager.css_containers)
+        self.locations = {dc.slug: containers.get(dc.location, '')
+                          for dc in self.columns}
+
+    def __repr__(self):
+        return "<CollectionSchema: {} ({} columns)>".format(
+            self.name, len(self.columns))
+
+    def get_column(self, slug):
+        """
+        Gets the ``DynamicColumn`` for a slug, active or not.
+
+        :param slug: The ``DynamicColumn`` slug.
+        :type slug: str
+        :rtype: ``DynamicColumn`` object or ``None``.
+        """
+        return self.by_slug.get(slug)
+
+
+#
+# SchemaCache
+#
+class SchemaCache(object):
+    """
+    Holds the ``CollectionSchema`` objects keyed by the ``ColumnCollection``
+    pk and its related model name.
+    """
+    VERSION_KEY = 'dcolumn-schema-version'
+    # Seconds between the checks of the shared version made when a schema
+    # is read.
+    check_interval = 5
+
+    def __init__(self):
+        self._schemas = {}
+        self._names = {}
+        self._version = 0
+        self._shared_version = None
+        self._checked = None
+
+    @property
+    def version(self):
+        """
+        A number that changes every time the cache is invalidated.
+
+        :rtype: int
+        """
+        return self._version
+
+    @property
+    def shared_version(self):
+        """
+        The version shared between all processes, it changes every time any
+        process invalidates the cache.
+
+        :rtype: str
+        """
+        if self._shared_version is None:
+            self.check_version()
+
+        return self._shared_version
+
+    def get_by_name(self, name):
+        """
+        Gets the schema of the active ``ColumnCollection`` for a related
+        model name.
+
+        :param name: The related model name of the ``ColumnCollection``.
+        :type name: str
+        :rtype: ``CollectionSchema`` object.
+        :raises ColumnCollection.DoesNotExist: If there is no active
+                                               collection for the name.
+        """
+        from .models import ColumnCollection
+
+        self._check_expired()
+        key = name.lower()
+        schema = self._schemas.get(self._names.get(key))
+
+        if schema is None:
+            collection = ColumnCollection.objects.active().get(
+                related_model__iexact=name)
+            schema = self._build(collection)
+
+        return schema
+
+    def get_by_pk(self, pk):
+        """
+        Gets the schema of a ``ColumnCollection`` by its pk whether it is
+        active or not.
+
+        :param pk: The pk of the ``ColumnCollection``.
+        :type pk: int
+        :rtype: ``CollectionSchema`` object.
+        :raises ColumnCollection.DoesNotExist: If the pk is not found.
+        """
+        from .models import ColumnCollection
+
+        self._check_expired()
+        schema = self._schemas.get(pk)
+
+        if schema is None:
+            schema = self._build(ColumnCollection.objects.get(pk=pk))
+
+        return schema
+
+    def _build(self, collection):
+        columns = collection.dynamic_column.all()
+        schema = CollectionSchema(collection, columns, version=self._version)
+        self._schemas[schema.pk] = schema
+
+        if schema.active:
+            self._names[schema.name.lower()] = schema.pk
+
+        log.debug("Built schema %s, version: %s", schema, self._version)
+        return schema
+
+    def clear(self):
+        """
+        Drop all the compiled schemas.
+        """
+        self._schemas = {}
+        self._names = {}
+        self._version += 1
+
+    def invalidate(self, sender=None, using=None, **kwargs):
+        """
+        Signal receiver connected to the ``DynamicColumn`` and
+        ``ColumnCollection`` models. A new shared version is also stored
+        when the transaction commits so the other processes drop their
+        schemas.
+        """
+        log.debug("Schema invalidated by %s.", sender)
+        self.clear()
+        transaction.on_commit(self._publish, using=using)
+
+    def _publish(self):
+        # Also drop any schema built from this process' uncommitted rows.
+        self.clear()
+        version = uuid4().hex
+        self._get_cache().set(self.VERSION_KEY, version, timeout=None)
+        self._shared_version = version
+        self._checked = time.monotonic()
+
+    def check_version(self, sender=None, **kwargs):
+        """
+        Signal receiver connected to ``request_started``. Drops the compiled
+        schemas if another process has changed the shared version since the
+        last check.
+
+        .. note::
+          The version is a random token not a counter, so a key evicted from
+          the cache and then added again is still seen as a change.
+        """
+        cache = self._get_cache()
+        version = cache.get(self.VERSION_KEY)
+
+        if version is None:
+            version = uuid4().hex
+
+            if not cache.add(self.VERSION_KEY, version, timeout=None):
+                version = cache.get(self.VERSION_KEY)
+
+        if version != self._shared_version:
+            log.debug("Schema version changed from %s to %s.",
+                      self._shared_version, version)
+            self.clear()
+            self._shared_version = version
+
+        self._checked = time.monotonic()
+
+    def _check_expired(self):
+        if (self._checked is None
+            or time.monotonic() - self._checked > self.check_interval):
+            self.check_version()
+
+    def _get_cache(self):
+        return caches[dcolumn_manager.schema_cache_alias]
+
+schema_cache = SchemaCache()
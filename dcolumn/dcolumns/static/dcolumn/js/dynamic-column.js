@@ -96,7 +96,7 @@ String.prototype.trim = function(charlist) {
       modelName = modelName[modelName.length-1];
       var options = {
         url: this._assembleURI(this.uri + modelName + "/"),
-        cache: false,
+        cache: true, // Revalidated with the ETag on every request.
         type: 'GET',
         contentType: 'json',
         timeout: 20000, // 20 seconds
@@ -154,7 +154,11 @@ String.prototype.trim = function(charlist) {
 
           break;
         case 2: // Choice
-          if(relation.store_relation) {
+          if(self._isLazy(relation.slug)) {
+            $obj = self._lazyChoiceSelect(id, name, relation.slug, value,
+                                          relation.store_relation);
+            value = $obj.val();
+          } else if(relation.store_relation) {
             if(value === undefined || value === "") {
               value = 0;
             }
@@ -206,7 +210,91 @@ String.prototype.trim = function(charlist) {
       }
 
       $obj.val(value);
+      $input.siblings('input.dcolumn-search').remove();
       $input.replaceWith($obj);
+
+      if(value_type === 2 && self._isLazy(relation.slug)) {
+        self._lazySearchInput($obj, relation.slug).insertBefore($obj);
+      }
+    },
+
+    _isLazy: function(slug) {
+      var lazy = this.data.lazyDynamicColumns;
+      return lazy !== undefined && lazy[slug] !== undefined;
+    },
+
+    _lazyChoiceSelect: function(id, name, slug, value, store_relation) {
+      // Only the selected option is fetched, the rest are searched for.
+      var $obj = this._choiceSelect(id, name, slug);
+      var params = {selected: value, store_relation: store_relation ? 1 : 0};
+
+      if(value !== undefined && value !== "" && value != 0) {
+        this._sendChoiceRequest(slug, params, function(json) {
+          this._setOptions($obj, slug, json.results);
+          $obj.val(json.results.length ? json.results[0][0] : 0);
+        }.bind(this));
+      }
+
+      return $obj;
+    },
+
+    _lazySearchInput: function($select, slug) {
+      var $search = $('<input class="dcolumn-search" type="search" ' +
+                      'placeholder="Search" />');
+      var timer = null;
+
+      $search.on('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+          var selected = $select.val();
+          var current = $select.find(':selected');
+          var params = {q: $search.val()};
+
+          this._sendChoiceRequest(slug, params, function(json) {
+            var options = json.results;
+
+            // Keep the current selection in the options.
+            if(selected != 0) {
+              options = [[selected, current.text()]].concat(
+                options.filter(function(o) { return o[0] != selected; }));
+            }
+
+            this._setOptions($select, slug, options);
+            $select.val(selected);
+          }.bind(this));
+        }.bind(this), 300);
+      }.bind(this));
+
+      return $search;
+    },
+
+    _sendChoiceRequest: function(slug, params, callback) {
+      $.ajax({
+        url: this._assembleURI(this.data.lazyDynamicColumns[slug]),
+        data: params,
+        type: 'GET',
+        timeout: 20000, // 20 seconds
+        success: function(json) {
+          if(json.valid) {
+            callback(json);
+          } else {
+            this._mimicDjangoErrors(json.message, '.errornote');
+          }
+        }.bind(this)
+      });
+    },
+
+    _setOptions: function($select, slug, options) {
+      var $option = null;
+      $select.empty();
+      options = [this.data.dynamicColumns[slug][0]].concat(options);
+
+      for(var i = 0; i < options.length; i++) {
+        $option = $("<option></option>");
+        $option.val(options[i][0]);
+        $option.text(options[i][1]);
+        $option.appendTo($select);
+      }
     },
 
     _getOptionId: function(slug, value) {
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/tests/test_dcolumns_choice_cache.py
+#
+# WARNING: These unittests can only be run from within the original test
+#          framework from https://github.com/cnobile2012/dcolumn.
+#
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from example_site.books.choices import Language
+from example_site.books.models import Author, Book
+
+from ..choice_cache import choice_cache
+from ..manager import dcolumn_manager
+from ..models import DynamicColumn
+from ..views import ContextDataMixin
+
+from .base_tests import BaseDcolumns
+
+
+class TestChoiceCache(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestChoiceCache, self).__init__(name)
+
+    def setUp(self):
+        super(TestChoiceCache, self).setUp()
+        caches['default'].clear()
+
+    def tearDown(self):
+        super(TestChoiceCache, self).tearDown()
+        caches['default'].clear()
+
+    def test_get_options(self):
+        """
+        Test that the options are built from the choice objects.
+        """
+        #self.skipTest("Temporarily skipped")
+        author, a_cc, a_values = self._create_author_objects(extra_dcs=[])
+        options = choice_cache.get_options(Author, 'name')
+        msg = "options: {}".format(options)
+        self.assertEqual(options, [(author.pk, author.name)], msg)
+        # Non-django choices are not cached.
+        options = choice_cache.get_options(Language, 'name')
+        msg = "options: {}".format(options)
+        self.assertEqual(len(options), 5, msg)
+        self.assertEqual(options[0], (1, 'Chinese'), msg)
+
+    def test_options_are_cached(self):
+        """
+        Test that cached options are reused without any queries.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, b_cc, b_values = self._create_book_objects(extra_dcs=[])
+        choice_cache.get_options(Book, 'title')
+
+        with self.assertNumQueries(0):
+            options = choice_cache.get_options(Book, 'title')
+
+        msg = "options: {}".format(options)
+        self.assertEqual(options, [(book.pk, book.title)], msg)
+        # A copy is returned so callers may change it.
+        options.insert(0, (0, "Choose a value"))
+        self.assertEqual(len(choice_cache.get_options(Book, 'title')), 1, msg)
+
+    def test_search_options(self):
+        """
+        Test that options are searched for a page at a time.
+        """
+        #self.skipTest("Temporarily skipped")
+        author, a_cc, a_values = self._create_author_objects(
+            name="Carl Bell", extra_dcs=[])
+        authors = [author] + [
+            self._create_dcolumn_record(Author, a_cc, name=name)
+            for name in ("Abe Cole", "Bea Carlson")]
+        options = choice_cache.search_options(Author, 'name', term='carl')
+        msg = "options: {}".format(options)
+        self.assertEqual([o[1] for o in options], ["Bea Carlson", "Carl Bell"],
+                         msg)
+        options = choice_cache.search_options(
+            Author, 'name', term='carl', prefix=True)
+        msg = "options: {}".format(options)
+        self.assertEqual(options, [(authors[0].pk, "Carl Bell")], msg)
+        options = choice_cache.search_options(
+            Author, 'name', offset=1, limit=1)
+        msg = "options: {}".format(options)
+        self.assertEqual(options, [(authors[2].pk, "Bea Carlson")], msg)
+        # Non-django choices.
+        options = choice_cache.search_options(
+            Language, 'name', term='ese', limit=5)
+        msg = "options: {}".format(options)
+        self.assertEqual(options, [(1, 'Chinese'), (5, 'Japanese'),
+                                   (3, 'Portuguese')], msg)
+
+    def test_get_selected_option(self):
+        """
+        Test that a selected option is found by pk or by value.
+        """
+        #self.skipTest("Temporarily skipped")
+        author, a_cc, a_values = self._create_author_objects(extra_dcs=[])
+        option = (author.pk, author.name)
+        msg = "option: {}".format(option)
+        self.assertEqual(choice_cache.get_selected_option(
+            Author, 'name', author.pk), option, msg)
+        self.assertEqual(choice_cache.get_selected_option(
+            Author, 'name', author.name, store_relation=True), option, msg)
+        self.assertIsNone(choice_cache.get_selected_option(
+            Author, 'name', 0), msg)
+        self.assertIsNone(choice_cache.get_selected_option(
+            Author, 'name', "Unknown", store_relation=True), msg)
+        self.assertIsNone(choice_cache.get_selected_option(
+            Author, 'name', author.name), msg)
+        self.assertEqual(choice_cache.get_selected_option(
+            Language, 'name', 'English', store_relation=True),
+                         (2, 'English'), msg)
+        self.assertEqual(choice_cache.get_selected_option(
+            Language, 'name', '2'), (2, 'English'), msg)
+        # A name that is also a pk is only found by the lookup asked for.
+        other = self._create_dcolumn_record(
+            Author, a_cc, name=str(author.pk))
+        self.assertEqual(choice_cache.get_selected_option(
+            Author, 'name', author.pk), option, msg)
+        self.assertEqual(choice_cache.get_selected_option(
+            Author, 'name', str(author.pk), store_relation=True),
+                         (other.pk, other.name), msg)
+
+    def test_invalidation(self):
+        """
+        Test that saving or deleting a choice object drops its options.
+        """
+        #self.skipTest("Temporarily skipped")
+        author, a_cc, a_values = self._create_author_objects(extra_dcs=[])
+        version = choice_cache.get_version(Author)
+        choice_cache.get_options(Author, 'name')
+        author.name = "Another Author"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+            # Not changed before the transaction commits.
+            msg = "version: {}".format(version)
+            self.assertEqual(choice_cache.get_version(Author), version, msg)
+
+        msg = "version: {}".format(version)
+        self.assertNotEqual(choice_cache.get_version(Author), version, msg)
+        options = choice_cache.get_options(Author, 'name')
+        msg = "options: {}".format(options)
+        self.assertEqual(options, [(author.pk, "Another Author")], msg)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            author.delete()
+
+        options = choice_cache.get_options(Author, 'name')
+        msg = "options: {}".format(options)
+        self.assertEqual(options, [], msg)
+
+    def test_bulk_invalidation(self):
+        """
+        Test that a bulk change is dropped by calling ``invalidate`` and
+        that the version is kept per model label.
+        """
+        #self.skipTest("Temporarily skipped")
+        author, a_cc, a_values = self._create_author_objects(extra_dcs=[])
+        choice_cache.get_options(Author, 'name')
+        version = choice_cache.get_version(Author)
+        Author.objects.filter(pk=author.pk).update(name="Bulk Author")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            choice_cache.invalidate(Author)
+
+        options = choice_cache.get_options(Author, 'name')
+        msg = "options: {}".format(options)
+        self.assertEqual(options, [(author.pk, "Bulk Author")], msg)
+        key = choice_cache.VERSION_KEY.format('books.author')
+        msg = "key: {}, version: {}".format(key, version)
+        self.assertEqual(caches['default'].get(key),
+                         choice_cache.get_version(Author), msg)
+        self.assertTrue(choice_cache.is_registered(Author), msg)
+        self.assertFalse(choice_cache.is_registered(DynamicColumn), msg)
+
+    def test_context_data(self):
+        """
+        Test that ``get_dynamic_column_context_data`` uses the cache.
+        """
+        #self.skipTest("Temporarily skipped")
+        author, a_cc, a_values = self._create_author_objects(extra_dcs=[])
+        language = Language.objects.model_objects()[3] # Russian
+        book, b_cc, b_values = self._create_book_objects(
+            author=author, language=language, extra_dcs=[])
+        mixin = ContextDataMixin()
+        mixin.model = Book
+        context = mixin.get_dynamic_column_context_data()
+        msg = "context: {}".format(context)
+        self.assertTrue('dynamicColumns' in context, msg)
+        self.assertEqual(context['dynamicColumns'].get('author'),
+                         [(0, "Choose a value"), (author.pk, author.name)],
+                         msg)
+        self.assertEqual(len(context['dynamicColumns'].get('language')), 6,
+                         msg)
+
+        new_context = mixin.get_dynamic_column_context_data()
+        msg = "context: {}, new_context: {}".format(context, new_context)
+        self.assertEqual(context, new_context, msg)
+
+    def test_lazy_context_data(self):
+        """
+        Test that a lazy choice only puts the selected option in the context.
+        """
+        #self.skipTest("Temporarily skipped")
+        dcolumn_manager._lazy_choices.add('Book')
+        self.addCleanup(dcolumn_manager._lazy_choices.discard, 'Book')
+        book, b_cc, b_values = self._create_book_objects(
+            title="First Book", extra_dcs=[])
+        book0 = self._create_dcolumn_record(Book, b_cc, title="Other Book")
+        author, a_cc, a_values = self._create_author_objects(
+            extra_dcs=[self._create_dynamic_column_record(
+                "Book", DynamicColumn.CHOICE, 'author_top', 2,
+                relation=self.choice2index.get("Book"))])
+        author.set_key_value('book', book0)
+        mixin = ContextDataMixin()
+        mixin.model = Author
+        context = mixin.get_dynamic_column_context_data(obj=author)
+        msg = "context: {}".format(context)
+        self.assertEqual(context['dynamicColumns'].get('book'),
+                         [(0, "Choose a value"), (book0.pk, "Other Book")],
+                         msg)
+        self.assertEqual(context['lazyDynamicColumns'].get('book'),
+                         reverse('dcolumns:api-choices',
+                                 kwargs={'choice_name': 'Book'}), msg)
+        context = mixin.get_dynamic_column_context_data()
+        msg = "context: {}".format(context)
+        self.assertEqual(context['dynamicColumns'].get('book'),
+                         [(0, "Choose a value")], msg)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/tests/test_dcolumns_export.py
+#
+# WARNING: These unittests can only be run from within the original test
+#          framework from https://github.com/cnobile2012/dcolumn.
+#
+
+import csv
+import datetime
+import json
+from io import StringIO
+
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from example_site.books.models import Book
+
+from ..export import CollectionExporter
+from ..models import DynamicColumn, ColumnCollection
+
+from .base_tests import BaseDcolumns
+
+
+class TestCollectionExport(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestCollectionExport, self).__init__(name)
+
+    def setUp(self):
+        super(TestCollectionExport, self).setUp()
+        author, a_cc, a_values = self._create_author_objects(extra_dcs=[])
+        dc0 = self._create_dynamic_column_record(
+            "Published", DynamicColumn.DATE, 'book_top', 7)
+        book, self.cc, b_values = self._create_book_objects(
+            author=author, extra_dcs=[dc0])
+        book.set_key_value('published', datetime.date(2010, 5, 1))
+        book0 = self._create_dcolumn_record(Book, self.cc, title="Book 01")
+        book1 = self._create_dcolumn_record(Book, self.cc, title="Book 02")
+        book1.set_key_value('abstract', "Another abstract.")
+        self.author = author
+        self.books = [book, book0, book1]
+
+    def test_iter_key_values(self):
+        """
+        Test that the objects are merged with their values in two queries.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, book0, book1 = self.books
+
+        with self.assertNumQueries(2):
+            items = list(Book.objects.iter_key_values(chunk_size=2))
+
+        msg = "items: {}".format(items)
+        self.assertEqual([obj for obj, values in items], self.books, msg)
+        self.assertEqual(items[0][1], {
+            'abstract': "Very very short abstract.",
+            'author': self.author.pk,
+            'published': datetime.date(2010, 5, 1)}, msg)
+        self.assertEqual(items[1][1], {}, msg)
+        self.assertEqual(items[2][1], {'abstract': "Another abstract."}, msg)
+        # Filtered objects and slugs
+        items = list(Book.objects.filter(pk__gt=book.pk).iter_key_values(
+            slugs=['published']))
+        msg = "items: {}".format(items)
+        self.assertEqual(items, [(book0, {}), (book1, {})], msg)
+
+    def test_exporter(self):
+        """
+        Test that the CSV and JSON Lines formats are generated.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, book0, book1 = self.books
+        schema = ColumnCollection.objects.get_schema('book')
+        exporter = CollectionExporter(
+            Book.objects.all(), schema, slugs=['author', 'published'])
+        rows = list(csv.reader(StringIO(''.join(exporter.lines()))))
+        msg = "rows: {}".format(rows)
+        self.assertEqual(rows[0], exporter.headers, msg)
+        self.assertEqual(rows[0][0], 'pk', msg)
+        self.assertEqual(rows[0][-2:], ['author', 'published'], msg)
+        self.assertEqual(len(rows), 4, msg)
+        self.assertEqual(rows[1][-2:], [str(self.author.pk), '2010-05-01'],
+                         msg)
+        self.assertEqual(rows[2][-2:], ['', ''], msg)
+        exporter = CollectionExporter(
+            Book.objects.all(), schema, format=CollectionExporter.JSONL)
+        lines = list(exporter.lines())
+        msg = "lines: {}".format(lines)
+        self.assertEqual(len(lines), 3, msg)
+        row = json.loads(lines[0])
+        self.assertEqual(row.get('title'), book.title, msg)
+        self.assertEqual(row.get('published'), '2010-05-01', msg)
+        self.assertEqual(row.get('abstract'), "Very very short abstract.",
+                         msg)
+        # Invalid arguments
+        with self.assertRaises(ValueError):
+            CollectionExporter(Book.objects.all(), schema, format='xml')
+
+        with self.assertRaises(ValueError):
+            CollectionExporter(Book.objects.all(), schema, slugs=['unknown'])
+
+    def test_export_command(self):
+        """
+        Test that the export command writes all the objects.
+        """
+        #self.skipTest("Temporarily skipped")
+        out = StringIO()
+        call_command('export_collection', 'book', '--format', 'jsonl',
+                     '--slug', 'abstract', stdout=out)
+        lines = out.getvalue().splitlines()
+        msg = "lines: {}".format(lines)
+        self.assertEqual(len(lines), 3, msg)
+        self.assertEqual(json.loads(lines[2]).get('abstract'),
+                         "Another abstract.", msg)
+        self.assertFalse('published' in json.loads(lines[0]), msg)
+
+        with self.assertRaises(CommandError):
+            call_command('export_collection', 'bookX', stdout=out)
+
+    def test_export_view(self):
+        """
+        Test that the export is streamed.
+        """
+        #self.skipTest("Temporarily skipped")
+        client = Client()
+        client.login(username=self._TEST_USERNAME,
+                     password=self._TEST_PASSWORD)
+        url = reverse('dcolumns:export', kwargs={'class_name': 'book'})
+        response = client.get(url)
+        msg = "status: {}".format(response.status_code)
+        self.assertEqual(response.status_code, 200, msg)
+        self.assertTrue(response.streaming, msg)
+        self.assertEqual(response['Content-Type'], 'text/csv', msg)
+        self.assertTrue('book.csv' in response['Content-Disposition'], msg)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        rows = list(csv.reader(StringIO(content)))
+        msg = "rows: {}".format(rows)
+        self.assertEqual(len(rows), 4, msg)
+        response = client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        url = reverse('dcolumns:export', kwargs={'class_name': 'bookX'})
+        response = client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_view_permission(self):
+        """
+        Test that the export needs a logged in user with the view or change
+        permission.
+        """
+        #self.skipTest("Temporarily skipped")
+        url = reverse('dcolumns:export', kwargs={'class_name': 'book'})
+        client = Client()
+        response = client.get(url)
+        msg = "status: {}".format(response.status_code)
+        self.assertEqual(response.status_code, 302, msg)
+        user = self._create_user(username='OtherUser', is_superuser=False)
+        client.login(username='OtherUser', password=self._TEST_PASSWORD)
+        response = client.get(url)
+        msg = "status: {}".format(response.status_code)
+        self.assertEqual(response.status_code, 403, msg)
+
+        for codename in ('view_book', 'change_book'):
+            user.user_permissions.set(Permission.objects.filter(
+                content_type__app_label='books', codename=codename))
+            client.login(username='OtherUser', password=self._TEST_PASSWORD)
+            response = client.get(url)
+            msg = "codename: {}, status: {}".format(
+                codename, response.status_code)
+            self.assertEqual(response.status_code, 200, msg)
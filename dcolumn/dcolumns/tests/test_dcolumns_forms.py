@@ -10,11 +10,16 @@ import logging
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.test import TestCase, Client
+from django.db import connection
+from django import forms
+from django.test import TestCase, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from example_site.books.models import Book #, Author, Publisher, Promotion
 
+from ..forms import (
+    CollectionBaseFormMixin, DynamicChoiceField, collection_form_factory)
 from ..models import DynamicColumn, ColumnCollection
 
 from .base_tests import BaseDcolumns
@@ -205,6 +210,59 @@ class TestCollectionBaseFormMixin(BaseDcolumns, TestCase):
             test_text, data.get('test_text'))
         self.assertEqual(test_text, data.get('test_text'), msg)
 
+    def test_update_queries(self):
+        """
+        Test that an update reads the key values once and only writes the
+        changed values.
+        """
+        #self.skipTest("Temporarily skipped")
+        book = self._create_dcolumn_record(Book, self.cc, title="Queries")
+        url = reverse('test-book-update', kwargs={'pk': book.pk})
+        data = {
+            'title': "Test Book Title",
+            'test_choice': self.author.pk,
+            'test_bool': 1,
+            'test_date': '2020-01-02',
+            'test_float': 1.5,
+            'test_integer': 3,
+            'test_text': "Some text.",
+            }
+        response = self.client.post(url, data)
+        msg = "response status: {}, should be 302".format(response.status_code)
+        self.assertEquals(response.status_code, 302, msg)
+        data['test_text'] = "Changed text."
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data)
+
+        queries = [q['sql'] for q in ctx.captured_queries]
+        msg = "response status: {}, queries: {}".format(
+            response.status_code, queries)
+        self.assertEquals(response.status_code, 302, msg)
+        key_values = [sql for sql in queries if 'dcolumns_keyvalue' in sql]
+        # One read and one write.
+        self.assertEqual(len(key_values), 2, msg)
+        self.assertTrue(key_values[1].startswith('UPDATE'), msg)
+        pk = book.keyvalues.get(dynamic_column=self.dc9).pk
+        self.assertTrue(key_values[1].endswith(
+            '"id" IN ({})'.format(pk)), msg)
+        # The collection comes from the schema.
+        self.assertFalse([sql for sql in queries if 'related_model' in sql],
+                         msg)
+        self.assertEqual(Book.objects.get(pk=book.pk).get_key_value(
+            'test_text'), data['test_text'], msg)
+
+        # Nothing is written when nothing changed.
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data)
+
+        queries = [q['sql'] for q in ctx.captured_queries]
+        msg = "response status: {}, queries: {}".format(
+            response.status_code, queries)
+        self.assertEquals(response.status_code, 302, msg)
+        self.assertEqual(len([sql for sql in queries
+                              if 'dcolumns_keyvalue' in sql]), 1, msg)
+
     def test_validate_boolean_type(self):
         """
         Test that boolean types are validated properly.
@@ -561,3 +619,131 @@ class TestCollectionBaseFormMixin(BaseDcolumns, TestCase):
         response = self.client.get(response.url)
         msg = "response status: {}, should be 200".format(response.status_code)
         self.assertEquals(response.status_code, 200, msg)
+
+
+class TestCollectionFormFactory(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestCollectionFormFactory, self).__init__(name)
+
+    def setUp(self):
+        super(TestCollectionFormFactory, self).setUp()
+        self.author, a_cc, a_values = self._create_author_objects(
+            extra_dcs=[])
+        self.dc0 = self._create_dynamic_column_record(
+            "Test Bool", DynamicColumn.BOOLEAN, 'book_top', 1)
+        self.dc1 = self._create_dynamic_column_record(
+            "Author", DynamicColumn.CHOICE, 'book_top', 2,
+            relation=self.choice2index.get("Author"),
+            required=DynamicColumn.YES, preferred_slug='test_choice')
+        self.dc2 = self._create_dynamic_column_record(
+            "Language", DynamicColumn.CHOICE, 'book_top', 3,
+            relation=self.choice2index.get("Language"),
+            store_relation=DynamicColumn.YES, preferred_slug='test_language')
+        self.dc3 = self._create_dynamic_column_record(
+            "Test Date", DynamicColumn.DATE, 'book_center', 1)
+        self.dc4 = self._create_dynamic_column_record(
+            "Test Integer", DynamicColumn.NUMBER, 'book_center', 2)
+        self.dc5 = self._create_dynamic_column_record(
+            "Test Text Block", DynamicColumn.TEXT_BLOCK, 'book_bottom', 1)
+        self.cc = self._create_column_collection_record(
+            "Book Current", 'book', dynamic_columns=[
+                self.dc0, self.dc1, self.dc2, self.dc3, self.dc4, self.dc5])
+        self.request = RequestFactory().post('/')
+        self.request.user = self.user
+
+    def test_fields(self):
+        """
+        Test that a form field is made for each dynamic column.
+        """
+        #self.skipTest("Temporarily skipped")
+        form_class = collection_form_factory(Book)
+        fields = form_class.base_fields
+        msg = "fields: {}".format(fields)
+        self.assertTrue(issubclass(form_class, CollectionBaseFormMixin), msg)
+        self.assertTrue('title' in fields, msg)
+        self.assertFalse('creator' in fields, msg)
+        self.assertIsInstance(fields['test_bool'], forms.BooleanField, msg)
+        self.assertFalse(fields['test_bool'].required, msg)
+        self.assertIsInstance(fields['test_choice'], DynamicChoiceField, msg)
+        self.assertTrue(fields['test_choice'].required, msg)
+        self.assertEqual(list(fields['test_choice'].choices),
+                         [(0, "Choose a value"),
+                          (self.author.pk, self.author.name)], msg)
+        self.assertIsInstance(fields['test_date'], forms.DateField, msg)
+        self.assertIsInstance(fields['test_integer'], forms.IntegerField,
+                              msg)
+        self.assertIsInstance(fields['test_text_block'].widget,
+                              forms.Textarea, msg)
+        self.assertEqual(fields['test_integer'].label, "Test Integer", msg)
+        form_class = collection_form_factory(Book, fields=['title'])
+        msg = "fields: {}".format(form_class.base_fields)
+        self.assertFalse('active' in form_class.base_fields, msg)
+        self.assertTrue('test_choice' in form_class.base_fields, msg)
+
+    def test_cache(self):
+        """
+        Test that the form class is only built again when the schema
+        changes.
+        """
+        #self.skipTest("Temporarily skipped")
+        form_class = collection_form_factory(Book)
+        msg = "form_class: {}".format(form_class)
+        self.assertIs(collection_form_factory(Book), form_class, msg)
+        self.dc4.required = DynamicColumn.YES
+        self.dc4.save()
+        new_class = collection_form_factory(Book)
+        msg = "form_class: {}, new_class: {}".format(form_class, new_class)
+        self.assertIsNot(new_class, form_class, msg)
+        self.assertTrue(new_class.base_fields['test_integer'].required, msg)
+
+    def test_save(self):
+        """
+        Test that a generated form validates and saves the values.
+        """
+        #self.skipTest("Temporarily skipped")
+        form_class = collection_form_factory(Book)
+        data = {
+            'title': "Test Book Title",
+            'active': True,
+            'test_choice': 0,
+            'test_integer': "five",
+            }
+        form = form_class(data=data, initial={'request': self.request})
+        msg = "errors: {}".format(form.errors)
+        self.assertFalse(form.is_valid(), msg)
+        self.assertEqual(sorted(form.errors), ['test_choice', 'test_integer'],
+                         msg)
+        data.update({'test_choice': self.author.pk, 'test_language': 2,
+                     'test_integer': 5, 'test_date': '2020-01-02'})
+        form = form_class(data=data, initial={'request': self.request})
+        msg = "errors: {}".format(form.errors)
+        self.assertTrue(form.is_valid(), msg)
+        book = form.save()
+        values = Book.objects.get(pk=book.pk).serialize_key_values(
+            by_slug=True)
+        msg = "values: {}".format(values)
+        self.assertEqual(values.get('test_choice'), self.author.pk, msg)
+        self.assertEqual(values.get('test_language'), 'English', msg)
+        self.assertEqual(values.get('test_integer'), 5, msg)
+        self.assertEqual(values.get('test_bool'), False, msg)
+        self.assertEqual(str(values.get('test_date')), '2020-01-02', msg)
+
+    def test_lazy_choice(self):
+        """
+        Test that a lazy choice field only checks the submitted value.
+        """
+        #self.skipTest("Temporarily skipped")
+        book = self._create_dcolumn_record(Book, self.cc, title="A Book")
+        field = DynamicChoiceField(Book, 'title', lazy=True, required=False)
+        msg = "choices: {}".format(list(field.choices))
+        self.assertEqual(list(field.choices), [(0, "Choose a value")], msg)
+        self.assertEqual(field.clean(str(book.pk)), book.pk, msg)
+        self.assertIsNone(field.clean('0'), msg)
+
+        with self.assertRaises(forms.ValidationError):
+            field.clean(str(book.pk + 100))
+
+        field = DynamicChoiceField(Book, 'title', store_relation=True,
+                                   lazy=True)
+        self.assertEqual(field.clean(str(book.pk)), "A Book", msg)
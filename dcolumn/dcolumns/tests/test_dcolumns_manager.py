@@ -75,7 +75,7 @@ class TestManager(BaseDcolumns, TestCase):
             methods.append(method)
 
         msg = "methods: {}".format(methods)
-        self.assertEqual(len(methods), 11, msg)
+        self.assertEqual(len(methods), 13, msg)
 
     def test_register_choice(self):
         """
@@ -111,6 +111,19 @@ class TestManager(BaseDcolumns, TestCase):
         # Cleanup
         self.manager._unregister_choice(Country)
 
+    def test_lazy_choices(self):
+        """
+        Test that choices registered as lazy are found.
+        """
+        #self.skipTest("Temporarily skipped")
+        self.manager.register_choice(Country, 99, 'name', lazy=True)
+        msg = "lazy_choices: {}".format(self.manager.lazy_choices)
+        self.assertTrue(Country.__name__ in self.manager.lazy_choices, msg)
+        self.assertFalse('Book' in self.manager.lazy_choices, msg)
+        self.manager._unregister_choice(Country)
+        msg = "lazy_choices: {}".format(self.manager.lazy_choices)
+        self.assertFalse(Country.__name__ in self.manager.lazy_choices, msg)
+
     def test__unregister_choice(self):
         """
         Test that the _unregister_choice method works.
@@ -167,6 +180,14 @@ class TestManager(BaseDcolumns, TestCase):
         count = len(keys) - 1 # Subtract the "Choose a Relation" option.
         msg = "keys: {}, result: {}".format(keys, result)
         self.assertEqual(count, max(keys), msg)
+        self.assertTrue(0 in keys, msg)
+        # Test that changing the result does not change the manager.
+        result.pop(0)
+        result[100] = 'Bad'
+        result = self.manager.choice_relation_map
+        msg = "result: {}".format(result)
+        self.assertTrue(0 in result, msg)
+        self.assertFalse(100 in result, msg)
 
     def test_choice_map(self):
         """
@@ -316,6 +337,21 @@ class TestManager(BaseDcolumns, TestCase):
         msg = "state: {}".format(state)
         self.assertEqual(state, False, msg)
 
+    @override_settings()
+    def test_schema_cache_alias(self):
+        """
+        Test that the schema cache alias is returned properly.
+        """
+        #self.skipTest("Temporarily skipped")
+        alias = self.manager.schema_cache_alias
+        msg = "alias: {}".format(alias)
+        self.assertEqual(alias, 'default', msg)
+        # Remove the DYNAMIC_COLUMNS settings
+        del settings.DYNAMIC_COLUMNS
+        alias = self.manager.schema_cache_alias
+        msg = "alias: {}".format(alias)
+        self.assertEqual(alias, 'default', msg)
+
     def test_get_related_object_names(self):
         """
         Test that the model list is returned.
@@ -6,11 +6,20 @@
 #          framework from https://github.com/cnobile2012/dcolumn.
 #
 import datetime
+import importlib
 import dateutil
 import pytz
 
+from io import StringIO
+from unittest import mock
+
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.apps import apps
+from django.db import IntegrityError, connection, transaction
+from django.db.models.query import QuerySet
 from django.test import TestCase
+from django.utils import timezone
 
 from example_site.books.choices import Language
 from example_site.books.models import Author, Book, Publisher, Promotion
@@ -452,6 +461,182 @@ class TestCollectionBase(BaseDcolumns, TestCase):
         with self.assertRaises(AttributeError) as cm:
             Book.objects.get_value_by_pk(book.pk, 'bad_field')
 
+    def test_prefetch_key_values(self):
+        """
+        Test that the key values of many objects are fetched with a single
+        query.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 6)
+        book, b_cc, b_values = self._create_book_objects(extra_dcs=[dc0])
+        titles = ["Book {}".format(num) for num in range(5)]
+
+        for num, title in enumerate(titles):
+            obj = self._create_dcolumn_record(Book, b_cc, title=title)
+            obj.set_key_value('abstract', "Abstract {}".format(num))
+            obj.set_key_value('edition', num)
+
+        # Test that all values are fetched.
+        with self.assertNumQueries(2):
+            books = list(Book.objects.filter(
+                title__in=titles).prefetch_key_values())
+            values = [(b.title, b.get_key_value('abstract'),
+                       b.get_key_value('edition')) for b in books]
+
+        msg = "values: {}".format(values)
+        self.assertEqual(len(values), len(titles), msg)
+
+        for title, abstract, edition in values:
+            num = titles.index(title)
+            self.assertEqual(abstract, "Abstract {}".format(num), msg)
+            self.assertEqual(edition, num, msg)
+
+        # Test that only the chosen slugs are fetched, others are fetched
+        # when read.
+        with self.assertNumQueries(2):
+            books = list(Book.objects.filter(
+                title__in=titles).prefetch_key_values('edition'))
+            editions = [b.get_key_value('edition') for b in books]
+
+        msg = "editions: {}".format(editions)
+        self.assertEqual(sorted(editions), list(range(5)), msg)
+
+        with self.assertNumQueries(1):
+            abstract = books[0].get_key_value('abstract')
+            abstract = books[0].get_key_value('abstract')
+
+        msg = "abstract: {}".format(abstract)
+        self.assertEqual(abstract, "Abstract {}".format(
+            titles.index(books[0].title)), msg)
+        # Test that the manager method works on a sliced queryset.
+        with self.assertNumQueries(2):
+            books = Book.objects.prefetch_key_values()[:2]
+            values = [b.get_key_value('abstract') for b in books]
+
+        msg = "values: {}".format(values)
+        self.assertEqual(len(values), 2, msg)
+
+    def test_filter_key_values(self):
+        """
+        Test that objects are filtered on their key values in the database.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 6)
+        dc1 = self._create_dynamic_column_record(
+            "Published", DynamicColumn.DATE, 'book_top', 7)
+        book, b_cc, b_values = self._create_book_objects(
+            language=Language.objects.model_objects()[1],
+            extra_dcs=[dc0, dc1])
+        book.set_key_value('edition', 1)
+        books = {}
+
+        for num in range(2, 6):
+            obj = self._create_dcolumn_record(
+                Book, b_cc, title="Book {}".format(num))
+            obj.set_key_values({
+                'edition': num,
+                'published': datetime.date(2000 + num, 1, 1),
+                'language': Language.objects.model_objects()[num % 2],
+                })
+            books[num] = obj
+
+        # Numbers compare as numbers, 10 > 9 would fail as text.
+        book.set_key_value('edition', 10)
+
+        with self.assertNumQueries(1):
+            found = list(Book.objects.filter_key_values(
+                edition__gt=2).order_by('pk'))
+
+        msg = "found: {}".format(found)
+        self.assertEqual(found, [book, books[3], books[4], books[5]], msg)
+        # Test more than one column and the CHOICE type.
+        language = Language.objects.model_objects()[1]
+        found = list(Book.objects.filter_key_values(
+            language=language, edition__lt=10).order_by('pk'))
+        msg = "found: {}".format(found)
+        self.assertEqual(found, [books[3], books[5]], msg)
+        found = list(Book.objects.filter_key_values(
+            published__range=(datetime.date(2003, 1, 1),
+                              '2004-06-01')).order_by('pk'))
+        msg = "found: {}".format(found)
+        self.assertEqual(found, [books[3], books[4]], msg)
+        # Test isnull for objects without a value.
+        found = list(Book.objects.filter_key_values(published__isnull=True))
+        msg = "found: {}".format(found)
+        self.assertEqual(found, [book], msg)
+        # Test invalid slug and value.
+        with self.assertRaises(ValueError) as cm:
+            Book.objects.filter_key_values(unknown=1)
+
+        with self.assertRaises(ValueError) as cm:
+            Book.objects.filter_key_values(edition='ten')
+
+    def test_with_key_values(self):
+        """
+        Test that key values are annotated as typed virtual fields.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 6)
+        dc1 = self._create_dynamic_column_record(
+            "Published", DynamicColumn.DATE, 'book_top', 7)
+        dc2 = self._create_dynamic_column_record(
+            "Release Time", DynamicColumn.TIME, 'book_top', 8)
+        book, b_cc, b_values = self._create_book_objects(
+            extra_dcs=[dc0, dc1, dc2])
+        book.set_key_values({'edition': 10,
+                             'published': datetime.date(2001, 2, 3),
+                             'release_time': datetime.time(10, 30)})
+
+        for num in range(2, 5):
+            obj = self._create_dcolumn_record(
+                Book, b_cc, title="Book {}".format(num))
+            obj.set_key_value('edition', num)
+
+        # Test one query, typed values and sorting on a dynamic column.
+        with self.assertNumQueries(1):
+            rows = list(Book.objects.with_key_values(
+                'edition', 'published', 'release_time').order_by(
+                '-edition').values_list(
+                'title', 'edition', 'published', 'release_time'))
+
+        msg = "rows: {}".format(rows)
+        self.assertEqual(rows[0], (
+            'Test Book', 10, datetime.date(2001, 2, 3),
+            datetime.time(10, 30)), msg)
+        self.assertEqual([row[1] for row in rows], [10, 4, 3, 2], msg)
+        self.assertEqual(rows[1][2:], (None, None), msg)
+        # Test all columns on model objects and filtering.
+        books = list(Book.objects.with_key_values().filter(edition__lt=4))
+        msg = "books: {}".format(books)
+        self.assertEqual(len(books), 2, msg)
+        self.assertEqual(books[0].abstract, None, msg)
+        # Test invalid slug.
+        with self.assertRaises(ValueError) as cm:
+            Book.objects.with_key_values('unknown')
+
+        # Test slugs with the names of a field or attribute.
+        dc3 = self._create_dynamic_column_record(
+            "Title", DynamicColumn.TEXT, 'book_top', 9)
+        dc4 = self._create_dynamic_column_record(
+            "Key Value Map", DynamicColumn.TEXT, 'book_top', 10,
+            preferred_slug='schema')
+        b_cc.dynamic_column.add(dc3, dc4)
+
+        for slug in ('title', 'schema'):
+            with self.assertRaises(ValueError) as cm:
+                Book.objects.with_key_values(slug)
+
+            msg = "slug: {}, exception: {}".format(slug, cm.exception)
+            self.assertTrue(slug in str(cm.exception), msg)
+
+        books = list(Book.objects.with_key_values().order_by('title'))
+        msg = "books: {}".format(books)
+        self.assertEqual(books[0].title, 'Book 2', msg)
+        self.assertEqual(books[0].edition, 2, msg)
+
     def test_get_all_slugs(self):
         """
         Test that all dynamic column slugs are returned in a list.
@@ -517,6 +702,34 @@ class TestCollectionBase(BaseDcolumns, TestCase):
 
         # TODO Add test for by_slug.
 
+    def test_serialize_key_values_single_query(self):
+        """
+        Test that all the key values are serialized with a single query no
+        matter how many dynamic columns there are.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 6)
+        dc1 = self._create_dynamic_column_record(
+            "Percentage", DynamicColumn.FLOAT, 'book_top', 7)
+        dc2 = self._create_dynamic_column_record(
+            "Ignore", DynamicColumn.BOOLEAN, 'book_top', 8)
+        language = Language.objects.model_objects()[3] # Russian
+        book, b_cc, b_values = self._create_book_objects(
+            language=language, extra_dcs=[dc0, dc1, dc2])
+        self._create_key_value_record(book, dc0, 2)
+        self._create_key_value_record(book, dc1, 20.5)
+        self._create_key_value_record(book, dc2, 'FALSE')
+
+        with self.assertNumQueries(1):
+            result = book.serialize_key_values()
+
+        msg = "result: {}".format(result)
+        self.assertEqual(len(result), 5, msg)
+        self.assertEqual(result.get(dc0.pk), 2, msg)
+        self.assertEqual(result.get(dc1.pk), 20.5, msg)
+        self.assertEqual(result.get(dc2.pk), False, msg)
+
     def test_get_dynamic_column(self):
         """
         Test that the dynamic column is returned when it's slug is passed.
@@ -668,6 +881,59 @@ class TestCollectionBase(BaseDcolumns, TestCase):
         with self.assertRaises(ValueError) as cm:
             value = book.get_key_value(slug)
 
+    def test_get_key_value_cache(self):
+        """
+        Test that key values are read from the database only once per
+        instance and that writes go through to the cache.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 6)
+        book, b_cc, b_values = self._create_book_objects(extra_dcs=[dc0])
+        book.set_key_value('edition', 1)
+        book = Book.objects.get(pk=book.pk)
+
+        with self.assertNumQueries(1):
+            for i in range(3):
+                abstract = book.get_key_value('abstract')
+                edition = book.get_key_value('edition')
+                missing = book.get_key_value('not-a-slug')
+
+        msg = "abstract: {}, edition: {}, missing: {}".format(
+            abstract, edition, missing)
+        self.assertEqual(abstract, b_values.get('abstract'), msg)
+        self.assertEqual(edition, 1, msg)
+        self.assertEqual(missing, '', msg)
+        # Test that set_key_value updates the cache.
+        book.set_key_value('edition', 5)
+
+        with self.assertNumQueries(0):
+            edition = book.get_key_value('edition')
+
+        msg = "edition: {}".format(edition)
+        self.assertEqual(edition, 5, msg)
+        # Test that a deferred value is not seen until it is saved.
+        book.set_key_value('edition', 6, defer=True)
+        self.assertEqual(book.get_key_value('edition'), 5)
+        book.save_deferred()
+        self.assertEqual(book.get_key_value('edition'), 6)
+        # Test that writes through querysets and other instances are seen.
+        KeyValue.objects.filter(
+            collection=book, dynamic_column=dc0).update(value='7')
+        self.assertEqual(book.get_key_value('edition'), 7)
+        book.keyvalues.filter(dynamic_column=dc0).update(value='8')
+        self.assertEqual(book.get_key_value('edition'), 8)
+        obj = KeyValue.objects.get(collection=book, dynamic_column=dc0)
+        obj.value = '9'
+        obj.save()
+        self.assertEqual(book.get_key_value('edition'), 9)
+
+        with self.assertNumQueries(0):
+            edition = book.get_key_value('edition')
+
+        obj.delete()
+        self.assertEqual(book.get_key_value('edition'), '')
+
     def test_get_key_value_exception(self):
         """
         Check that all the possible combinations of this method work
@@ -794,6 +1060,17 @@ class TestCollectionBase(BaseDcolumns, TestCase):
         msg = "Initial value: {}, found_value: {}, new_pk: {}".format(
             promotion.name, found_value, new_promotion.name)
         self.assertEqual(found_value, new_promotion.name, msg)
+        # Test CHOICE mode with store_relation set to True and the stored
+        # text of an option.
+        book.set_key_value(slug, promotion.name)
+        found_value = book.get_key_value(slug)
+        msg = "Initial value: {}, found_value: {}".format(
+            new_promotion.name, found_value)
+        self.assertEqual(found_value, promotion.name, msg)
+
+        with self.assertRaises(ValueError) as cm:
+            book.set_key_value(slug, 'Not a promotion')
+
         # Test that an alternate field can be set.
         slug = 'language'
         value = 'Russian'
@@ -1006,6 +1283,83 @@ class TestCollectionBase(BaseDcolumns, TestCase):
             b_values.get(slug), found_value, 1)
         self.assertEqual(found_value, 1, msg)
 
+    def test_increment_key_value(self):
+        """
+        Test that NUMBER values are changed by the database.
+        """
+        #self.skipTest("Temporarily skipped")
+        # Get the test objects
+        (book, b_values, author, a_values, new_author, promotion, p_values,
+         new_promotion, language) = self._create_test_objects()
+        slug = 'edition'
+        # Test that a missing value starts at the delta.
+        value = book.increment_key_value(slug, delta=5)
+        msg = "value: {}".format(value)
+        self.assertEqual(value, 5, msg)
+        # Test that an update does not read the row first and the cache is
+        # kept current.
+        with self.assertNumQueries(4):
+            value = book.increment_key_value(slug, delta=10)
+
+        msg = "value: {}".format(value)
+        self.assertEqual(value, 15, msg)
+        self.assertEqual(book.get_key_value(slug), 15, msg)
+        # Test that a stale object does not lose an update.
+        other = Book.objects.get(pk=book.pk)
+        other.get_key_value(slug)
+        book.increment_key_value(slug)
+        value = other.increment_key_value(slug)
+        msg = "value: {}".format(value)
+        self.assertEqual(value, 17, msg)
+        # Test negative deltas and values.
+        value = book.increment_key_value(slug, delta=-20)
+        msg = "value: {}".format(value)
+        self.assertEqual(value, -3, msg)
+        found_value = Book.objects.get(pk=book.pk).get_key_value(slug)
+        msg = "found_value: {}".format(found_value)
+        self.assertEqual(found_value, -3, msg)
+        # Test the set_key_value keywords.
+        book.set_key_value(slug, 'increment')
+        book.set_key_value(slug, 'increment')
+        book.set_key_value(slug, 'decrement')
+        self.assertEqual(book.get_key_value(slug), -2)
+        # Test that a value that is not a number is replaced.
+        book.keyvalues.filter(dynamic_column__slug=slug).update(value='x')
+        value = book.increment_key_value(slug, delta=2)
+        msg = "value: {}".format(value)
+        self.assertEqual(value, 2, msg)
+        # Test that a value added by another process after the update is
+        # added to, not overwritten.
+        book.keyvalues.filter(dynamic_column__slug=slug).delete()
+        update = QuerySet.update
+        calls = []
+
+        def racing_update(queryset, **kwargs):
+            if calls:
+                return update(queryset, **kwargs)
+
+            calls.append(kwargs)
+            KeyValue.objects.bulk_create([KeyValue(
+                collection=book, dynamic_column=book.get_dynamic_column(slug),
+                value='7')])
+            return 0
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            value = book.increment_key_value(slug, delta=5)
+
+        msg = "value: {}".format(value)
+        self.assertEqual(value, 12, msg)
+        self.assertEqual(book.get_key_value(slug), 12, msg)
+        # Test invalid slugs and deltas.
+        with self.assertRaises(ValueError) as cm:
+            book.increment_key_value('abstract')
+
+        with self.assertRaises(ValueError) as cm:
+            book.increment_key_value(slug, delta='1')
+
+        with self.assertRaises(ValueError) as cm:
+            book.increment_key_value(slug, delta=1.5)
+
     def test_set_key_value_TEXT_and_TEXT_BLOCK(self):
         """
         Check that the TEXT and TEXT_BLOCK type works correctly.
@@ -1035,6 +1389,117 @@ class TestCollectionBase(BaseDcolumns, TestCase):
         self.assertEqual(len(result), len(b_values), msg)
 
 
+    def test_set_key_values(self):
+        """
+        Test that many values are set with a constant number of queries.
+        """
+        #self.skipTest("Temporarily skipped")
+        # Get the test objects
+        (book, b_values, author, a_values, new_author, promotion, p_values,
+         new_promotion, language) = self._create_test_objects()
+        values = {
+            'abstract': "A bulk abstract",
+            'edition': 3,
+            'ignore': True,
+            'web_site': "www.example.org",
+            'author': new_author,
+            }
+        # Warm the schema then use a fresh object.
+        book.schema
+        book = Book.objects.get(pk=book.pk)
+
+        with self.assertNumQueries(8):
+            book.set_key_values(values)
+
+        book = Book.objects.get(pk=book.pk)
+        values['author'] = new_author.name
+
+        for slug, value in values.items():
+            found_value = book.get_key_value(slug)
+            msg = "slug: {}, found_value: {}, value: {}".format(
+                slug, found_value, value)
+            self.assertEqual(found_value, value, msg)
+
+        # Test that the new objects have primary keys in the cache.
+        pks = [kv.pk for kv in book._get_key_value_cache().values()]
+        msg = "pks: {}".format(pks)
+        self.assertNotIn(None, pks, msg)
+        # Test that unchanged values are not written and increment works.
+        with self.assertNumQueries(3):
+            book.set_key_values({'abstract': "A bulk abstract",
+                                 'edition': 'increment'})
+
+        found_value = Book.objects.get(pk=book.pk).get_key_value('edition')
+        msg = "found_value: {}".format(found_value)
+        self.assertEqual(found_value, 4, msg)
+
+    def test_save_deferred(self):
+        """
+        Test that deferred values are saved with a constant number of
+        queries.
+        """
+        #self.skipTest("Temporarily skipped")
+        # Get the test objects
+        (book, b_values, author, a_values, new_author, promotion, p_values,
+         new_promotion, language) = self._create_test_objects()
+        abstract = book.get_key_value('abstract')
+        values = {
+            'abstract': "A deferred abstract",
+            'edition': 2,
+            'web_site': "www.example.org",
+            'percentage': 12.5,
+            }
+
+        for slug, value in values.items():
+            book.set_key_value(slug, value, defer=True)
+
+        # The last queued value is the one saved.
+        book.set_key_value('edition', 5, defer=True)
+        values['edition'] = 5
+        # Nothing is saved or changed in the cache yet.
+        found_value = Book.objects.get(pk=book.pk).get_key_value('abstract')
+        msg = "found_value: {}, abstract: {}".format(found_value, abstract)
+        self.assertEqual(found_value, abstract, msg)
+        self.assertEqual(book.get_key_value('abstract'), abstract, msg)
+
+        with self.assertNumQueries(7):
+            book.save_deferred()
+
+        for obj in (book, Book.objects.get(pk=book.pk)):
+            for slug, value in values.items():
+                found_value = obj.get_key_value(slug)
+                msg = "slug: {}, found_value: {}, value: {}".format(
+                    slug, found_value, value)
+                self.assertEqual(found_value, value, msg)
+
+        # Test that the queue was emptied.
+        with self.assertNumQueries(0):
+            book.save_deferred()
+
+    def test_set_key_values_exceptions(self):
+        """
+        Test that nothing is written when any value is invalid.
+        """
+        #self.skipTest("Temporarily skipped")
+        # Get the test objects
+        (book, b_values, author, a_values, new_author, promotion, p_values,
+         new_promotion, language) = self._create_test_objects()
+        abstract = book.get_key_value('abstract')
+        # Test invalid slug.
+        with self.assertRaises(ValueError) as cm:
+            book.set_key_values({'abstract': "Changed", 'unknown': 1})
+        # Test invalid value.
+        with self.assertRaises(ValueError) as cm:
+            book.set_key_values({'abstract': "Changed", 'edition': 'one'})
+        # Test empty value without force.
+        with self.assertRaises(ValueError) as cm:
+            book.set_key_values({'abstract': "Changed", 'edition': ''})
+
+        found_value = Book.objects.get(pk=book.pk).get_key_value('abstract')
+        msg = "found_value: {}, abstract: {}".format(found_value, abstract)
+        self.assertEqual(found_value, abstract, msg)
+
+
 class TestKeyValue(BaseDcolumns, TestCase):
 
     def __init__(self, name):
@@ -1054,3 +1519,291 @@ class TestKeyValue(BaseDcolumns, TestCase):
         # Test that the values are the same.
         msg = "value: {}, instance value: {!s}".format(kv.value, kv)
         self.assertEqual(value, str(kv), msg)
+
+    def test_unique_column(self):
+        """
+        Test that a collection can only have one KeyValue per column.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 4)
+        book, b_cc, b_values = self._create_book_objects(extra_dcs=[dc0,])
+        self._create_key_value_record(book, dc0, '1')
+
+        with self.assertRaises(IntegrityError) as cm:
+            with transaction.atomic():
+                KeyValue.objects.bulk_create([KeyValue(
+                    collection=book, dynamic_column=dc0, value='2')])
+
+    def test_upsert(self):
+        """
+        Test that upsert inserts or updates without reading first.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 4)
+        book, b_cc, b_values = self._create_book_objects(extra_dcs=[dc0,])
+        # Test insert.
+        kv = KeyValue.objects.upsert(KeyValue(
+            collection=book, dynamic_column=dc0, value='1'))
+        msg = "kv.pk: {}".format(kv.pk)
+        self.assertIsNotNone(kv.pk, msg)
+        # Test update.
+        new_kv = KeyValue.objects.upsert(KeyValue(
+            collection=book, dynamic_column=dc0, value='2'))
+        msg = "kv.pk: {}, new_kv.pk: {}".format(kv.pk, new_kv.pk)
+        self.assertEqual(new_kv.pk, kv.pk, msg)
+        kvs = KeyValue.objects.filter(collection=book, dynamic_column=dc0)
+        self.assertEqual([kv.value for kv in kvs], ['2'], msg)
+        self.assertFalse(new_kv._state.adding, msg)
+        # Test that a value upserted into the cache is then updated, not
+        # inserted again.
+        book.get_key_value('edition')
+        book.set_key_value('edition', 3)
+
+        # One update in a savepoint.
+        with self.assertNumQueries(3):
+            book.set_key_values({'edition': 4})
+
+        book = Book.objects.get(pk=book.pk)
+        self.assertEqual(book.get_key_value('edition'), 4, msg)
+
+    def test_bulk_upsert(self):
+        """
+        Test that bulk_upsert updates objects that already exist.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 4)
+        dc1 = self._create_dynamic_column_record(
+            "Web Site", DynamicColumn.TEXT, 'book_top', 5)
+        book, b_cc, b_values = self._create_book_objects(
+            extra_dcs=[dc0, dc1])
+        kv = self._create_key_value_record(book, dc0, '1')
+        objs = KeyValue.objects.bulk_upsert([
+            KeyValue(collection=book, dynamic_column=dc0, value='2'),
+            KeyValue(collection=book, dynamic_column=dc1, value='www')
+            ])
+        values = dict(book.keyvalues.values_list('dynamic_column', 'value'))
+        msg = "values: {}".format(values)
+        self.assertEqual(values.get(dc0.pk), '2', msg)
+        self.assertEqual(values.get(dc1.pk), 'www', msg)
+        self.assertEqual(objs[0].pk, kv.pk, msg)
+        self.assertNotIn(None, [obj.pk for obj in objs], msg)
+
+    def test_remove_duplicates(self):
+        """
+        Test that the duplicate remover and its command run.
+        """
+        #self.skipTest("Temporarily skipped")
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 4)
+        book, b_cc, b_values = self._create_book_objects(extra_dcs=[dc0,])
+        self._create_key_value_record(book, dc0, '1')
+        count = KeyValue.objects.count()
+        # The unique constraint keeps duplicates out of the test database.
+        num = KeyValue.objects.remove_duplicates()
+        msg = "num: {}".format(num)
+        self.assertEqual(num, 0, msg)
+        out = StringIO()
+        call_command('dedupe_key_values', '--dry-run', stdout=out)
+        msg = "out: {}".format(out.getvalue())
+        self.assertIn("0 duplicate", out.getvalue(), msg)
+        self.assertEqual(KeyValue.objects.count(), count, msg)
+
+    def _create_typed_objects(self):
+        dcs = [
+            self._create_dynamic_column_record(
+                "Edition", DynamicColumn.NUMBER, 'book_top', 4),
+            self._create_dynamic_column_record(
+                "Percentage", DynamicColumn.FLOAT, 'book_top', 5),
+            self._create_dynamic_column_record(
+                "Ignore", DynamicColumn.BOOLEAN, 'book_top', 6),
+            self._create_dynamic_column_record(
+                "Date & Time", DynamicColumn.DATETIME, 'book_top', 7),
+            self._create_dynamic_column_record(
+                "Published", DynamicColumn.DATE, 'book_top', 8),
+            self._create_dynamic_column_record(
+                "Release Time", DynamicColumn.TIME, 'book_top', 9),
+            ]
+        author = self._create_dcolumn_record(
+            Author, self._create_column_collection_record(
+                "Author Current", 'author'), name="Homer")
+        book, b_cc, b_values = self._create_book_objects(
+            author=author, extra_dcs=dcs)
+        return book, author
+
+    def test_typed_values(self):
+        """
+        Test that the typed value fields are set on every write path.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, author = self._create_typed_objects()
+        utc = datetime.timezone.utc
+        dt = datetime.datetime(2020, 2, 3, 4, 5, 6, tzinfo=utc)
+        book.set_key_value('edition', -3)
+        book.set_key_values({'percentage': 12.5, 'ignore': 'yes',
+                             'date_time': dt})
+        book.set_key_value('published', datetime.date(2020, 2, 3),
+                           defer=True)
+        book.set_key_value('release_time', '10:30:00', defer=True)
+        book.save_deferred()
+        expected = {
+            'edition': ('value_int', -3),
+            'author': ('value_int', author.pk),
+            'percentage': ('value_float', 12.5),
+            'ignore': ('value_bool', True),
+            'date_time': ('value_datetime', dt),
+            'published': ('value_datetime', datetime.datetime(
+                2020, 2, 3, tzinfo=utc)),
+            'release_time': ('value_datetime', datetime.datetime(
+                1970, 1, 1, 10, 30, tzinfo=utc)),
+            }
+
+        for kv in book.keyvalues.select_related('dynamic_column'):
+            field, value = expected.get(kv.dynamic_column.slug, (None, None))
+            typed = {f: getattr(kv, f) for f in KeyValue.TYPED_FIELDS}
+            msg = "slug: {}, typed: {}".format(kv.dynamic_column.slug, typed)
+
+            for typed_field, typed_value in typed.items():
+                if typed_field == field:
+                    self.assertEqual(typed_value, value, msg)
+                else:
+                    self.assertIsNone(typed_value, msg)
+
+        # Test that the atomic increment keeps the typed field current.
+        book.increment_key_value('edition', delta=10)
+        kv = book.keyvalues.get(dynamic_column__slug='edition')
+        msg = "value: {}, value_int: {}".format(kv.value, kv.value_int)
+        self.assertEqual(kv.value_int, 7, msg)
+        # Test that the typed fields can be filtered on.
+        found = KeyValue.objects.filter(
+            dynamic_column__slug='percentage', value_float__gt=10).count()
+        msg = "found: {}".format(found)
+        self.assertEqual(found, 1, msg)
+
+    def test_typed_values_invalid(self):
+        """
+        Test that values that do not convert leave the typed fields empty.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, author = self._create_typed_objects()
+
+        for slug, value in (('edition', '1.5'), ('ignore', 'maybe'),
+                            ('date_time', 'not a date'), ('percentage', '1e5'),
+                            ('percentage', 'nan')):
+            kv = KeyValue(collection=book,
+                          dynamic_column=book.get_dynamic_column(slug),
+                          value=value)
+            kv.set_typed_values()
+            typed = [getattr(kv, f) for f in KeyValue.TYPED_FIELDS]
+            msg = "slug: {}, typed: {}".format(slug, typed)
+            self.assertEqual(typed, [None] * 4, msg)
+
+    def test_to_typed_value(self):
+        """
+        Test that typed values are converted the way values are set.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, author = self._create_typed_objects()
+        get_column = book.get_dynamic_column
+        tz = timezone.get_default_timezone()
+        data = (
+            ('edition', '-3', -3),
+            ('author', author, author.pk),
+            ('percentage', '-1.5', -1.5),
+            ('percentage', 2, 2.0),
+            ('ignore', 'no', False),
+            ('ignore', 1, True),
+            ('date_time', '2020-02-03T04:05:06',
+             timezone.make_aware(datetime.datetime(2020, 2, 3, 4, 5, 6), tz)),
+            ('date_time', datetime.datetime(2020, 2, 3, 4, 5, 6),
+             timezone.make_aware(datetime.datetime(2020, 2, 3, 4, 5, 6), tz)),
+            ('published', '2020-02-03', datetime.datetime(
+                2020, 2, 3, tzinfo=datetime.timezone.utc)),
+            )
+
+        for slug, value, expected in data:
+            result = KeyValue.to_typed_value(get_column(slug), value)
+            msg = "slug: {}, value: {}, result: {}".format(slug, value,
+                                                          result)
+            self.assertEqual(result, expected, msg)
+
+        for slug, value in (('percentage', '1e5'), ('percentage', 'nan'),
+                            ('edition', '1.5'), ('ignore', 'maybe')):
+            with self.assertRaises(ValueError):
+                KeyValue.to_typed_value(get_column(slug), value)
+
+    def test_number_minus_signs(self):
+        """
+        Test that numbers with more than one leading minus sign or only a
+        minus sign are rejected.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, author = self._create_typed_objects()
+
+        for slug, value in (('edition', '--5'), ('edition', '-'),
+                            ('percentage', '--1.5'), ('percentage', '-'),
+                            ('percentage', '-.')):
+            with self.assertRaises(ValueError) as cm:
+                book.set_key_value(slug, value)
+
+            msg = "slug: {}, value: {}, exception: {}".format(
+                slug, value, cm.exception)
+            self.assertIn("Invalid value", str(cm.exception), msg)
+            self.assertEqual(book.get_key_value(slug), '', msg)
+
+        # Test that a bad value already in the database is reported the
+        # same way when read.
+        KeyValue.objects.create(
+            collection=book, dynamic_column=book.get_dynamic_column('edition'),
+            value='--5')
+
+        with self.assertRaises(ValueError) as cm:
+            book.get_key_value('edition')
+
+        msg = "exception: {}".format(cm.exception)
+        self.assertIn("Invalid value", str(cm.exception), msg)
+        book.set_key_value('edition', '-5')
+        self.assertEqual(book.get_key_value('edition'), -5)
+
+    def test_backfill_typed_values(self):
+        """
+        Test that the backfill command sets the typed value fields.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, author = self._create_typed_objects()
+        book.set_key_values({'edition': 2, 'percentage': 1.5})
+        KeyValue.objects.update(value_int=None, value_float=None)
+        out = StringIO()
+        call_command('backfill_typed_values', '--batch-size', '2',
+                     stdout=out)
+        msg = "out: {}".format(out.getvalue())
+        self.assertIn("{} KeyValue".format(KeyValue.objects.count()),
+                      out.getvalue(), msg)
+        values = {kv.dynamic_column.slug: (kv.value_int, kv.value_float)
+                  for kv in book.keyvalues.select_related('dynamic_column')}
+        msg = "values: {}".format(values)
+        self.assertEqual(values['edition'], (2, None), msg)
+        self.assertEqual(values['percentage'], (None, 1.5), msg)
+        self.assertEqual(values['author'], (author.pk, None), msg)
+
+    def test_backfill_typed_values_migration(self):
+        """
+        Test that the migration adding the typed value fields sets them on
+        the existing objects.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, author = self._create_typed_objects()
+        book.set_key_values({'edition': 2, 'percentage': 1.5})
+        KeyValue.objects.update(value_int=None, value_float=None)
+        migration = importlib.import_module(
+            'dcolumn.dcolumns.migrations.0008_keyvalue_typed_values')
+        migration.backfill_typed_values(
+            apps, mock.Mock(connection=connection))
+        values = {kv.dynamic_column.slug: (kv.value_int, kv.value_float)
+                  for kv in book.keyvalues.select_related('dynamic_column')}
+        msg = "values: {}".format(values)
+        self.assertEqual(values['edition'], (2, None), msg)
+        self.assertEqual(values['percentage'], (None, 1.5), msg)
+        self.assertEqual(values['author'], (author.pk, None), msg)
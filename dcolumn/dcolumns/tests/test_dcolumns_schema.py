@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+#
+# dcolumn/dcolumns/tests/test_dcolumns_schema.py
+#
+# WARNING: These unittests can only be run from within the original test
+#          framework from https://github.com/cnobile2012/dcolumn.
+#
+
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from ..models import DynamicColumn, ColumnCollection
+from ..schema import schema_cache
+
+from .base_tests import BaseDcolumns
+
+
+class TestCollectionSchema(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestCollectionSchema, self).__init__(name)
+
+    def setUp(self):
+        super(TestCollectionSchema, self).setUp()
+        schema_cache.clear()
+
+    def tearDown(self):
+        super(TestCollectionSchema, self).tearDown()
+        schema_cache.clear()
+
+    def test_schema_maps(self):
+        """
+        Test that the compiled schema holds all the column meta data.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, cc, values = self._create_book_objects(extra_dcs=[])
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_center', 1, active=False)
+        cc.process_dynamic_columns(list(cc.dynamic_column.all()) + [dc0])
+        schema = ColumnCollection.objects.get_schema('book')
+        msg = "schema: {}".format(schema)
+        self.assertEqual(schema.pk, cc.pk, msg)
+        self.assertEqual(schema.name, 'book', msg)
+        self.assertEqual([dc.slug for dc in schema.columns], ['abstract'], msg)
+        self.assertEqual(schema.value_types,
+                         {'abstract': DynamicColumn.TEXT_BLOCK}, msg)
+        self.assertEqual(schema.locations, {'abstract': 'book-top'}, msg)
+        # Inactive columns can still be looked up by slug.
+        self.assertEqual(schema.get_column('edition').pk, dc0.pk, msg)
+        self.assertIsNone(schema.get_column('unknown'), msg)
+        self.assertIs(book.schema, schema, msg)
+
+    def test_schema_is_cached(self):
+        """
+        Test that a compiled schema is reused without any queries.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, cc, values = self._create_book_objects(extra_dcs=[])
+        ColumnCollection.objects.serialize_columns('book')
+
+        with self.assertNumQueries(0):
+            ColumnCollection.objects.serialize_columns('book')
+            ColumnCollection.objects.get_collection_choices('book')
+            ColumnCollection.objects.get_active_relation_items('BOOK')
+            book.get_dynamic_column('abstract')
+
+    def test_schema_invalidation(self):
+        """
+        Test that changes to the columns or collections drop the cache.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, cc, values = self._create_book_objects(extra_dcs=[])
+        schema = ColumnCollection.objects.get_schema('book')
+        dc = DynamicColumn.objects.get(pk=schema.get_column('abstract').pk)
+        # A changed dynamic column, the slug follows the name.
+        dc.name = "Summary"
+        dc.save()
+        new_schema = ColumnCollection.objects.get_schema('book')
+        msg = "schema: {}, new_schema: {}".format(schema, new_schema)
+        self.assertIsNot(schema, new_schema, msg)
+        self.assertEqual(new_schema.get_column('summary').pk, dc.pk, msg)
+        # A dynamic column added to the collection.
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_center', 1)
+        schema_cache.get_by_pk(cc.pk)
+        cc.dynamic_column.add(dc0)
+        schema = book.schema
+        msg = "schema: {}".format(schema)
+        self.assertEqual(schema.get_column('edition').pk, dc0.pk, msg)
+        # An inactive collection is no longer found by name.
+        cc.active = False
+        cc.save()
+
+        with self.assertRaises(ColumnCollection.DoesNotExist):
+            ColumnCollection.objects.get_schema('book')
+
+
+class TestSchemaVersion(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestSchemaVersion, self).__init__(name)
+
+    def setUp(self):
+        super(TestSchemaVersion, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': self.cache_dir,
+                }
+            })
+        self.settings.enable()
+        schema_cache.clear()
+
+    def tearDown(self):
+        super(TestSchemaVersion, self).tearDown()
+        self.settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        schema_cache.clear()
+
+    def test_invalidate_sets_shared_version(self):
+        """
+        Test that a schema change stores a new shared version.
+        """
+        #self.skipTest("Temporarily skipped")
+        version = caches['default'].get(schema_cache.VERSION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            book, cc, values = self._create_book_objects(extra_dcs=[])
+            # Not stored before the transaction commits.
+            new_version = caches['default'].get(schema_cache.VERSION_KEY)
+            msg = "version: {}, new_version: {}".format(version, new_version)
+            self.assertEqual(version, new_version, msg)
+
+        msg = "callbacks: {}".format(callbacks)
+        self.assertTrue(callbacks, msg)
+        new_version = caches['default'].get(schema_cache.VERSION_KEY)
+        msg = "version: {}, new_version: {}".format(version, new_version)
+        self.assertIsNotNone(new_version, msg)
+        self.assertNotEqual(version, new_version, msg)
+        # Our own change does not drop the schema again.
+        schema = ColumnCollection.objects.get_schema('book')
+        schema_cache.check_version()
+        self.assertIs(ColumnCollection.objects.get_schema('book'), schema)
+
+    def test_check_version(self):
+        """
+        Test that a change made by another process drops the schemas.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, cc, values = self._create_book_objects(extra_dcs=[])
+        schema_cache.check_version()
+        schema = ColumnCollection.objects.get_schema('book')
+        # Nothing changed.
+        schema_cache.check_version()
+        self.assertIs(ColumnCollection.objects.get_schema('book'), schema)
+        # Another process changed a column.
+        caches['default'].set(schema_cache.VERSION_KEY, 'other-process')
+        schema_cache.check_version()
+        new_schema = ColumnCollection.objects.get_schema('book')
+        msg = "schema: {}, new_schema: {}".format(schema, new_schema)
+        self.assertIsNot(new_schema, schema, msg)
+        # The key was evicted from the cache.
+        caches['default'].delete(schema_cache.VERSION_KEY)
+        schema_cache.check_version()
+        self.assertIsNot(ColumnCollection.objects.get_schema('book'),
+                         new_schema)
+        self.assertIsNotNone(caches['default'].get(schema_cache.VERSION_KEY))
+
+    def test_shared_version(self):
+        """
+        Test that the shared version follows the version in the cache.
+        """
+        #self.skipTest("Temporarily skipped")
+        schema_cache._shared_version = None
+        version = schema_cache.shared_version
+        msg = "version: {}".format(version)
+        self.assertEqual(caches['default'].get(schema_cache.VERSION_KEY),
+                         version, msg)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            book, cc, values = self._create_book_objects(extra_dcs=[])
+
+        self.assertNotEqual(schema_cache.shared_version, version, msg)
+
+    def test_checked_on_request(self):
+        """
+        Test that the shared version is checked at the start of a request.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, cc, values = self._create_book_objects(extra_dcs=[])
+        schema = ColumnCollection.objects.get_schema('book')
+        caches['default'].set(schema_cache.VERSION_KEY, 'other-process')
+        self.client.get('/')
+        msg = "schema: {}".format(schema)
+        self.assertIsNot(ColumnCollection.objects.get_schema('book'), schema,
+                         msg)
+
+    def test_checked_on_read(self):
+        """
+        Test that outside of a request the shared version is checked when a
+        schema is read after ``check_interval`` seconds.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, cc, values = self._create_book_objects(extra_dcs=[])
+        schema = ColumnCollection.objects.get_schema('book')
+        caches['default'].set(schema_cache.VERSION_KEY, 'read-process')
+        msg = "schema: {}".format(schema)
+        self.assertIs(ColumnCollection.objects.get_schema('book'), schema,
+                      msg)
+        schema_cache._checked -= schema_cache.check_interval + 1
+        self.assertIsNot(ColumnCollection.objects.get_schema('book'), schema,
+                         msg)
+        self.assertEqual(schema_cache.shared_version, 'read-process', msg)
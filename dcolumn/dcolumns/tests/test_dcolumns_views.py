@@ -11,16 +11,34 @@ import pytz
 import dateutil
 import json
 
-from django.test import TestCase, Client
+from unittest import mock
+
+from django import forms
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.db.models.signals import post_save
+from django.forms import modelformset_factory
+from django.test import TestCase, Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ValidationError
+from django.http import Http404
 from django.urls import reverse
 
+from dcolumn.dcolumns.choice_cache import choice_cache
+from dcolumn.dcolumns.manager import dcolumn_manager
+from dcolumn.dcolumns.forms import (
+    CollectionBaseFormSet, collection_form_factory)
 from dcolumn.dcolumns.views import CollectionAJAXView
-from dcolumn.dcolumns.models import DynamicColumn
+from dcolumn.dcolumns.models import DynamicColumn, KeyValue
+from dcolumn.test_app.views import TestBookListView
 from example_site.books.choices import Language
+from example_site.books.models import Book
 
 from .base_tests import BaseDcolumns
 
+User = get_user_model()
+
 
 class TestCollectionAJAXView(BaseDcolumns, TestCase):
     _TEST_USERNAME = 'TestUser'
@@ -108,3 +126,861 @@ class TestCollectionAJAXView(BaseDcolumns, TestCase):
         self.assertTrue('dynamicColumns' in content, msg)
         self.assertTrue('relations' in content, msg)
         self.assertTrue('valid' in content, msg)
+
+
+    def test_conditional_get(self):
+        """
+        Test that an unchanged response is answered with 304 Not Modified
+        and a changed collection or choice gets a new ETag.
+        """
+        #self.skipTest("Temporarily skipped")
+        author, a_cc, a_values = self._create_author_objects(extra_dcs=[])
+        book, b_cc, b_values = self._create_book_objects(
+            author=author, extra_dcs=[])
+        url = reverse('dcolumns:api-collections',
+                      kwargs={'class_name': 'book'})
+        response = self.client.get(url)
+        etag = response.get('ETag')
+        msg = "headers: {}".format(response.items())
+        self.assertEqual(response.status_code, 200, msg)
+        self.assertIsNotNone(etag, msg)
+        self.assertTrue('no-cache' in response.get('Cache-Control'), msg)
+        content = response.content
+        # Unchanged
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        msg = "status: {}".format(response.status_code)
+        self.assertEqual(response.status_code, 304, msg)
+        # The cached body is served without building it again.
+        response = self.client.get(url)
+        msg = "content: {}".format(response.content)
+        self.assertEqual(response.content, content, msg)
+        self.assertEqual(response.get('ETag'), etag, msg)
+        # A changed choice object.
+        author.name = "Another Author"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        new_etag = response.get('ETag')
+        msg = "etag: {}, new_etag: {}".format(etag, new_etag)
+        self.assertEqual(response.status_code, 200, msg)
+        self.assertNotEqual(new_etag, etag, msg)
+        self.assertTrue(b"Another Author" in response.content, msg)
+        # A changed dynamic column.
+        dc = DynamicColumn.objects.get(slug='abstract')
+        dc.name = "Summary"
+
+        # The shared version is changed when the transaction commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            dc.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=new_etag)
+        msg = "etag: {}, new_etag: {}".format(new_etag, response.get('ETag'))
+        self.assertEqual(response.status_code, 200, msg)
+        self.assertNotEqual(response.get('ETag'), new_etag, msg)
+
+    def test_unregistered_relation(self):
+        """
+        Test that a column whose relation is not a registered choice does
+        not break the ETag.
+        """
+        #self.skipTest("Temporarily skipped")
+        promotion, p_cc, p_values = self._create_promotion_objects(
+            extra_dcs=[])
+        book, b_cc, b_values = self._create_book_objects(
+            promotion=promotion, extra_dcs=[])
+        Promotion = type(promotion)
+        dcolumn_manager._unregister_choice(Promotion)
+        self.addCleanup(dcolumn_manager.register_choice, Promotion,
+                        self.choice2index.get("Promotion"), 'name')
+        url = reverse('dcolumns:api-collections',
+                      kwargs={'class_name': 'book'})
+        response = self.client.get(url)
+        msg = "status: {}, content: {}".format(response.status_code,
+                                               response.content)
+        self.assertEqual(response.status_code, 200, msg)
+        self.assertIsNotNone(response.get('ETag'), msg)
+
+
+class TestChoiceSearchAJAXView(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestChoiceSearchAJAXView, self).__init__(name)
+        self.client = None
+
+    def setUp(self):
+        super(TestChoiceSearchAJAXView, self).setUp()
+        self.client = Client()
+        self.client.login(username=self._TEST_USERNAME,
+                          password=self._TEST_PASSWORD)
+        book, self.cc, b_values = self._create_book_objects(
+            title="Book 00", extra_dcs=[])
+        self.books = [book] + [
+            self._create_dcolumn_record(Book, self.cc,
+                                        title="Book {:02}".format(num))
+            for num in range(1, 5)]
+
+    def _get(self, choice_name='Book', **params):
+        url = reverse('dcolumns:api-choices',
+                      kwargs={'choice_name': choice_name})
+        response = self.client.get(url, params)
+        msg = "response status: {}, should be 200".format(response.status_code)
+        self.assertEqual(response.status_code, 200, msg)
+        return json.loads(response.content.decode(encoding='utf-8'))
+
+    def test_search(self):
+        """
+        Test that options are returned a page at a time.
+        """
+        #self.skipTest("Temporarily skipped")
+        content = self._get(page_size=2)
+        msg = "content: {}".format(content)
+        self.assertTrue(content.get('valid'), msg)
+        self.assertEqual(content.get('results'),
+                         [[b.pk, b.title] for b in self.books[:2]], msg)
+        self.assertTrue(content.get('has_next'), msg)
+        content = self._get(page_size=2, page=3)
+        msg = "content: {}".format(content)
+        self.assertEqual(content.get('results'),
+                         [[self.books[4].pk, "Book 04"]], msg)
+        self.assertFalse(content.get('has_next'), msg)
+        content = self._get(q='k 03', match='prefix')
+        msg = "content: {}".format(content)
+        self.assertEqual(content.get('results'), [], msg)
+        content = self._get(q='k 03')
+        msg = "content: {}".format(content)
+        self.assertEqual(content.get('results'),
+                         [[self.books[3].pk, "Book 03"]], msg)
+
+    def test_selected(self):
+        """
+        Test that a single selected option is returned.
+        """
+        #self.skipTest("Temporarily skipped")
+        content = self._get(selected=self.books[2].pk)
+        msg = "content: {}".format(content)
+        self.assertEqual(content.get('results'),
+                         [[self.books[2].pk, "Book 02"]], msg)
+        content = self._get('Language', selected='English', store_relation=1)
+        msg = "content: {}".format(content)
+        self.assertEqual(content.get('results'), [[2, 'English']], msg)
+        content = self._get('Language', selected='English')
+        msg = "content: {}".format(content)
+        self.assertEqual(content.get('results'), [], msg)
+
+    def test_exceptions(self):
+        """
+        Test that invalid requests are not valid.
+        """
+        #self.skipTest("Temporarily skipped")
+        content = self._get('BookX')
+        msg = "content: {}".format(content)
+        self.assertFalse(content.get('valid'), msg)
+        self.assertTrue("Invalid choice name" in content.get('message'), msg)
+
+        for params in ({'page': 0}, {'page': 'x'}, {'page_size': -1}):
+            content = self._get(**params)
+            msg = "params: {}, content: {}".format(params, content)
+            self.assertFalse(content.get('valid'), msg)
+
+
+class TestKeyValueAJAXView(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestKeyValueAJAXView, self).__init__(name)
+        self.client = None
+
+    def setUp(self):
+        super(TestKeyValueAJAXView, self).setUp()
+        self.client = Client()
+        self.client.login(username=self._TEST_USERNAME,
+                          password=self._TEST_PASSWORD)
+        author, a_cc, a_values = self._create_author_objects(extra_dcs=[])
+        dc0 = self._create_dynamic_column_record(
+            "Published", DynamicColumn.DATE, 'book_top', 7)
+        book, self.cc, b_values = self._create_book_objects(
+            author=author, extra_dcs=[dc0])
+        book.set_key_value('published', datetime.date(2010, 5, 1))
+        book0 = self._create_dcolumn_record(Book, self.cc, title="Book 01")
+        book0.set_key_value('abstract', "Another abstract.")
+        self.author = author
+        self.books = [book, book0]
+
+    def _get(self, class_name='book', **params):
+        url = reverse('dcolumns:api-values', kwargs={'class_name': class_name})
+        response = self.client.get(url, params)
+        msg = "response status: {}, should be 200".format(response.status_code)
+        self.assertEqual(response.status_code, 200, msg)
+        return json.loads(response.content.decode(encoding='utf-8'))
+
+    def test_values(self):
+        """
+        Test that the values of many objects are returned.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, book0 = self.books
+        content = self._get(pk=[book.pk, book0.pk, 9999])
+        msg = "content: {}".format(content)
+        self.assertTrue(content.get('valid'), msg)
+        values = content.get('values')
+        self.assertEqual(values.get(str(book.pk)), {
+            'abstract': "Very very short abstract.",
+            'author': self.author.pk,
+            'published': '2010-05-01'}, msg)
+        self.assertEqual(values.get(str(book0.pk)),
+                         {'abstract': "Another abstract."}, msg)
+        self.assertFalse('9999' in values, msg)
+        # Comma separated lists and slugs.
+        content = self._get(pk="{},{}".format(book.pk, book0.pk),
+                            slug='published')
+        msg = "content: {}".format(content)
+        self.assertEqual(content.get('values'), {
+            str(book.pk): {'published': '2010-05-01'},
+            str(book0.pk): {}}, msg)
+
+    def test_queries(self):
+        """
+        Test that the values are read with one ``KeyValue`` query.
+        """
+        #self.skipTest("Temporarily skipped")
+        instances = list(Book.objects.all())
+
+        with self.assertNumQueries(1):
+            values = KeyValue.objects.serialize_for_collections(instances)
+
+        msg = "values: {}".format(values)
+        self.assertEqual(len(values), 2, msg)
+        # One read, the insert, its pk lookup and the update, the others are
+        # savepoints.
+        book, book0 = self.books
+
+        with self.assertNumQueries(8):
+            errors = KeyValue.objects.set_for_collections(instances, {
+                book.pk: {'abstract': "New abstract."},
+                book0.pk: {'published': '2012-03-04'}})
+
+        msg = "errors: {}".format(errors)
+        self.assertEqual(errors, {}, msg)
+
+    def _post(self, data, class_name='book', status=200):
+        url = reverse('dcolumns:api-values', kwargs={'class_name': class_name})
+
+        if not isinstance(data, str):
+            data = json.dumps(data)
+
+        response = self.client.post(url, data,
+                                    content_type='application/json')
+        msg = "response status: {}, should be {}".format(
+            response.status_code, status)
+        self.assertEqual(response.status_code, status, msg)
+        return json.loads(response.content.decode(encoding='utf-8'))
+
+    def test_set_values(self):
+        """
+        Test that the values of many objects are set.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, book0 = self.books
+        content = self._post({
+            book.pk: {'abstract': "New abstract.", 'published': '2011-01-02'},
+            book0.pk: {'author': self.author.pk, 'published': '2012-03-04'},
+            })
+        msg = "content: {}".format(content)
+        self.assertTrue(content.get('valid'), msg)
+        self.assertEqual(content.get('updated'), 2, msg)
+        book = Book.objects.get(pk=book.pk)
+        book0 = Book.objects.get(pk=book0.pk)
+        self.assertEqual(book.get_key_value('abstract'), "New abstract.", msg)
+        self.assertEqual(book.get_key_value('published'),
+                         datetime.date(2011, 1, 2), msg)
+        self.assertEqual(book0.get_key_value('author'), self.author.name, msg)
+        self.assertEqual(book0.get_key_value('published'),
+                         datetime.date(2012, 3, 4), msg)
+
+    def test_set_values_errors(self):
+        """
+        Test that nothing is written if any value is invalid.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, book0 = self.books
+        content = self._post({
+            book.pk: {'abstract': "New abstract.", 'published': 'not a date'},
+            book0.pk: {'unknown': 1, 'author': 'bad-data'},
+            }, status=400)
+        msg = "content: {}".format(content)
+        self.assertFalse(content.get('valid'), msg)
+        errors = content.get('errors')
+        self.assertEqual(list(errors.get(str(book.pk))), ['published'], msg)
+        self.assertEqual(sorted(errors.get(str(book0.pk))),
+                         ['author', 'unknown'], msg)
+        book = Book.objects.get(pk=book.pk)
+        self.assertEqual(book.get_key_value('abstract'),
+                         "Very very short abstract.", msg)
+        # Unknown objects
+        content = self._post({9999: {'abstract': "New abstract."}},
+                             status=400)
+        msg = "content: {}".format(content)
+        self.assertEqual(content.get('errors'),
+                         {'9999': {'__all__': ["Object not found."]}}, msg)
+
+        for data in ('not json', [], {}, {'x': {}}, {book.pk: 'x'}):
+            content = self._post(data, status=400)
+            msg = "data: {}, content: {}".format(data, content)
+            self.assertFalse(content.get('valid'), msg)
+            self.assertTrue('message' in content, msg)
+
+    def _login_user(self, perms=()):
+        user = (User.objects.filter(username='OtherUser').first()
+                or self._create_user(username='OtherUser',
+                                     is_superuser=False))
+        user.user_permissions.set(Permission.objects.filter(
+            content_type__app_label='books', codename__in=perms))
+        self.client.logout()
+        self.client.login(username='OtherUser',
+                          password=self._TEST_PASSWORD)
+        return user
+
+    def test_values_permission(self):
+        """
+        Test that the user must have the view or change permission to get
+        values.
+        """
+        #self.skipTest("Temporarily skipped")
+        url = reverse('dcolumns:api-values', kwargs={'class_name': 'book'})
+        self._login_user()
+        response = self.client.get(url, {'pk': self.books[0].pk})
+        msg = "response status: {}".format(response.status_code)
+        self.assertEqual(response.status_code, 403, msg)
+
+        for codename in ('view_book', 'change_book'):
+            self._login_user(perms=(codename,))
+            content = self._get(pk=self.books[0].pk)
+            msg = "codename: {}, content: {}".format(codename, content)
+            self.assertTrue(content.get('valid'), msg)
+
+        self.client.logout()
+        response = self.client.get(url, {'pk': self.books[0].pk})
+        msg = "response status: {}".format(response.status_code)
+        self.assertEqual(response.status_code, 302, msg)
+
+    def test_set_values_permission(self):
+        """
+        Test that the user must have the change permission to set values.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, book0 = self.books
+        data = {book.pk: {'abstract': "New abstract."}}
+        self._login_user(perms=('view_book',))
+        url = reverse('dcolumns:api-values', kwargs={'class_name': 'book'})
+        response = self.client.post(url, json.dumps(data),
+                                    content_type='application/json')
+        msg = "response status: {}".format(response.status_code)
+        self.assertEqual(response.status_code, 403, msg)
+        book = Book.objects.get(pk=book.pk)
+        self.assertEqual(book.get_key_value('abstract'),
+                         "Very very short abstract.", msg)
+        self._login_user(perms=('change_book',))
+        content = self._post(data)
+        msg = "content: {}".format(content)
+        self.assertTrue(content.get('valid'), msg)
+
+    def test_set_values_anonymous(self):
+        """
+        Test that an anonymous user cannot set values.
+        """
+        #self.skipTest("Temporarily skipped")
+        book, book0 = self.books
+        self.client.logout()
+        url = reverse('dcolumns:api-values', kwargs={'class_name': 'book'})
+        response = self.client.post(
+            url, json.dumps({book.pk: {'abstract': "New abstract."}}),
+            content_type='application/json')
+        msg = "response status: {}".format(response.status_code)
+        self.assertEqual(response.status_code, 302, msg)
+        book = Book.objects.get(pk=book.pk)
+        self.assertEqual(book.get_key_value('abstract'),
+                         "Very very short abstract.", msg)
+
+    def test_exceptions(self):
+        """
+        Test that invalid requests are not valid.
+        """
+        #self.skipTest("Temporarily skipped")
+        pk = self.books[0].pk
+
+        for class_name, params in (('bookX', {'pk': pk}),
+                                   ('book', {}),
+                                   ('book', {'pk': 'x'}),
+                                   ('book', {'pk': pk, 'slug': 'unknown'})):
+            content = self._get(class_name, **params)
+            msg = "class_name: {}, params: {}, content: {}".format(
+                class_name, params, content)
+            self.assertFalse(content.get('valid'), msg)
+
+
+class TestCollectionBulkEditViewMixin(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestCollectionBulkEditViewMixin, self).__init__(name)
+        self.client = None
+
+    def setUp(self):
+        super(TestCollectionBulkEditViewMixin, self).setUp()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.author, a_cc, a_values = self._create_author_objects(
+            extra_dcs=[])
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 6)
+        book, self.cc, b_values = self._create_book_objects(
+            author=self.author, extra_dcs=[dc0])
+        self.books = [book] + [
+            self._create_dcolumn_record(Book, self.cc,
+                                        title="Book {}".format(num))
+            for num in range(4)]
+
+        for num, book in enumerate(self.books):
+            book.set_key_values({'edition': num + 1, 'author': self.author,
+                                 'abstract': "An abstract."})
+
+        self.url = reverse('test-book-bulk-edit')
+
+    def tearDown(self):
+        self.client.logout()
+        super(TestCollectionBulkEditViewMixin, self).tearDown()
+
+    def _get_data(self, formset):
+        """
+        Make the POST data from an unbound formset.
+        """
+        data = {}
+
+        for name in formset.management_form.fields:
+            data[formset.management_form.add_prefix(name)] = (
+                formset.management_form[name].value())
+
+        for form in formset:
+            for name, field in form.fields.items():
+                if name == 'column_collection':
+                    # Set by the form.
+                    continue
+
+                value = form[name].value()
+
+                if isinstance(field, forms.BooleanField):
+                    value = 'on' if value else None
+
+                if value is not None:
+                    data[form.add_prefix(name)] = value
+
+        return data
+
+    def test_get(self):
+        """
+        Test that the forms show the current values.
+        """
+        #self.skipTest("Temporarily skipped")
+        response = self.client.get(self.url)
+        msg = "response status: {}, should be 200".format(
+            response.status_code)
+        self.assertEqual(response.status_code, 200, msg)
+        formset = response.context_data['formset']
+        editions = [form.initial.get('edition') for form in formset]
+        msg = "editions: {}".format(editions)
+        self.assertEqual(len(formset.forms), len(self.books), msg)
+        self.assertEqual(sorted(editions), [1, 2, 3, 4, 5], msg)
+        self.assertTrue('author' in response.context_data.get(
+            'dynamicColumns', {}), msg)
+
+    def test_post(self):
+        """
+        Test that the changes are saved with a batched write.
+        """
+        #self.skipTest("Temporarily skipped")
+        response = self.client.get(self.url)
+        data = self._get_data(response.context_data['formset'])
+        changed = {}
+
+        for num, form in enumerate(response.context_data['formset']):
+            if num % 2:
+                data[form.add_prefix('edition')] = 10 + num
+                changed[form.instance.pk] = 10 + num
+
+        data[response.context_data['formset'][0].add_prefix('title')] = (
+            "New Title")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, data)
+
+        queries = [q['sql'] for q in ctx.captured_queries]
+        msg = "response status: {}, queries: {}".format(
+            response.status_code, queries)
+        self.assertEqual(response.status_code, 302, msg)
+        # One read and one write of the key values.
+        self.assertEqual(len([sql for sql in queries
+                              if 'dcolumns_keyvalue' in sql]), 2, msg)
+        # Only the changed objects are written, all with one update.
+        updates = [sql for sql in queries
+                   if sql.startswith('UPDATE "dcolumns_collectionbase"')]
+        self.assertEqual(len(updates), 1, msg)
+        self.assertEqual(updates[0].count('"updated" = CASE'), 1, msg)
+        self.assertEqual(updates[0].split('"updated" = CASE')[1].split(
+            'END')[0].count('WHEN'), 3, msg)
+
+        for book in Book.objects.all():
+            edition = book.get_key_value('edition')
+            msg = "book: {}, edition: {}".format(book, edition)
+            self.assertEqual(edition, changed.get(
+                book.pk, self.books.index(book) + 1), msg)
+
+        self.assertEqual(Book.objects.filter(title="New Title").count(), 1,
+                         msg)
+
+    def test_choice_options(self):
+        """
+        Test that the select options are read from the choice cache once
+        for all the forms.
+        """
+        #self.skipTest("Temporarily skipped")
+        get_options = choice_cache.get_options
+        calls = []
+
+        def counted(choice, field):
+            calls.append(choice.__name__)
+            return get_options(choice, field)
+
+        with mock.patch.object(choice_cache, 'get_options', counted):
+            response = self.client.get(self.url)
+            response.render()
+            formset = response.context_data['formset']
+            data = self._get_data(formset)
+            data[formset[0].add_prefix('edition')] = 100
+            get_calls = list(calls)
+            del calls[:]
+            response = self.client.post(self.url, data)
+
+        msg = "get calls: {}, post calls: {}".format(get_calls, calls)
+        self.assertEqual(response.status_code, 302, msg)
+        # One for the formset and one for the relation context data.
+        self.assertEqual(get_calls.count('Author'), 2, msg)
+        self.assertEqual(calls.count('Author'), 1, msg)
+
+    def test_save_without_bulk_update(self):
+        """
+        Test that the changed objects are saved one at a time when
+        ``bulk_update`` is ``False`` and that the updater is set.
+        """
+        #self.skipTest("Temporarily skipped")
+        user = self._create_user(username='OtherUser')
+        request = RequestFactory().post('/')
+        request.user = user
+        response = self.client.get(self.url)
+        formset = response.context_data['formset']
+        data = self._get_data(formset)
+        data[formset[0].add_prefix('title')] = "New Title"
+        data[formset[1].add_prefix('title')] = "Other Title"
+        formset_class = type(str('BookFormSet'), (formset.__class__,),
+                             {'bulk_update': False})
+        formset = formset_class(data, request=request)
+        msg = "errors: {}".format(formset.errors)
+        self.assertTrue(formset.is_valid(), msg)
+        saved = []
+
+        def receiver(sender, instance, **kwargs):
+            saved.append(instance.pk)
+
+        post_save.connect(receiver, sender=Book)
+        self.addCleanup(post_save.disconnect, receiver, sender=Book)
+        instances = formset.save()
+        msg = "instances: {}, saved: {}".format(instances, saved)
+        self.assertEqual(sorted(saved), sorted(
+            inst.pk for inst in instances), msg)
+        self.assertEqual(len(saved), 2, msg)
+        self.assertEqual(Book.objects.filter(updater=user).count(), 2, msg)
+
+    def test_post_errors(self):
+        """
+        Test that nothing is saved when a form has errors.
+        """
+        #self.skipTest("Temporarily skipped")
+        response = self.client.get(self.url)
+        formset = response.context_data['formset']
+        data = self._get_data(formset)
+        data[formset[0].add_prefix('edition')] = 100
+        data[formset[1].add_prefix('edition')] = "many"
+        response = self.client.post(self.url, data)
+        msg = "response status: {}, should be 200".format(
+            response.status_code)
+        self.assertEqual(response.status_code, 200, msg)
+        errors = response.context_data['formset'].errors
+        msg = "errors: {}".format(errors)
+        self.assertTrue('edition' in errors[1], msg)
+        self.assertFalse(KeyValue.objects.filter(
+            dynamic_column__slug='edition', value='100').exists(), msg)
+
+    def test_save_errors(self):
+        """
+        Test that a value failing validation when the formset is saved is
+        shown on its form and nothing is saved.
+        """
+        #self.skipTest("Temporarily skipped")
+        response = self.client.get(self.url)
+        formset = response.context_data['formset']
+        data = self._get_data(formset)
+        data[formset[0].add_prefix('edition')] = 100
+        data[formset[1].add_prefix('edition')] = 200
+        formset = formset.__class__(data, request=response.wsgi_request)
+        msg = "errors: {}".format(formset.errors)
+        self.assertTrue(formset.is_valid(), msg)
+        original = KeyValue.clean
+
+        def clean(obj):
+            if obj.value == '200':
+                raise ValidationError("Bad value.")
+
+            original(obj)
+
+        with mock.patch.object(KeyValue, 'clean', clean):
+            instances = formset.save()
+
+        msg = "instances: {}, errors: {}".format(instances, formset.errors)
+        self.assertEqual(instances, [], msg)
+        self.assertTrue("Bad value." in formset[1].errors.as_text(), msg)
+        self.assertFalse(KeyValue.objects.filter(
+            dynamic_column__slug='edition', value__in=('100', '200')
+            ).exists(), msg)
+
+    def test_post_choice_model(self):
+        """
+        Test that the options of a registered choice model are rebuilt
+        after a bulk edit.
+        """
+        #self.skipTest("Temporarily skipped")
+        Author = type(self.author)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            choice_cache.invalidate(Author)
+
+        formset_class = modelformset_factory(
+            Author, form=collection_form_factory(Author, fields=['name']),
+            formset=CollectionBaseFormSet, extra=0)
+        request = RequestFactory().post('/')
+        request.user = self.user
+        options = choice_cache.get_options(Author, 'name')
+        msg = "options: {}".format(options)
+        self.assertTrue((self.author.pk, self.author.name) in options, msg)
+        formset = formset_class(request=request)
+        data = self._get_data(formset)
+        data[formset[0].add_prefix('name')] = "New Name"
+        formset = formset_class(data, request=request)
+        msg = "errors: {}".format(formset.errors)
+        self.assertTrue(formset.is_valid(), msg)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            formset.save()
+
+        options = choice_cache.get_options(Author, 'name')
+        msg = "options: {}".format(options)
+        self.assertTrue((self.author.pk, "New Name") in options, msg)
+
+
+class TestCollectionKeysetListViewMixin(BaseDcolumns, TestCase):
+
+    def __init__(self, name):
+        super(TestCollectionKeysetListViewMixin, self).__init__(name)
+
+    def setUp(self):
+        super(TestCollectionKeysetListViewMixin, self).setUp()
+        self.factory = RequestFactory()
+        dc0 = self._create_dynamic_column_record(
+            "Edition", DynamicColumn.NUMBER, 'book_top', 6)
+        dc1 = self._create_dynamic_column_record(
+            "Published", DynamicColumn.DATE, 'book_top', 7)
+        book, self.cc, b_values = self._create_book_objects(
+            extra_dcs=[dc0, dc1])
+        self.books = [book]
+        book.set_key_values({'edition': 20,
+                             'published': datetime.date(2010, 1, 1)})
+
+        # Editions 1 and 2 twice, then 3 to 6, one book without an edition.
+        for num, edition in enumerate((2, 1, 2, 1, 3, 4, 5, 6, None)):
+            obj = self._create_dcolumn_record(
+                Book, self.cc, title="Book {}".format(num))
+
+            if edition is not None:
+                obj.set_key_values({
+                    'edition': edition,
+                    'published': datetime.date(2000 + edition, 1, 1)})
+
+            self.books.append(obj)
+
+    def _get_page(self, query='', page_size=3):
+        request = self.factory.get('/test-book-list/' + query)
+        request.user = self.user
+        view = TestBookListView.as_view(paginate_by=page_size)
+        return view(request).context_data
+
+    def _get_all_pages(self, order, page_size=3):
+        query = '?order={}'.format(order)
+        pages = []
+
+        while True:
+            context = self._get_page(query, page_size=page_size)
+            pages.append(list(context['object_list']))
+
+            if not context['page_obj'].has_next():
+                break
+
+            query = '?' + context['page_obj'].next_query
+
+        return pages, context
+
+    def test_order_and_pages(self):
+        """
+        Test that pages follow the dynamic column order without gaps.
+        """
+        #self.skipTest("Temporarily skipped")
+        pages, context = self._get_all_pages('edition')
+        editions = [obj.edition for page in pages for obj in page]
+        msg = "editions: {}".format(editions)
+        self.assertEqual(editions, [1, 1, 2, 2, 3, 4, 5, 6, 20, None], msg)
+        self.assertEqual(len(pages), 4, msg)
+        self.assertEqual(
+            len({obj.pk for page in pages for obj in page}), 10, msg)
+        self.assertTrue(context['is_paginated'], msg)
+        # Test descending order and a date column.
+        pages, context = self._get_all_pages('-published', page_size=4)
+        published = [obj.published for page in pages for obj in page]
+        msg = "published: {}".format(published)
+        # The objects without a value are last in either direction.
+        self.assertEqual(published[0], datetime.date(2010, 1, 1), msg)
+        self.assertEqual(published[-2], datetime.date(2001, 1, 1), msg)
+        self.assertEqual(published[-1], None, msg)
+        self.assertEqual(len(published), 10, msg)
+        self.assertEqual(
+            len({obj.pk for page in pages for obj in page}), 10, msg)
+        # Test going back from a page of objects without a value.
+        pages, context = self._get_all_pages('-published', page_size=3)
+        msg = "pages: {}".format(pages)
+        self.assertEqual([obj.published for obj in pages[-1]], [None], msg)
+        last = self._get_page('?' + context['page_obj'].previous_query,
+                              page_size=3)
+        msg = "pages: {}, last: {}".format(pages, last['object_list'])
+        self.assertEqual(last['object_list'], pages[-2], msg)
+
+    def test_previous_page(self):
+        """
+        Test that the previous page link returns the prior page.
+        """
+        #self.skipTest("Temporarily skipped")
+        first = self._get_page('?order=edition')
+        second = self._get_page('?' + first['page_obj'].next_query)
+        third = self._get_page('?' + second['page_obj'].next_query)
+        back = self._get_page('?' + third['page_obj'].previous_query)
+        msg = "second: {}, back: {}".format(
+            second['object_list'], back['object_list'])
+        self.assertEqual(back['object_list'], second['object_list'], msg)
+        self.assertTrue(back['page_obj'].has_previous(), msg)
+        back = self._get_page('?' + back['page_obj'].previous_query)
+        msg = "first: {}, back: {}".format(
+            first['object_list'], back['object_list'])
+        self.assertEqual(back['object_list'], first['object_list'], msg)
+        self.assertFalse(back['page_obj'].has_previous(), msg)
+        self.assertEqual(first['page_obj'].first_query, 'order=edition', msg)
+
+    def test_constant_queries(self):
+        """
+        Test that a deep page costs the same as the first page.
+        """
+        #self.skipTest("Temporarily skipped")
+        context = self._get_page('?order=edition', page_size=2)
+
+        for num in range(3):
+            query = '?' + context['page_obj'].next_query
+
+            # The page and the prefetched key values.
+            with self.assertNumQueries(2):
+                context = self._get_page(query, page_size=2)
+
+    def test_invalid_cursor(self):
+        """
+        Test that an invalid cursor is not found and an invalid order is
+        ignored.
+        """
+        #self.skipTest("Temporarily skipped")
+        with self.assertRaises(Http404) as cm:
+            self._get_page('?cursor=garbage')
+
+        context = self._get_page('?order=unknown', page_size=20)
+        titles = [obj.title for obj in context['object_list']]
+        msg = "titles: {}".format(titles)
+        self.assertEqual(titles, sorted(titles), msg)
+        self.assertFalse(context['is_paginated'], msg)
+        # A slug with the name of a model attribute is ignored.
+        self.cc.dynamic_column.add(self._create_dynamic_column_record(
+            "Key Value Map", DynamicColumn.NUMBER, 'book_top', 8,
+            preferred_slug='schema'))
+        context = self._get_page('?order=schema', page_size=20)
+        titles = [obj.title for obj in context['object_list']]
+        msg = "titles: {}".format(titles)
+        self.assertEqual(titles, sorted(titles), msg)
+
+    def test_model_ordering(self):
+        """
+        Test that without a slug the pages follow the model's ordering.
+        """
+        #self.skipTest("Temporarily skipped")
+        # Make titles that are the same so the pk breaks the ties.
+        Book.objects.filter(pk__in=[obj.pk for obj in self.books[2:5]]
+                            ).update(title="Book 1")
+        expected = [obj.pk for obj in Book.objects.order_by('title', 'pk')]
+        pages, context = self._get_all_pages('')
+        pks = [obj.pk for page in pages for obj in page]
+        msg = "pks: {}, expected: {}".format(pks, expected)
+        self.assertEqual(pks, expected, msg)
+        # Go back a page.
+        first = self._get_page('')
+        second = self._get_page('?' + first['page_obj'].next_query)
+        back = self._get_page('?' + second['page_obj'].previous_query)
+        msg = "first: {}, back: {}".format(
+            first['object_list'], back['object_list'])
+        self.assertEqual(back['object_list'], first['object_list'], msg)
+
+    def test_previous_page_without_values(self):
+        """
+        Test going back from the objects without a value to the objects
+        with one.
+        """
+        #self.skipTest("Temporarily skipped")
+        pages, context = self._get_all_pages('edition', page_size=4)
+        last = self._get_page('?' + context['page_obj'].previous_query,
+                              page_size=4)
+        msg = "pages: {}, last: {}".format(pages, last['object_list'])
+        self.assertEqual(last['object_list'], pages[-2], msg)
+
+    def test_index_is_used(self):
+        """
+        Test that the seek and sort use the typed value index and do not
+        scan the objects.
+        """
+        #self.skipTest("Temporarily skipped")
+        if connection.vendor != 'sqlite':
+            self.skipTest("The query plan is for SQLite.")
+
+        context = self._get_page('?order=edition', page_size=2)
+        query = '?' + context['page_obj'].next_query
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._get_page(query, page_size=2)
+
+        sql = ctx.captured_queries[0]['sql']
+
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+        msg = "sql: {}, plan: {}".format(sql, plan)
+        self.assertTrue('dcolumns_kv_int_idx' in plan, msg)
+        self.assertFalse('SCAN books_book' in plan, msg)
+        self.assertFalse('SCAN dcolumns_keyvalue' in plan, msg)
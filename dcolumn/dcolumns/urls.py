@@ -7,6 +7,12 @@ URLs used in DColumns.
 
 re_path(r'api/collections/(?P<class_name>\w+)/$', collection_ajax_view,
         name="api-collections")
+re_path(r'api/choices/(?P<choice_name>\w+)/$', choice_search_ajax_view,
+        name="api-choices")
+re_path(r'api/values/(?P<class_name>\w+)/$', key_value_ajax_view,
+        name="api-values")
+re_path(r'export/(?P<class_name>\w+)/$', collection_export_view,
+        name="export")
 """
 __docformat__ = "restructuredtext en"
 
@@ -15,10 +21,18 @@ try:
 except:
     from django.conf.urls import include, url as re_path
 
-from .views import collection_ajax_view
+from .views import (
+    collection_ajax_view, choice_search_ajax_view, key_value_ajax_view,
+    collection_export_view)
 
 app_name = 'dcolumns'
 urlpatterns = [
     re_path(r'api/collections/(?P<class_name>\w+)/$', collection_ajax_view,
             name="api-collections"),
+    re_path(r'api/choices/(?P<choice_name>\w+)/$', choice_search_ajax_view,
+            name="api-choices"),
+    re_path(r'api/values/(?P<class_name>\w+)/$', key_value_ajax_view,
+            name="api-values"),
+    re_path(r'export/(?P<class_name>\w+)/$', collection_export_view,
+            name="export"),
     ]
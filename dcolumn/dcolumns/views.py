@@ -7,18 +7,43 @@ Dynamic Column dependent views.
 """
 __docformat__ = "restructuredtext en"
 
+import base64
+import datetime
+import hashlib
+import json
 import logging
+from decimal import Decimal
 
+from django.contrib.auth import get_permission_codename
+from django.contrib.auth.decorators import login_required
+from django.core.cache import caches
+from django.core.exceptions import (
+    FieldDoesNotExist, PermissionDenied, ValidationError)
+from django.db import models
+from django.db.models import (
+    Exists, F, FilteredRelation, OuterRef, Q, Value)
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import TruncDate, TruncTime
 from django.db.transaction import atomic
-from django.forms import formset_factory
+from django.forms import modelformset_factory
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect,
+    JsonResponse, StreamingHttpResponse)
 from django.shortcuts import render
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
-from django.views.generic import TemplateView
+from django.views.decorators.http import condition
+from django.views.generic import TemplateView, View
 
 from dcolumn.common.view_mixins import JSONResponseMixin
 from dcolumn.common.decorators import dcolumn_login_required
-from .models import DynamicColumn, ColumnCollection
+from .models import DynamicColumn, ColumnCollection, KeyValue
+from .choice_cache import choice_cache
+from .export import CollectionExporter
+from .forms import CollectionBaseFormSet, collection_form_factory
+from .schema import schema_cache
 from .manager import dcolumn_manager
 
 log = logging.getLogger('dcolumns.dcolumns.views')
@@ -30,13 +55,17 @@ class ContextDataMixin(object):
     """
     formset_class = None
 
-    def get_dynamic_column_context_data(self, **kwargs):
+    def get_dynamic_column_context_data(self, obj=None, **kwargs):
         """
         Generates the data needed for HTML select option tags. This data is
         in a dict keyed by ``dynamicColumns`` giving it a namespace in the
         context. The slug for each ``CHOICE`` object is the key to the list
         used for the option tags.
 
+        ``CHOICE`` objects registered with ``lazy=True`` only get the option
+        selected on ``obj``, the URL used to search for the other options is
+        put in a dict keyed by ``lazyDynamicColumns``.
+
         Example of Output::
 
           {'dynamicColumns': {
@@ -58,11 +87,15 @@ class ContextDataMixin(object):
            ...}
           }
 
+        :param obj: Optional model object that inherits from
+                    ``CollectionBase``.
+        :type obj: object
         :rtype: dict
         """
         context = {}
         fk_slugs = DynamicColumn.objects.get_fk_slugs()
         name = kwargs.pop('class_name', None) # Used in AJAX call only.
+        key_values = obj.serialize_key_values(by_slug=True) if obj else {}
 
         if not name:
             name = dcolumn_manager.get_collection_name(self.model.__name__)
@@ -71,10 +104,22 @@ class ContextDataMixin(object):
             name):
             model, field = dcolumn_manager.choice_map.get(model_name)
             objects = context.setdefault('dynamicColumns', {})
-            values = [(r.pk, getattr(r, field))
-                      for r in model.objects.model_objects()]
+            slug = fk_slugs.get(model_name)
+
+            if model_name in dcolumn_manager.lazy_choices:
+                dc = obj.schema.get_column(slug) if obj else None
+                option = choice_cache.get_selected_option(
+                    model, field, key_values.get(slug),
+                    store_relation=bool(dc and dc.store_relation))
+                values = [option] if option else []
+                lazy = context.setdefault('lazyDynamicColumns', {})
+                lazy[slug] = reverse('dcolumns:api-choices',
+                                     kwargs={'choice_name': model_name})
+            else:
+                values = choice_cache.get_options(model, field)
+
             values.insert(0, (0, "Choose a value"))
-            objects[fk_slugs.get(model_name)] = values
+            objects[slug] = values
             log.debug("model_name: %s, model: %s, field: %s, fk_slugs: %s, "
                       "values: %s", model_name, model, field, fk_slugs, values)
 
@@ -146,6 +191,7 @@ class CollectionAJAXView(JSONResponseMixin, TemplateView, ContextDataMixin):
     values as per the ``DynamicColumn`` meta data.
     """
     http_method_names = ('get',)
+    BODY_KEY = 'dcolumn-collection-json-{}'
 
     @method_decorator(dcolumn_login_required)
     def dispatch(self, *args, **kwargs):
@@ -154,6 +200,66 @@ class CollectionAJAXView(JSONResponseMixin, TemplateView, ContextDataMixin):
         """
         return super(CollectionAJAXView, self).dispatch(*args, **kwargs)
 
+    def get(self, request, *args, **kwargs):
+        """
+        Answers ``304 Not Modified`` when the client's ETag still matches,
+        otherwise the JSON body is taken from the Django cache named by
+        ``settings.DYNAMIC_COLUMNS.SCHEMA_CACHE`` or built and stored there.
+        Clients must revalidate on each use.
+        """
+        self.etag = None
+        self.valid = False
+        view = condition(etag_func=self.get_etag)(self._get)
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_etag(self, request, class_name=None, **kwargs):
+        """
+        The ETag is made from the shared schema version and the versions of
+        the ``CHOICE`` objects used by the collection.
+
+        :param request: The Django request object.
+        :type request: HttpRequest
+        :param class_name: The name of the collection.
+        :type class_name: str
+        :rtype: str or ``None`` if the collection does not exist.
+        """
+        try:
+            names = ColumnCollection.objects.get_active_relation_items(
+                class_name)
+        except ColumnCollection.DoesNotExist:
+            return None
+
+        versions = [class_name, schema_cache.shared_version]
+
+        for name in sorted(set(names), key=str):
+            # The relation may not be a registered choice.
+            model, field = dcolumn_manager.choice_map.get(name, (None, None))
+
+            if model is not None and choice_cache.is_model(model):
+                versions.append(choice_cache.get_version(model))
+
+        self.etag = hashlib.md5(':'.join(versions).encode('utf-8')
+                                ).hexdigest()
+        return self.etag
+
+    def _get(self, request, *args, **kwargs):
+        cache = caches[dcolumn_manager.schema_cache_alias]
+        key = self.BODY_KEY.format(self.etag)
+        body = cache.get(key) if self.etag else None
+
+        if body is None:
+            response = super(CollectionAJAXView, self).get(
+                request, *args, **kwargs)
+
+            if self.etag and self.valid:
+                cache.set(key, response.content)
+        else:
+            response = HttpResponse(body, content_type='application/json')
+
+        return response
+
     def render_to_response(self, context, **response_kwargs):
         # Remove the view object--it cannot be serialized and we don't
         # need it.
@@ -178,11 +284,363 @@ class CollectionAJAXView(JSONResponseMixin, TemplateView, ContextDataMixin):
             context['message'] = "Error occurred: {}".format(e)
             log.error(context['message'], exc_info=True)
 
+        self.valid = context['valid']
         return context
 
 collection_ajax_view = CollectionAJAXView.as_view()
 
 
+#
+# ChoiceSearchAJAXView
+#
+class ChoiceSearchAJAXView(JSONResponseMixin, TemplateView):
+    """
+    Web service endpoint that searches the options of a registered
+    ``CHOICE`` object a page at a time. It is used for choices registered
+    with ``lazy=True``.
+
+    The query string can have these parameters:
+
+    ``q``
+      The text to search for, case is ignored.
+    ``match``
+      ``prefix`` to match the start of the option text, the default matches
+      anywhere in the text.
+    ``page``
+      The page number starting at 1.
+    ``page_size``
+      The number of options on a page, no more than ``max_page_size``.
+    ``selected``
+      Get only the option for a pk or a stored relation value.
+    """
+    http_method_names = ('get',)
+    page_size = 20
+    max_page_size = 100
+
+    @method_decorator(dcolumn_login_required)
+    def dispatch(self, *args, **kwargs):
+        """
+        Django view dispatch decorated for login requierments.
+        """
+        return super(ChoiceSearchAJAXView, self).dispatch(*args, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        context.pop('view', None)
+        return self.render_to_json_response(context, **response_kwargs)
+
+    def get_data(self, **context):
+        """
+        Get a page of options for the ``CHOICE`` object.
+        """
+        context['valid'] = True
+        params = self.request.GET
+
+        try:
+            model, field = self._get_choice(context.get('choice_name'))
+
+            if 'selected' in params:
+                option = choice_cache.get_selected_option(
+                    model, field, params.get('selected'),
+                    store_relation=params.get('store_relation') == '1')
+                context['results'] = [option] if option else []
+            else:
+                page = self._get_number('page', 1)
+                page_size = min(self._get_number('page_size', self.page_size),
+                                self.max_page_size)
+                options = choice_cache.search_options(
+                    model, field, term=params.get('q', '').strip(),
+                    prefix=params.get('match') == 'prefix',
+                    offset=(page - 1) * page_size, limit=page_size + 1)
+                context['results'] = options[:page_size]
+                context['page'] = page
+                context['has_next'] = len(options) > page_size
+        except Exception as e:
+            context['valid'] = False
+            context['message'] = "Error occurred: {}".format(e)
+            log.error(context['message'], exc_info=True)
+
+        return context
+
+    def _get_choice(self, name):
+        choice = dcolumn_manager.choice_map.get(name)
+
+        if choice is None:
+            raise ValueError("Invalid choice name '{}'.".format(name))
+
+        return choice
+
+    def _get_number(self, key, default):
+        value = self.request.GET.get(key, default)
+
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid {} '{}'.".format(key, value))
+
+        if value < 1:
+            raise ValueError("Invalid {} '{}'.".format(key, value))
+
+        return value
+
+choice_search_ajax_view = ChoiceSearchAJAXView.as_view()
+
+
+#
+# CollectionPermissionMixin
+#
+class CollectionPermissionMixin(object):
+    """
+    Mixin for views that read or write many objects of a collection at a
+    time. These views must be decorated with ``login_required`` not
+    ``dcolumn_login_required`` so a user is always logged in whatever
+    ``INACTIVATE_API_AUTH`` is set to, and the user must have a model
+    permission of the collection.
+    """
+
+    def check_collection_permission(self, model, actions):
+        """
+        Check that the user has one of the model permissions.
+
+        :param model: The model class that inherits ``CollectionBase``.
+        :type model: Model class
+        :param actions: The permission actions, e.g. ``('view', 'change')``.
+        :type actions: list or tuple
+        :raises PermissionDenied: If the user is not logged in or has none of
+                                  the permissions.
+        """
+        user = self.request.user
+        opts = model._meta
+        perms = ['{}.{}'.format(opts.app_label,
+                                get_permission_codename(action, opts))
+                 for action in actions]
+
+        if (not user.is_authenticated
+            or not any(user.has_perm(perm) for perm in perms)):
+            raise PermissionDenied("Permission denied, requires one of "
+                                   "{}.".format(perms))
+
+
+#
+# KeyValueAJAXView
+#
+class KeyValueAJAXView(CollectionPermissionMixin, JSONResponseMixin,
+                       TemplateView):
+    """
+    Web service endpoint that returns the ``KeyValue`` values of many
+    objects of one collection with a single ``KeyValue`` query.
+
+    The query string can have these parameters, each can be repeated or be
+    a comma separated list:
+
+    ``pk``
+      The pks of the objects, no more than ``max_objects``.
+    ``slug``
+      Optional ``DynamicColumn`` slugs to limit the values to.
+
+    The user must have the model's ``view`` or ``change`` permission.
+
+    A POST with a JSON body of ``{<pk>: {<slug>: <value>, ...}, ...}`` sets
+    the values of many objects. Either all the values are written in one
+    transaction or none are and the errors are returned keyed by the object
+    pk then the slug. The user must have the model's ``change`` permission.
+    """
+    http_method_names = ('get', 'post')
+    max_objects = 500
+
+    @method_decorator(login_required)
+    def dispatch(self, *args, **kwargs):
+        """
+        Django view dispatch decorated for login requierments, the login is
+        always required.
+        """
+        return super(KeyValueAJAXView, self).dispatch(*args, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        context.pop('view', None)
+        return self.render_to_json_response(context, **response_kwargs)
+
+    def get_data(self, **context):
+        """
+        Get the values keyed by the object pk then the slug. Objects that
+        are not found are left out.
+        """
+        context['valid'] = True
+
+        try:
+            model, schema = self.get_collection(context.get('class_name'))
+            self.check_collection_permission(model, ('view', 'change'))
+            pks = self._get_list('pk')
+
+            if not pks or len(pks) > self.max_objects:
+                raise ValueError("Between 1 and {} pks must be given.".format(
+                    self.max_objects))
+
+            slugs = self._get_list('slug') or None
+
+            for slug in slugs or []:
+                if schema.get_column(slug) is None:
+                    raise ValueError("Invalid slug '{}'.".format(slug))
+
+            instances = list(model.objects.filter(pk__in=pks))
+            context['values'] = KeyValue.objects.serialize_for_collections(
+                instances, slugs=slugs)
+        except PermissionDenied:
+            raise
+        except Exception as e:
+            context['valid'] = False
+            context['message'] = "Error occurred: {}".format(e)
+            log.error(context['message'], exc_info=True)
+
+        return context
+
+    def post(self, request, *args, **kwargs):
+        """
+        Set the values of many objects. The response has a ``400`` status if
+        nothing was written.
+        """
+        context = self.set_data(**kwargs)
+        status = 200 if context['valid'] else 400
+        return JsonResponse(context, status=status)
+
+    def set_data(self, **context):
+        """
+        Validate and write the values in the request body.
+        """
+        context['valid'] = True
+
+        try:
+            model, schema = self.get_collection(context.get('class_name'))
+            self.check_collection_permission(model, ('change',))
+            values = self._get_values()
+            instances = list(model.objects.filter(pk__in=list(values)))
+            errors = {pk: {'__all__': ["Object not found."]}
+                      for pk in set(values) - {inst.pk for inst in instances}}
+
+            if not errors:
+                errors = KeyValue.objects.set_for_collections(
+                    instances, values)
+
+            if errors:
+                context['valid'] = False
+                context['errors'] = errors
+            else:
+                context['updated'] = len(instances)
+        except PermissionDenied:
+            raise
+        except Exception as e:
+            context['valid'] = False
+            context['message'] = "Error occurred: {}".format(e)
+            log.error(context['message'], exc_info=True)
+
+        return context
+
+    def get_collection(self, class_name):
+        """
+        Gets the model and the schema of a collection.
+
+        :param class_name: The name of the collection.
+        :type class_name: str
+        :rtype: The model class that inherits ``CollectionBase`` and the
+                ``CollectionSchema`` object.
+        :raises ValueError: If the name is not a collection name.
+        :raises ColumnCollection.DoesNotExist: If there is no active
+                                               collection for the name.
+        """
+        model = ColumnCollection.objects.get_collection_model(class_name)
+        return model, ColumnCollection.objects.get_schema(class_name)
+
+    def _get_values(self):
+        try:
+            data = json.loads(self.request.body.decode('utf-8'))
+        except ValueError as e:
+            raise ValueError("Invalid JSON, {}".format(e))
+
+        if (not isinstance(data, dict) or not data
+            or len(data) > self.max_objects):
+            raise ValueError("Between 1 and {} objects must be given.".format(
+                self.max_objects))
+
+        values = {}
+
+        for pk, items in data.items():
+            if not pk.isdigit() or not isinstance(items, dict):
+                raise ValueError("Invalid values for pk '{}'.".format(pk))
+
+            values[int(pk)] = items
+
+        return values
+
+    def _get_list(self, key):
+        items = []
+
+        for value in self.request.GET.getlist(key):
+            items.extend(item.strip() for item in value.split(',')
+                         if item.strip())
+
+        return items
+
+key_value_ajax_view = KeyValueAJAXView.as_view()
+
+
+#
+# CollectionExportView
+#
+class CollectionExportView(CollectionPermissionMixin, View):
+    """
+    Streams the objects of a collection with their dynamic columns as CSV
+    or JSON Lines. The ``format`` query parameter is ``csv`` (default) or
+    ``jsonl`` and ``slug`` can be repeated to limit the dynamic columns.
+    The user must have the model's ``view`` or ``change`` permission.
+    """
+    http_method_names = ('get',)
+    chunk_size = 2000
+
+    @method_decorator(login_required)
+    def dispatch(self, *args, **kwargs):
+        """
+        Django view dispatch decorated for login requierments, the login is
+        always required.
+        """
+        return super(CollectionExportView, self).dispatch(*args, **kwargs)
+
+    def get(self, request, class_name=None, **kwargs):
+        try:
+            model = ColumnCollection.objects.get_collection_model(class_name)
+            schema = ColumnCollection.objects.get_schema(class_name)
+        except (ValueError, ColumnCollection.DoesNotExist) as e:
+            raise Http404(e)
+
+        self.check_collection_permission(model, ('view', 'change'))
+
+        try:
+            exporter = CollectionExporter(
+                self.get_queryset(model), schema,
+                slugs=request.GET.getlist('slug'),
+                format=request.GET.get('format', CollectionExporter.CSV),
+                chunk_size=self.chunk_size)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        response = StreamingHttpResponse(
+            exporter.lines(), content_type=exporter.content_type)
+        response['Content-Disposition'] = (
+            'attachment; filename="{}.{}"'.format(
+                schema.name, exporter.format))
+        return response
+
+    def get_queryset(self, model):
+        """
+        The objects to export, override to filter them.
+
+        :param model: The model class that inherits ``CollectionBase``.
+        :type model: Model class
+        :rtype: Django queryset.
+        """
+        return model.objects.all()
+
+collection_export_view = CollectionExportView.as_view()
+
+
 #
 # CollectionCreateUpdateViewMixin
 #
@@ -198,13 +656,28 @@ class CollectionCreateUpdateViewMixin(ContextDataMixin):
         """
         return {'request': self.request, 'parent_instance': self.object}
 
+    def get_form_class(self):
+        """
+        If ``form_class`` is not set a form is generated from the collection
+        with ``collection_form_factory``.
+        """
+        if self.form_class:
+            form_class = super(CollectionCreateUpdateViewMixin, self
+                               ).get_form_class()
+        else:
+            form_class = collection_form_factory(self.model,
+                                                 fields=self.fields)
+
+        return form_class
+
     def get_context_data(self, **kwargs):
         """
         Get context data for the ``KeyValue`` objects.
         """
         context = super(CollectionCreateUpdateViewMixin, self
                         ).get_context_data(**kwargs)
-        context.update(self.get_dynamic_column_context_data(**kwargs))
+        context.update(self.get_dynamic_column_context_data(
+            obj=self.object, **kwargs))
         context.update(self.get_relation_context_data(
             obj=self.object, **kwargs))
         context.update({'css': dcolumn_manager.css_container_map})
@@ -225,8 +698,485 @@ class CollectionDetailViewMixin(ContextDataMixin):
         """
         context = super(
             CollectionDetailViewMixin, self).get_context_data(**kwargs)
-        context.update(self.get_dynamic_column_context_data(**kwargs))
+        context.update(self.get_dynamic_column_context_data(
+            obj=self.object, **kwargs))
         context.update(self.get_relation_context_data(
             obj=self.object, **kwargs))
         context.update({'css': dcolumn_manager.css_container_map})
         return context
+
+
+#
+# CollectionBulkEditViewMixin
+#
+class CollectionBulkEditViewMixin(ContextDataMixin):
+    """
+    This mixin edits many objects of a model that inherits
+    ``CollectionBase`` in one request with a ``CollectionBaseFormSet``. Use
+    it with a ``TemplateView``, the formset is in the context as
+    ``formset``. The select options are built once for all the forms.
+    """
+    form_class = None
+    fields = None
+    queryset = None
+    extra = 0
+    can_delete = False
+    success_url = None
+
+    def get_queryset(self):
+        """
+        Get the objects to edit, all objects of the model by default.
+
+        :rtype: Django queryset.
+        """
+        if self.queryset is not None:
+            queryset = self.queryset.all()
+        else:
+            queryset = self.model.objects.all()
+
+        return queryset
+
+    def get_formset_class(self):
+        """
+        Get the formset class, if ``formset_class`` is not set one is made
+        from ``form_class`` or a form generated with
+        ``collection_form_factory``.
+        """
+        if self.formset_class:
+            formset_class = self.formset_class
+        else:
+            form_class = self.form_class or collection_form_factory(
+                self.model, fields=self.fields)
+            formset_class = modelformset_factory(
+                self.model, form=form_class, formset=CollectionBaseFormSet,
+                extra=self.extra, can_delete=self.can_delete)
+
+        return formset_class
+
+    def get_formset(self):
+        """
+        Get the formset, bound to the request data on a POST.
+
+        :rtype: ``CollectionBaseFormSet`` object.
+        """
+        kwargs = {'queryset': self.get_queryset(), 'request': self.request}
+
+        if self.request.method in ('POST', 'PUT'):
+            kwargs.update({'data': self.request.POST,
+                           'files': self.request.FILES})
+
+        return self.get_formset_class()(**kwargs)
+
+    def get_success_url(self):
+        """
+        Return to the same page by default.
+        """
+        return self.success_url or self.request.get_full_path()
+
+    def get_context_data(self, **kwargs):
+        """
+        Get context data for the formset and the ``KeyValue`` objects.
+        """
+        if 'formset' not in kwargs:
+            kwargs['formset'] = self.get_formset()
+
+        context = super(CollectionBulkEditViewMixin, self
+                        ).get_context_data(**kwargs)
+        context.update(self.get_dynamic_column_context_data())
+        context.update(self.get_relation_context_data(by_slug=True))
+        context.update({'css': dcolumn_manager.css_container_map})
+        return context
+
+    def post(self, request, *args, **kwargs):
+        """
+        Save the formset, all the changes are written in one transaction.
+        """
+        formset = self.get_formset()
+
+        if formset.is_valid():
+            try:
+                formset.save()
+            except ValidationError as e:
+                # Nothing was written, show the error with the formset.
+                formset._non_form_errors = formset.error_class(e.messages)
+            else:
+                # A value can also fail when it is saved.
+                if formset.is_valid():
+                    return HttpResponseRedirect(self.get_success_url())
+
+        return self.render_to_response(self.get_context_data(
+            formset=formset))
+
+
+#
+# CollectionKeysetListViewMixin
+#
+class KeysetPage(object):
+    """
+    A page from ``CollectionKeysetListViewMixin`` used in place of a
+    Django ``Page``. The ``*_query`` attributes are URL query strings for
+    the links to the next, previous and first pages.
+    """
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_query = ''
+        self.previous_query = ''
+        self.first_query = ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CollectionKeysetListViewMixin(object):
+    """
+    This mixin can be used by any ``ListView`` where the view is associated
+    with a model that inherits ``CollectionBase``. The list is sorted by a
+    ``DynamicColumn`` slug given in the ``order`` query parameter, prefix it
+    with a '-' to reverse the sort, else by ``ordering_slug``. The sort
+    uses the typed value so ``NUMBER``, ``FLOAT`` and ``DATE`` columns
+    sort as numbers and dates, objects without a value come last. The sort
+    value is put on each object as an attribute named by the slug. Without
+    a slug the queryset's or the model's ordering is used. The view must
+    set ``paginate_by``.
+
+    Pages are found with an opaque ``cursor`` query parameter that holds
+    the sort value and pk of the last row shown. Each page seeks past that
+    row instead of using an OFFSET, so a deep page costs the same as the
+    first one. There are no page numbers.
+
+    When sorting on a slug the objects with a value are found through a
+    join on the typed ``KeyValue`` field so the database reads the
+    ``(dynamic_column, value_<type>)`` index in order, the objects without
+    a value are then found in pk order. They are last whether the sort is
+    ascending or descending. Only a page that crosses from one to the other
+    needs a second query.
+    """
+    ordering_slug = None
+    order_kwarg = 'order'
+    cursor_kwarg = 'cursor'
+    # The name of the join on the KeyValue objects of the sort column.
+    _KEY_VALUE_ALIAS = 'keyset_key_value'
+
+    def get_ordering_slug(self):
+        """
+        Get the slug to sort on and the sort direction.
+
+        :rtype: A tuple of the slug or ``None`` and ``True`` if descending.
+        """
+        value = self.request.GET.get(self.order_kwarg) or self.ordering_slug
+        value = value or ''
+        descending = value.startswith('-')
+        slug = value.lstrip('-') or None
+
+        if slug and self._get_schema().get_column(slug) is None:
+            log.warning("Invalid order slug '%s' ignored.", slug)
+            slug = None
+
+        return slug, descending
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Get one page of objects starting after the cursor.
+
+        :rtype: A tuple of ``(None, KeysetPage, object_list,
+                is_paginated)`` as expected by ``ListView``.
+        :raises Http404: If the cursor is invalid.
+        """
+        slug, descending = self.get_ordering_slug()
+
+        if slug and queryset._get_name_clashes([slug]):
+            # The sort value is put on the objects by the slug.
+            log.warning("Order slug '%s' ignored, it is the name of a field, "
+                        "attribute or annotation of %s.", slug,
+                        queryset.model.__name__)
+            slug = None
+
+        fields = None if slug else self._get_ordering_fields(queryset)
+        cursor = self._decode_cursor(slug, fields)
+        backwards = cursor is not None and cursor['d'] == 'p'
+        # Reverse the scan to go back a page.
+        reverse = descending != backwards
+
+        if slug:
+            object_list = self._get_slug_objects(
+                queryset, slug, cursor, reverse, backwards, page_size + 1)
+        else:
+            if cursor:
+                queryset = queryset.filter(self._seek(
+                    fields, cursor['v'] + [cursor['k']], reverse))
+
+            queryset = queryset.order_by(*self._order_by(fields, reverse))
+            object_list = list(queryset[:page_size + 1])
+
+        more = len(object_list) > page_size
+        object_list = object_list[:page_size]
+
+        if backwards:
+            object_list.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, cursor is not None
+
+        page = KeysetPage(object_list, has_next, has_previous)
+
+        if object_list:
+            page.next_query = self._get_query(
+                self._encode_cursor(slug, fields, object_list[-1], 'n'))
+            page.previous_query = self._get_query(
+                self._encode_cursor(slug, fields, object_list[0], 'p'))
+
+        page.first_query = self._get_query(None)
+        return (None, page, object_list, page.has_other_pages())
+
+    def _get_slug_objects(self, queryset, slug, cursor, reverse, backwards,
+                          limit):
+        dc = self._get_schema().get_column(slug)
+        field = KeyValue.get_typed_field(dc)
+        name = '{}__{}'.format(self._KEY_VALUE_ALIAS, field)
+        collection = '{}__collection_id'.format(self._KEY_VALUE_ALIAS)
+        # The objects with a value, in the order of the typed value index.
+        values = queryset.annotate(**{self._KEY_VALUE_ALIAS: FilteredRelation(
+            'keyvalues', condition=Q(keyvalues__dynamic_column=dc))})
+        values = values.annotate(**{slug: self._sort_value_expression(
+            dc, F(name))})
+        # The objects without a value, in pk order.
+        missing = queryset.filter(~Exists(KeyValue.objects.filter(
+            collection=OuterRef('pk'), dynamic_column=dc,
+            **{field + '__isnull': False}))).annotate(**{slug: Value(
+                None, output_field=self._sort_value_field(dc))})
+        in_missing = cursor is not None and cursor['v'] is None
+        value = None
+
+        if cursor is not None and not in_missing:
+            value = KeyValue.to_typed_value(dc, cursor['v'])
+
+        op = 'lt' if reverse else 'gt'
+        order = 'desc' if reverse else 'asc'
+
+        def get_values(limit):
+            # All the conditions on the join must be in one filter() so
+            # they use the same join.
+            query = Q(**{name + '__isnull': False})
+
+            if value is not None:
+                query &= Q(**{'{}__{}e'.format(name, op): value}) & (
+                    Q(**{'{}__{}'.format(name, op): value})
+                    | Q(**{'{}__{}'.format(collection, op): cursor['k']}))
+
+            return list(values.filter(query).order_by(
+                getattr(F(name), order)(), getattr(F(collection), order)())[
+                    :limit])
+
+        def get_missing(limit):
+            query = Q(**{'pk__' + op: cursor['k']}) if in_missing else Q()
+            return list(missing.filter(query).order_by(
+                getattr(F('pk'), order)())[:limit])
+
+        # The objects without a value are last in either sort direction, so
+        # they come first when going back a page.
+        if backwards:
+            first, second = get_missing, get_values
+        else:
+            first, second = get_values, get_missing
+
+        # The cursor is past the first group when it is in the other one.
+        objects = [] if in_missing != backwards else first(limit)
+
+        if len(objects) < limit:
+            objects += second(limit - len(objects))
+
+        return objects
+
+    def _sort_value_expression(self, dc, expression):
+        # The typed value is stored as a UTC datetime.
+        if dc.value_type == dc.DATE:
+            expression = TruncDate(expression, tzinfo=datetime.timezone.utc)
+        elif dc.value_type == dc.TIME:
+            expression = TruncTime(expression, tzinfo=datetime.timezone.utc)
+
+        return expression
+
+    def _sort_value_field(self, dc):
+        if dc.value_type == dc.DATE:
+            field = models.DateField()
+        elif dc.value_type == dc.TIME:
+            field = models.TimeField()
+        else:
+            field = KeyValue._meta.get_field(KeyValue.get_typed_field(dc))
+
+        return field
+
+    def _get_ordering_fields(self, queryset):
+        """
+        Get the fields of the queryset's or the model's ordering with the pk
+        last as a tie breaker. Only plain fields of the model can be used,
+        other orderings fall back to the pk.
+        """
+        opts = queryset.model._meta
+        fields = []
+
+        for item in queryset.query.order_by or opts.ordering:
+            name = item.lstrip('-') if isinstance(item, str) else None
+
+            try:
+                if not name or LOOKUP_SEP in name:
+                    raise FieldDoesNotExist(name)
+
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+
+                if field.is_relation and not field.primary_key:
+                    raise FieldDoesNotExist(name)
+            except FieldDoesNotExist:
+                log.warning("Ordering '%s' cannot be used, ordering by pk.",
+                            item)
+                fields = []
+                break
+
+            fields.append((field, item.startswith('-')))
+
+            if field.primary_key:
+                break
+
+        if not fields or not fields[-1][0].primary_key:
+            fields.append((opts.pk, False))
+
+        return fields
+
+    def _order_by(self, fields, reverse):
+        result = []
+
+        for field, descending in fields:
+            expression = F('pk' if field.primary_key else field.name)
+
+            # Nulls sort last so a reverse scan is the exact reverse.
+            if descending != reverse:
+                expression = expression.desc(nulls_first=field.null)
+            else:
+                expression = expression.asc(nulls_last=field.null)
+
+            result.append(expression)
+
+        return result
+
+    def _seek(self, fields, values, reverse):
+        """
+        Get the rows after the values in the scan order, the lexicographic
+        ``(f1 > v1) OR (f1 = v1 AND f2 > v2) ...``.
+        """
+        result = Q(pk__in=[])
+        equal = Q()
+
+        for (field, descending), value in zip(fields, values):
+            name = 'pk' if field.primary_key else field.name
+
+            if descending != reverse:
+                after = (Q(**{name + '__isnull': False}) if value is None
+                         else Q(**{name + '__lt': value}))
+            elif value is None:
+                after = None
+            else:
+                after = Q(**{name + '__gt': value})
+
+                if field.null:
+                    after |= Q(**{name + '__isnull': True})
+
+            if after is not None:
+                result |= equal & after
+
+            equal &= (Q(**{name + '__isnull': True}) if value is None
+                      else Q(**{name: value}))
+
+        return result
+
+    def _encode_cursor(self, slug, fields, obj, direction):
+        if slug:
+            value = self._encode_value(getattr(obj, slug))
+        else:
+            value = [self._encode_value(getattr(obj, field.attname))
+                     for field, descending in fields[:-1]]
+
+        data = json.dumps({'v': value, 'k': obj.pk, 'd': direction})
+        data = data.encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def _encode_value(self, value):
+        # Keep the microseconds, DjangoJSONEncoder would truncate them.
+        if isinstance(value, (datetime.date, datetime.time)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+
+        return value
+
+    def _decode_cursor(self, slug, fields):
+        value = self.request.GET.get(self.cursor_kwarg)
+
+        if not value:
+            return None
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(
+                value.encode('ascii')).decode('utf-8'))
+            cursor['k'] = int(cursor['k'])
+
+            if cursor['d'] not in ('n', 'p'):
+                raise ValueError("Invalid direction.")
+
+            if slug:
+                if cursor['v'] is not None:
+                    cursor['v'] = self._decode_value(slug, cursor['v'])
+            elif (not isinstance(cursor['v'], list)
+                  or len(cursor['v']) != len(fields) - 1):
+                raise ValueError("Invalid values.")
+            else:
+                cursor['v'] = [
+                    None if v is None else field.to_python(v)
+                    for (field, descending), v in zip(fields, cursor['v'])]
+        except (ValueError, TypeError, KeyError, ValidationError) as e:
+            log.warning("Invalid cursor '%s', %s", value, e)
+            raise Http404("Invalid cursor.")
+
+        return cursor
+
+    def _decode_value(self, slug, value):
+        dc = self._get_schema().get_column(slug)
+
+        if dc.value_type == dc.DATE:
+            value = datetime.date.fromisoformat(value)
+        elif dc.value_type == dc.TIME:
+            value = datetime.time.fromisoformat(value)
+        elif dc.value_type == dc.DATETIME:
+            value = parse_datetime(value)
+
+            if value is None:
+                raise ValueError("Invalid datetime.")
+
+        return value
+
+    def _get_query(self, cursor):
+        query = self.request.GET.copy()
+        query.pop(self.cursor_kwarg, None)
+
+        if cursor:
+            query[self.cursor_kwarg] = cursor
+
+        return query.urlencode()
+
+    def _get_schema(self):
+        return ColumnCollection.objects.get_schema(
+            dcolumn_manager.get_collection_name(self.model.__name__))
@@ -19,4 +19,6 @@ urlpatterns = [
         name='test-book-detail'),
     re_path(r'^test-book-list/$', views.test_book_list_view,
         name='test-book-list'),
+    re_path(r'^test-book-bulk-edit/$', views.test_book_bulk_edit_view,
+        name='test-book-bulk-edit'),
     ]
@@ -5,10 +5,12 @@
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse
-from django.views.generic import DetailView, CreateView, UpdateView, ListView
+from django.views.generic import (
+    DetailView, CreateView, UpdateView, ListView, TemplateView)
 
 from dcolumn.dcolumns.views import (
-    CollectionCreateUpdateViewMixin, CollectionDetailViewMixin)
+    CollectionCreateUpdateViewMixin, CollectionDetailViewMixin,
+    CollectionKeysetListViewMixin, CollectionBulkEditViewMixin)
 
 from example_site.books.models import Book
 
@@ -91,9 +93,24 @@ test_book_detail_view = TestBookDetailView.as_view()
 # TestBookListView
 #
 class TestBookListView(LoginRequiredMixin,
+                       CollectionKeysetListViewMixin,
                        ListView):
     template_name = 'test_book_list_view.html'
     model = Book
+    queryset = Book.objects.prefetch_key_values()
     paginate_by = 50
 
 test_book_list_view = TestBookListView.as_view()
+
+
+#
+# TestBookBulkEditView
+#
+class TestBookBulkEditView(LoginRequiredMixin,
+                           CollectionBulkEditViewMixin,
+                           TemplateView):
+    template_name = 'test_book_bulk_edit_view.html'
+    model = Book
+    fields = ['title', 'active']
+
+test_book_bulk_edit_view = TestBookBulkEditView.as_view()
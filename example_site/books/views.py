@@ -11,7 +11,8 @@ from django.urls import reverse
 from django.views.generic import DetailView, CreateView, UpdateView, ListView
 
 from dcolumn.dcolumns.views import (
-    CollectionCreateUpdateViewMixin, CollectionDetailViewMixin)
+    CollectionCreateUpdateViewMixin, CollectionDetailViewMixin,
+    CollectionKeysetListViewMixin)
 
 from .models import Book, Publisher, Author, Promotion
 from .forms import BookForm, PublisherForm, AuthorForm, PromotionForm
@@ -95,9 +96,11 @@ book_detail_view = BookDetailView.as_view()
 # BookListView
 #
 class BookListView(LoginRequiredMixin,
+                   CollectionKeysetListViewMixin,
                    ListView):
     template_name = 'books/book_list_view.html'
     model = Book
+    queryset = Book.objects.prefetch_key_values()
     paginate_by = 50
 
 book_list_view = BookListView.as_view()
@@ -182,6 +185,7 @@ class PublisherListView(LoginRequiredMixin,
                         ListView):
     template_name = 'books/publisher_list_view.html'
     model = Publisher
+    queryset = Publisher.objects.prefetch_key_values()
     paginate_by = 50
 
 publisher_list_view = PublisherListView.as_view()
@@ -266,6 +270,7 @@ class AuthorListView(LoginRequiredMixin,
                      ListView):
     template_name = 'books/author_list_view.html'
     model = Author
+    queryset = Author.objects.prefetch_key_values()
     paginate_by = 50
 
 author_list_view = AuthorListView.as_view()
@@ -351,6 +356,7 @@ class PromotionListView(LoginRequiredMixin,
                         ListView):
     template_name = 'books/promotion_list_view.html'
     model = Promotion
+    queryset = Promotion.objects.prefetch_key_values()
     paginate_by = 50
 
 promotion_list_view = PromotionListView.as_view()
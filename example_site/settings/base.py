@@ -137,6 +137,8 @@ dcolumn_manager.register_css_containers(
 DYNAMIC_COLUMNS = {
     # To allow anybody to access the API set to True.
     'INACTIVATE_API_AUTH': False,
+    # The cache alias used to share schema changes between processes.
+    'SCHEMA_CACHE': 'default',
     }
 
 # Change the URL below to your login path.
@@ -25,6 +25,8 @@ setup(
     name='django-dcolumns',
     version=version(),
     packages=['dcolumn', 'dcolumn.dcolumns', 'dcolumn.dcolumns.migrations',
+              'dcolumn.dcolumns.management',
+              'dcolumn.dcolumns.management.commands',
               'dcolumn.common',],
     include_package_data=True,
     license='MIT',